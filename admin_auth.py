@@ -0,0 +1,103 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import logging
+import multiprocessing
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from config import ADMIN_SECRET, ADMIN_SECRET_TOKEN, SESSION_SECRET, SESSION_TTL_SECONDS, AUTH_HASH_WORKERS, AUTH_HASH_QUEUE
+from utils import verify_password
+
+# Login admin & token sesi.
+# bcrypt (~250ms CPU) jalan di process pool kecil, jadi login barengan / brute force
+# gak ngabisin threadpool worker. Antrian dibatasi AUTH_HASH_QUEUE, lewat itu ditolak.
+# Token sesi = "admin_id.exp.jti.sig" (HMAC-SHA256), dicek tanpa nyentuh DB.
+# Daftar token yang di-logout disimpan di memori per proses sampai expired.
+# Kunci HMAC-nya SESSION_SECRET sendiri, gak pernah turunan ADMIN_SECRET.
+
+class Busy(Exception):
+    pass
+
+_pool = None
+_pending = 0
+_pool_lock = threading.Lock()
+_revoked = {}        # jti -> exp
+
+if SESSION_SECRET:
+    _secret = SESSION_SECRET
+else:
+    # Tanpa SESSION_SECRET: kunci acak per proses. Aman, tapi token cuma sah di worker yang
+    # ngeluarin & hilang pas restart -> set SESSION_SECRET kalau jalan lebih dari satu worker
+    _secret = secrets.token_urlsafe(32)
+    logging.warning("SESSION_SECRET kosong, token sesi admin pakai kunci acak per proses")
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: jangan fork proses yang lagi punya thread & koneksi SQLite
+            _pool = ProcessPoolExecutor(max_workers=AUTH_HASH_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+async def check_password(password, hashed):
+    global _pending
+    if _pending >= AUTH_HASH_QUEUE:
+        raise Busy()
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_pool(), verify_password, password, hashed)
+    finally:
+        _pending -= 1
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+def _sign(payload):
+    sig = hmac.new(_secret.encode(), payload.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(sig).rstrip(b"=").decode()
+
+def issue(admin_id, ttl=SESSION_TTL_SECONDS):
+    jti = base64.urlsafe_b64encode(os.urandom(12)).decode()
+    payload = f"{admin_id}.{int(time.time()) + ttl}.{jti}"
+    return f"{payload}.{_sign(payload)}"
+
+def check(token):
+    # Balikin admin_id kalau token sah, None kalau palsu / expired / sudah logout
+    if not token:
+        return None
+    parts = token.split(".")
+    if len(parts) != 4:
+        return None
+    admin_id, exp, jti, sig = parts
+    if not hmac.compare_digest(sig.encode(), _sign(f"{admin_id}.{exp}.{jti}").encode()):
+        return None
+    if not exp.isdigit() or int(exp) < time.time() or jti in _revoked:
+        return None
+    return admin_id
+
+def revoke(token):
+    if check(token) is None:
+        return False
+    _, exp, jti, _ = token.split(".")
+    now = time.time()
+    # Buang yang udah expired, toh token-nya udah ditolak check() duluan
+    for k in [k for k, e in _revoked.items() if e < now]:
+        del _revoked[k]
+    _revoked[jti] = int(exp)
+    return True
+
+def is_admin(token):
+    # ADMIN_SECRET statis cuma diterima kalau sengaja dinyalain (ADMIN_SECRET_TOKEN=1) buat script / cron
+    if ADMIN_SECRET_TOKEN and ADMIN_SECRET and token and hmac.compare_digest(token.encode(), ADMIN_SECRET.encode()):
+        return True
+    return check(token) is not None
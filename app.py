@@ -1,14 +1,58 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-import threading
+import asyncio
+
+import admin_auth
+import backup
+import catalog
+import event_log
+import leader
+import payment_channels
+import product_sync
+import receipts
+import sweeper
+import metrics
 
 from routes import topup_routes
 from routes import admin_routes
 from engine import auto_engine_loop
+from job_queue import consumer_loop
+from migrations import migrate
+from services.http_client import close_client
 from fastapi.responses import FileResponse
+from config import RECEIPT_DIR
+
+@asynccontextmanager
+async def lifespan(app):
+    # Skema DB harus sudah up-to-date sebelum engine & route nyentuh tabel.
+    # Semua kerjaan SQLite di sini juga lewat thread, event loop gak pernah nunggu lock DB
+    await asyncio.to_thread(migrate)
+    backup.start()
+    event_log.start()
+    receipts.start()
+    tasks = [
+        # Leader duluan: putaran pertamanya langsung klaim lease sebelum engine jalan
+        asyncio.create_task(leader.leader_loop()),
+        asyncio.create_task(auto_engine_loop()),
+        asyncio.create_task(consumer_loop()),
+        asyncio.create_task(sweeper.sweep_loop()),
+        asyncio.create_task(product_sync.price_sync_loop()),
+        asyncio.create_task(payment_channels.refresh_loop()),
+        asyncio.create_task(catalog.refresh_loop()),
+    ]
+    yield
+    for t in tasks:
+        t.cancel()
+    # Lepas lease biar worker lain langsung bisa ambil alih, gak nunggu hangus
+    await asyncio.to_thread(leader.release)
+    await close_client()
+    admin_auth.shutdown()
+    receipts.shutdown()
+    await asyncio.to_thread(event_log.stop)
 
-app = FastAPI(title="Mc'D TopUp API")
+app = FastAPI(title="Mc'D TopUp API", lifespan=lifespan)
 
 @app.get("/")
 def home():
@@ -22,10 +66,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(metrics.MetricsMiddleware)
+app.add_api_route("/metrics", metrics.endpoint, include_in_schema=False)
+
 app.include_router(topup_routes.router)
 app.include_router(admin_routes.router)
 
-threading.Thread(target=auto_engine_loop, daemon=True).start()
-
 app.mount("/web", StaticFiles(directory="web"), name="web")
-app.mount("/receipts", StaticFiles(directory="receipts"), name="receipts")
\ No newline at end of file
+app.mount("/receipts", receipts.CachedStaticFiles(directory=RECEIPT_DIR), name="receipts")
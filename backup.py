@@ -0,0 +1,156 @@
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import leader
+from config import (
+    DB_PATH, BACKUP_DIR, BACKUP_INTERVAL_SECONDS, BACKUP_KEEP, BACKUP_KEEP_DAILY, BACKUP_COMPRESS,
+    LEADER_HEARTBEAT_SECONDS
+)
+
+# Backup online pakai SQLite backup API (bukan shutil.copy): hasilnya snapshot yang
+# konsisten walau lagi ada yang nulis, dan di mode WAL gak ngeblok penulis.
+# Jalan di thread sendiri, jadi I/O backup gak rebutan sama engine / request.
+
+PREFIX = "db_"
+
+def _timestamp():
+    # Waktu WIB (+7 Jam)
+    return (datetime.utcnow() + timedelta(hours=7)).strftime("%Y%m%d_%H%M%S")
+
+def _unpack(path, dst_path):
+    if path.endswith(".gz"):
+        with gzip.open(path, "rb") as f_in, open(dst_path, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out)
+    else:
+        shutil.copy(path, dst_path)
+
+def verify(path):
+    # Restore ke file sementara lalu integrity_check: backup yang gak bisa dibalikin = bukan backup
+    tmp_fd, tmp_path = tempfile.mkstemp(suffix=".sqlite3")
+    os.close(tmp_fd)
+    try:
+        _unpack(path, tmp_path)
+        conn = sqlite3.connect(tmp_path)
+        try:
+            ok = conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+            conn.execute("SELECT COUNT(*) FROM topup").fetchone()
+            return ok
+        finally:
+            conn.close()
+    except Exception as e:
+        logging.error(f"BACKUP VERIFY GAGAL {path}: {e}")
+        return False
+    finally:
+        os.remove(tmp_path)
+
+def take_snapshot(src=None):
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    path = os.path.join(BACKUP_DIR, f"{PREFIX}{_timestamp()}.sqlite3")
+    own = src is None
+    src = src or sqlite3.connect(DB_PATH)
+    dst = sqlite3.connect(path)
+    try:
+        # Satu langkah = satu read transaction -> snapshot konsisten
+        src.backup(dst)
+    finally:
+        dst.close()
+        if own:
+            src.close()
+
+    if BACKUP_COMPRESS:
+        with open(path, "rb") as f_in, gzip.open(path + ".gz", "wb", compresslevel=6) as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.remove(path)
+        path += ".gz"
+
+    if not verify(path):
+        os.remove(path)
+        raise Exception(f"Snapshot {path} gagal diverifikasi, dibuang")
+    return path
+
+def _snapshots():
+    files = [f for f in os.listdir(BACKUP_DIR) if f.startswith(PREFIX)] if os.path.isdir(BACKUP_DIR) else []
+    return sorted(files, reverse=True)  # nama pakai timestamp -> urut terbaru duluan
+
+def rotate():
+    # Simpan BACKUP_KEEP snapshot terbaru + snapshot terakhir tiap hari selama BACKUP_KEEP_DAILY hari
+    files = _snapshots()
+    keep = set(files[:BACKUP_KEEP])
+    days = []
+    for f in files:
+        day = f[len(PREFIX):len(PREFIX) + 8]
+        if day not in days:
+            days.append(day)
+            if len(days) <= BACKUP_KEEP_DAILY:
+                keep.add(f)
+    removed = 0
+    for f in files:
+        if f not in keep:
+            os.remove(os.path.join(BACKUP_DIR, f))
+            removed += 1
+    return removed
+
+def backup_loop():
+    # Koneksi awet khusus backup: PRAGMA data_version-nya berubah tiap ada commit
+    # dari koneksi lain, jadi kalau DB gak berubah sejak snapshot terakhir, skip.
+    # Multi worker: cuma leader yang backup, sisanya nunggu giliran kalau leader ganti.
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    last_version = None
+    while True:
+        if not leader.is_leader():
+            time.sleep(LEADER_HEARTBEAT_SECONDS)
+            continue
+        try:
+            version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if version != last_version or not _snapshots():
+                path = take_snapshot(conn)
+                last_version = version
+                removed = rotate()
+                logging.info(f"BACKUP OK {path} (hapus {removed} snapshot lama)")
+        except Exception as e:
+            logging.error(f"Backup error {e}")
+        time.sleep(BACKUP_INTERVAL_SECONDS)
+
+def start():
+    t = threading.Thread(target=backup_loop, name="backup", daemon=True)
+    t.start()
+    return t
+
+def restore(path):
+    # MATIKAN APP DULU sebelum restore
+    if not verify(path):
+        raise Exception(f"{path} rusak, restore dibatalkan")
+    tmp_fd, tmp_path = tempfile.mkstemp(suffix=".sqlite3")
+    os.close(tmp_fd)
+    try:
+        _unpack(path, tmp_path)
+        src = sqlite3.connect(tmp_path)
+        dst = sqlite3.connect(DB_PATH)
+        try:
+            src.backup(dst)
+        finally:
+            src.close()
+            dst.close()
+    finally:
+        os.remove(tmp_path)
+
+if __name__ == "__main__":
+    # python backup.py              -> snapshot sekarang
+    # python backup.py verify FILE  -> cek file backup bisa direstore
+    # python backup.py restore FILE -> balikin DB dari backup
+    if len(sys.argv) == 3 and sys.argv[1] == "verify":
+        print("✅ OK" if verify(sys.argv[2]) else "❌ RUSAK")
+    elif len(sys.argv) == 3 and sys.argv[1] == "restore":
+        restore(sys.argv[2])
+        print(f"✅ Database dibalikin dari {sys.argv[2]}")
+    else:
+        print(f"✅ Backup tersimpan: {take_snapshot()}")
+        rotate()
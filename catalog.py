@@ -0,0 +1,123 @@
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+from functools import partial
+
+from fastapi import Response
+
+from config import CATALOG_RECHECK_SECONDS
+from database import after_commit, db_query
+
+# Cache katalog produk di memori, udah dalam bentuk JSON bytes siap kirim.
+# Versi katalog disimpan di app_meta.catalog_version: tiap mutasi produk manggil bump(),
+# yang langsung buang cache worker ini (setelah commit). Worker lain dikabarin refresh_loop(),
+# yang cek versi di background tiap CATALOG_RECHECK_SECONDS lalu bangun ulang cache-nya.
+# Jalur request cuma baca dict; SQLite cuma kesentuh kalau cache kosong (habis invalidasi),
+# dan itupun di threadpool (route-nya def), di luar lock.
+
+_lock = threading.Lock()
+_cache = {}            # nama -> (etag, body)
+_version = None        # versi katalog terakhir yang diketahui worker ini
+_generation = 0        # naik tiap invalidasi: hasil build yang mulai sebelumnya gak disimpan
+
+def _dump(data):
+    body = json.dumps(data, separators=(",", ":")).encode()
+    return f'"{hashlib.md5(body).hexdigest()[:16]}"', body
+
+def _build_public():
+    rows = db_query("SELECT sku, provider, name, price FROM products WHERE active=1 ORDER BY provider, price")
+    return [
+        {
+            "sku": r[0],
+            "provider": r[1],
+            "name": r[2],
+            "price": r[3]
+        } for r in rows
+    ]
+
+def _build_admin():
+    # Ambil semua data, termasuk kolom category
+    rows = db_query("SELECT sku, provider, name, cost_price, price, active, category FROM products ORDER BY provider, price")
+
+    grouped = {}
+    for r in rows:
+        sku, provider, name, cost, price, active, category = r
+        # Kategorikan otomatis kalau kosong
+        cat_name = category if category else "Game"
+
+        if cat_name not in grouped:
+            grouped[cat_name] = {}
+        if provider not in grouped[cat_name]:
+            grouped[cat_name][provider] = []
+
+        grouped[cat_name][provider].append({
+            "sku": sku,
+            "provider": provider,
+            "name": name,
+            "cost": cost,
+            "price": price,
+            "active": active,
+            "profit": (price or 0) - (cost or 0)
+        })
+    return grouped
+
+_builders = {
+    "public": _build_public,
+    "admin": _build_admin,
+}
+
+def _invalidate(version=None):
+    global _version, _generation
+    with _lock:
+        if version is not None:
+            if _version is not None and version <= _version:
+                return
+            _version = version
+        _cache.clear()
+        _generation += 1
+
+def get(name):
+    # Balikin (etag, body_bytes)
+    hit = _cache.get(name)
+    if hit is not None:
+        return hit
+    # Cache kosong: bangun di luar lock (query SQLite gak nahan pembaca lain),
+    # disimpan cuma kalau gak ada bump selama bangun
+    generation = _generation
+    hit = _dump(_builders[name]())
+    with _lock:
+        if generation == _generation:
+            _cache[name] = hit
+    return hit
+
+def bump():
+    # Panggil setelah produk berubah (tambah/edit/hapus/toggle/sync/markup).
+    # Cache lokal dibuang setelah commit, biar gak kebangun ulang dari data yang belum ke-commit.
+    version = db_query("UPDATE app_meta SET value = value + 1 WHERE key='catalog_version' RETURNING value")[0][0]
+    after_commit(partial(_invalidate, version))
+
+def _current_version():
+    return db_query("SELECT value FROM app_meta WHERE key='catalog_version'")[0][0]
+
+def _warm():
+    # Versi di DB berubah (bump dari worker lain) -> buang cache & bangun ulang katalog publik
+    _invalidate(_current_version())
+    get("public")
+
+async def refresh_loop():
+    while True:
+        try:
+            await asyncio.to_thread(_warm)
+        except Exception as e:
+            logging.error(f"CATALOG refresh error {e}")
+        await asyncio.sleep(CATALOG_RECHECK_SECONDS)
+
+def response(request, name, cache_control):
+    etag, body = get(name)
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    # Browser udah pegang versi yang sama -> 304 tanpa body
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
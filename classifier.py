@@ -0,0 +1,87 @@
+import json
+import re
+from functools import lru_cache
+
+from config import CATEGORY_RULES_FILE
+
+# Deteksi kategori produk dari brand & kategori Digiflazz.
+# Semua keyword dikompilasi jadi SATU regex alternation per field, pakai word boundary
+# (jadi 'tri' gak lagi nyangkut di "Electric", 'ff' cuma cocok kalau memang kata "FF").
+# Kalau beberapa aturan cocok, yang menang priority paling kecil.
+# Hasil di-memo per (brand, category): price-list 10rb item cuma punya ratusan kombinasi.
+
+DEFAULT_CATEGORY = "Lainnya"
+
+DEFAULT_RULES = [
+    {
+        "category": "Pulsa", "priority": 10,
+        "brand": ["telkomsel", "xl", "axis", "indosat", "tri", "three", "smartfren", "by.u"],
+        "keywords": ["pulsa", "data", "paket", "internet", "masa aktif"],
+    },
+    {
+        "category": "E-Wallet", "priority": 20,
+        "brand": ["dana", "ovo", "gopay", "go-pay", "go pay", "shopeepay", "shopee pay", "linkaja", "maxim", "grab"],
+        "keywords": ["e-money", "emoney", "wallet"],
+    },
+    {
+        "category": "Game", "priority": 30,
+        "brand": ["mobile legends", "free fire", "ff", "pubg", "pubg mobile", "genshin", "genshin impact", "valorant", "steam"],
+        "keywords": ["game", "games", "voucher game", "vouchers", "vaucher"],
+    },
+]
+
+def _compile(words):
+    if not words:
+        return None
+    # Yang panjang duluan biar "pubg mobile" menang dari "pubg"
+    alts = "|".join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+    return re.compile(rf"(?<![a-z0-9])(?:{alts})(?![a-z0-9])")
+
+def _normalize(text):
+    return " ".join((text or "").lower().split())
+
+class Classifier:
+    def __init__(self, rules=None, default=DEFAULT_CATEGORY):
+        self.default = default
+        self.priority = {}
+        brand_map, keyword_map = {}, {}
+        for rule in sorted(rules or DEFAULT_RULES, key=lambda r: r["priority"]):
+            cat = rule["category"]
+            self.priority[cat] = rule["priority"]
+            for w in rule.get("brand", []):
+                brand_map.setdefault(_normalize(w), cat)
+            for w in rule.get("keywords", []):
+                keyword_map.setdefault(_normalize(w), cat)
+        self.brand_map = brand_map
+        self.keyword_map = keyword_map
+        self.brand_re = _compile(brand_map)
+        self.keyword_re = _compile(keyword_map)
+        self.classify = lru_cache(maxsize=8192)(self._classify)
+
+    def _matches(self, regex, mapping, text):
+        if regex is None or not text:
+            return []
+        return [mapping[m.group(0)] for m in regex.finditer(text)]
+
+    def _classify(self, brand, category):
+        brand = _normalize(brand)
+        category = _normalize(category)
+        found = self._matches(self.brand_re, self.brand_map, brand) + \
+                self._matches(self.keyword_re, self.keyword_map, category)
+        if not found:
+            return self.default
+        return min(found, key=self.priority.__getitem__)
+
+def load_rules():
+    if CATEGORY_RULES_FILE:
+        with open(CATEGORY_RULES_FILE) as f:
+            return json.load(f)
+    return DEFAULT_RULES
+
+_default = None
+
+def classify(brand, category):
+    global _default
+    if _default is None:
+        _default = Classifier(load_rules())
+    return _default.classify(brand or "", category or "")
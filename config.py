@@ -9,6 +9,7 @@ ADMIN_SECRET = os.getenv("ADMIN_SECRET")
 # ===== DIGIFLAZZ =====
 DIGIFLAZZ_USERNAME = os.getenv("DIGIFLAZZ_USERNAME")
 DIGIFLAZZ_KEY = os.getenv("DIGIFLAZZ_KEY")
+DIGIFLAZZ_WEBHOOK_SECRET = os.getenv("DIGIFLAZZ_WEBHOOK_SECRET", "rahasiamcd 123")  # samain sama isi di panel Digiflazz
 
 # ===== TRIPAY =====
 TRIPAY_API_KEY = os.getenv("TRIPAY_API_KEY")
@@ -23,3 +24,101 @@ TOKEN_ULTRAMSG = os.getenv("TOKEN_ULTRAMSG")
 BASE_URL = os.getenv("BASE_URL")  # URL publik untuk callback dan link QR
 
 ENV = "DEV"   # ganti ke "PROD" kalau sudah live
+
+# ===== DATABASE =====
+DB_PATH = os.getenv("DB_PATH", "db.sqlite3")
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))   # nunggu lock sebelum nyerah
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "16384"))      # page cache per koneksi
+DB_STATEMENT_CACHE = int(os.getenv("DB_STATEMENT_CACHE", "256"))    # prepared statement yang di-cache
+
+# ===== HTTP CLIENT (Tripay / Digiflazz) =====
+DIGIFLAZZ_BASE_URL = os.getenv("DIGIFLAZZ_BASE_URL", "https://api.digiflazz.com/v1")
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+
+# ===== ENGINE =====
+ENGINE_CONCURRENCY = int(os.getenv("ENGINE_CONCURRENCY", "10"))   # maksimal order yang diproses barengan
+DIGIFLAZZ_RPS = float(os.getenv("DIGIFLAZZ_RPS", "5"))           # batas request/detik ke Digiflazz (0 = tanpa batas)
+
+# ===== JOB QUEUE =====
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "60"))      # job RUNNING lebih lama dari ini dianggap macet
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))         # lewat ini job masuk DEAD
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))     # jaga-jaga kalau notify kelewat
+
+# ===== CEK STATUS DIGIFLAZZ (backoff per order) =====
+RECHECK_BASE_SECONDS = int(os.getenv("RECHECK_BASE_SECONDS", "30"))        # cek pertama setelah dikirim
+RECHECK_MAX_SECONDS = int(os.getenv("RECHECK_MAX_SECONDS", "900"))         # jeda cek paling lama
+RECHECK_DEADLINE_SECONDS = int(os.getenv("RECHECK_DEADLINE_SECONDS", "21600"))  # lewat ini -> NEEDS_REVIEW
+
+# ===== BACKUP =====
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+BACKUP_INTERVAL_SECONDS = int(os.getenv("BACKUP_INTERVAL_SECONDS", "3600"))
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "24"))              # snapshot terbaru yang disimpan
+BACKUP_KEEP_DAILY = int(os.getenv("BACKUP_KEEP_DAILY", "7"))   # plus 1 snapshot per hari selama N hari
+BACKUP_COMPRESS = os.getenv("BACKUP_COMPRESS", "1") == "1"
+
+# ===== CACHE KATALOG PRODUK =====
+CATALOG_RECHECK_SECONDS = float(os.getenv("CATALOG_RECHECK_SECONDS", "2"))  # seberapa sering cek versi katalog di DB
+CATALOG_MAX_AGE = int(os.getenv("CATALOG_MAX_AGE", "10"))                   # Cache-Control max-age /api/products
+
+# ===== KATEGORI PRODUK =====
+CATEGORY_RULES_FILE = os.getenv("CATEGORY_RULES_FILE")  # JSON aturan kategori (opsional), default ada di classifier.py
+
+# ===== RATE LIMIT =====
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")     # "memory" (per proses) / "sqlite" (bareng antar worker)
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))  # batas key di memori (LRU)
+TRUST_PROXY_HEADERS = os.getenv("TRUST_PROXY_HEADERS", "0") == "1"   # pakai X-Forwarded-For kalau di belakang proxy
+
+# ===== STATUS ORDER REALTIME (SSE / long-poll) =====
+EVENTS_RECHECK_SECONDS = float(os.getenv("EVENTS_RECHECK_SECONDS", "15"))  # cek ulang DB (event dari worker lain) + keepalive
+EVENTS_LONGPOLL_SECONDS = float(os.getenv("EVENTS_LONGPOLL_SECONDS", "25"))  # maksimal nahan request long-poll
+EVENTS_STREAM_SECONDS = float(os.getenv("EVENTS_STREAM_SECONDS", "900"))     # umur 1 koneksi SSE, habis itu browser nyambung ulang
+EVENTS_MAX_SUBSCRIBERS = int(os.getenv("EVENTS_MAX_SUBSCRIBERS", "5000"))   # batas koneksi nunggu per worker
+
+# ===== SESI ADMIN =====
+SESSION_SECRET = os.getenv("SESSION_SECRET")                          # kunci HMAC token sesi, samakan di semua worker (kosong = acak per proses)
+ADMIN_SECRET_TOKEN = os.getenv("ADMIN_SECRET_TOKEN", "0") == "1"       # 1 = ADMIN_SECRET statis diterima sebagai token (script / cron), default mati
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "28800"))  # umur token sesi (default 8 jam)
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", "2"))          # proses khusus bcrypt
+AUTH_HASH_QUEUE = int(os.getenv("AUTH_HASH_QUEUE", "8"))              # maksimal login yang antre bcrypt, lewat itu 503
+
+# ===== LOG EVENT ORDER (tabel logs) =====
+LOG_FLUSH_MS = int(os.getenv("LOG_FLUSH_MS", "200"))           # tulis ke DB tiap N ms...
+LOG_FLUSH_BATCH = int(os.getenv("LOG_FLUSH_BATCH", "500"))     # ...atau begitu antre M event
+LOG_BUFFER_MAX = int(os.getenv("LOG_BUFFER_MAX", "50000"))     # batas antrian di memori, lewat ini event terlama dibuang
+
+# ===== METRICS (/metrics, format Prometheus) =====
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")   # kalau diisi, scraper wajib kirim "Authorization: Bearer <token>"
+
+# ===== LEADER (multi worker / multi replika) =====
+LEADER_LEASE_SECONDS = float(os.getenv("LEADER_LEASE_SECONDS", "30"))      # lease hangus kalau leader gak heartbeat selama ini
+LEADER_HEARTBEAT_SECONDS = float(os.getenv("LEADER_HEARTBEAT_SECONDS", "10"))
+RECHECK_BATCH = int(os.getenv("RECHECK_BATCH", "100"))                     # order jatuh tempo yang diklaim 1 worker per putaran
+
+# ===== SWEEPER & ARSIP ORDER =====
+ORDER_EXPIRE_SECONDS = int(os.getenv("ORDER_EXPIRE_SECONDS", "86400"))    # umur invoice Tripay, lewat ini UNPAID -> EXPIRED
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))           # order final lebih tua dari ini pindah ke topup_archive
+SWEEP_INTERVAL_SECONDS = int(os.getenv("SWEEP_INTERVAL_SECONDS", "300"))
+SWEEP_BATCH = int(os.getenv("SWEEP_BATCH", "500"))                        # baris per transaksi, biar write lock gak lama
+
+# ===== SINKRON HARGA OTOMATIS (price-list Digiflazz) =====
+PRICE_SYNC_INTERVAL_SECONDS = int(os.getenv("PRICE_SYNC_INTERVAL_SECONDS", "900"))  # 0 = mati, sinkron cuma lewat tombol admin
+PRICE_SYNC_JITTER = float(os.getenv("PRICE_SYNC_JITTER", "0.1"))                   # jadwal diacak +-10%
+PRICE_SYNC_RETRY_SECONDS = int(os.getenv("PRICE_SYNC_RETRY_SECONDS", "60"))         # jeda coba lagi pertama kalau gagal / kena limit
+PRICE_SYNC_MAX_BACKOFF_SECONDS = int(os.getenv("PRICE_SYNC_MAX_BACKOFF_SECONDS", "3600"))
+
+# ===== CHANNEL PEMBAYARAN TRIPAY (payment_channels.py) =====
+PAYMENT_CHANNELS_REFRESH_SECONDS = int(os.getenv("PAYMENT_CHANNELS_REFRESH_SECONDS", "1800"))  # ambil ulang daftar channel + fee
+PAYMENT_CHANNELS_TTL = int(os.getenv("PAYMENT_CHANNELS_TTL", "3600"))                # lewat ini data dianggap basi (tetap dipakai sambil refresh)
+PAYMENT_CHANNELS_RETRY_SECONDS = int(os.getenv("PAYMENT_CHANNELS_RETRY_SECONDS", "60"))  # jeda coba lagi kalau Tripay gagal
+PAYMENT_CHANNELS_MAX_AGE = int(os.getenv("PAYMENT_CHANNELS_MAX_AGE", "300"))          # Cache-Control max-age /api/payment-channels
+
+# ===== STRUK (receipts.py) =====
+RECEIPT_DIR = os.getenv("RECEIPT_DIR", "receipts")                     # di-mount di /receipts
+RECEIPT_FORMAT = os.getenv("RECEIPT_FORMAT", "png")                    # "png" / "pdf"
+RECEIPT_TEMPLATE = os.getenv("RECEIPT_TEMPLATE")                       # gambar latar struk (opsional), default digambar polos
+RECEIPT_WORKERS = int(os.getenv("RECEIPT_WORKERS", "1"))               # proses khusus render struk
+RECEIPT_QUEUE = int(os.getenv("RECEIPT_QUEUE", "500"))                 # maksimal struk yang antre, sisanya disusul sweeper
+RECEIPT_CACHE_MAX_AGE = int(os.getenv("RECEIPT_CACHE_MAX_AGE", "31536000"))  # Cache-Control /receipts (nama file = hash isi)
@@ -1,42 +1,149 @@
-from datetime import datetime, timedelta
+from contextlib import contextmanager
+import logging
+import os
 import sqlite3
+import threading
 import time
 
-def db_execute(query, params=()):
-    for _ in range(5):
+import metrics
+from config import DB_PATH, DB_BUSY_TIMEOUT_MS, DB_CACHE_SIZE_KB, DB_STATEMENT_CACHE
+
+# Satu koneksi awet per thread (thread engine, tiap thread worker FastAPI, dst).
+# Gak ada lagi connect/close tiap query, prepared statement ikut ke-cache di koneksinya.
+_local = threading.local()
+
+def connect():
+    # isolation_level=None -> autocommit, transaksi diatur manual lewat transaction()
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=DB_BUSY_TIMEOUT_MS / 1000,
+        isolation_level=None,
+        check_same_thread=False,
+        cached_statements=DB_STATEMENT_CACHE,
+    )
+    conn.execute("PRAGMA journal_mode=WAL")  # pembaca gak ngeblok penulis
+    conn.execute("PRAGMA synchronous=NORMAL")  # aman di WAL, fsync cuma pas checkpoint
+    conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+def get_conn():
+    conn = getattr(_local, "conn", None)
+    # Habis fork (uvicorn --workers) koneksi warisan parent gak boleh dipakai
+    if conn is None or _local.pid != os.getpid():
+        conn = connect()
+        _local.conn = conn
+        _local.pid = os.getpid()
+        _local.depth = 0
+        _local.after = []
+    return conn
+
+def close_conn():
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+@contextmanager
+def transaction():
+    # Unit of work: semua db_execute/db_query di dalam blok ini commit SEKALI di akhir.
+    # Boleh nested (pakai SAVEPOINT). JANGAN await / nembak API di dalam blok ini,
+    # karena write lock dipegang sampai blok selesai.
+    conn = get_conn()
+    depth = _local.depth
+    pending = len(_local.after)
+    if depth == 0:
+        # Lama nunggu write lock + lama lock dipegang dicatat terpisah di metrics
+        started = time.perf_counter()
         try:
-            conn = sqlite3.connect("db.sqlite3", timeout=60)
-            cursor = conn.cursor()
-            cursor.execute(query, params)
-            conn.commit()
-            conn.close()
-            return True
+            conn.execute("BEGIN IMMEDIATE")
         except sqlite3.OperationalError as e:
-            if "locked" in str(e):
-                time.sleep(0.5)
-            else:
-                raise
+            _failed(e, "BEGIN IMMEDIATE")
+            raise
+        finally:
+            metrics.db_duration.observe(time.perf_counter() - started, "begin")
+        locked_at = time.perf_counter()
+    else:
+        conn.execute(f"SAVEPOINT sp{depth}")
+    _local.depth = depth + 1
+    try:
+        yield conn
+    except BaseException:
+        _local.depth = depth
+        del _local.after[pending:]  # hook dari blok yang di-rollback ikut batal
+        if depth == 0:
+            conn.execute("ROLLBACK")
+        else:
+            conn.execute(f"ROLLBACK TO sp{depth}")
+            conn.execute(f"RELEASE sp{depth}")
+        raise
+    _local.depth = depth
+    if depth == 0:
+        conn.execute("COMMIT")
+        metrics.db_duration.observe(time.perf_counter() - locked_at, "transaction")
+        hooks, _local.after = _local.after, []
+        for fn in hooks:
+            fn()
+    else:
+        conn.execute(f"RELEASE sp{depth}")
+
+def after_commit(fn):
+    # Jalanin fn setelah transaksi paling luar commit (langsung kalau lagi gak di transaksi).
+    # Buat efek ke luar DB (notif, publish) biar gak pernah ngabarin data yang belum ke-commit.
+    get_conn()
+    if _local.depth == 0:
+        fn()
+    else:
+        _local.after.append(fn)
+
+def _failed(e, query):
+    # "database is locked" = nunggu lock lewat busy_timeout, tanda penulis rebutan
+    metrics.db_errors.inc("locked" if "locked" in str(e) else "other")
+    logging.error(f"DB ERROR {e} | {query.strip()[:80]}")
+
+def db_execute(query, params=()):
+    # Balikin jumlah baris yang kena (rowcount). Kalau DB ke-lock lebih lama dari
+    # busy_timeout, errornya dilempar ke atas, bukan diem-diem return None.
+    started = time.perf_counter()
+    try:
+        return get_conn().execute(query, params).rowcount
+    except sqlite3.OperationalError as e:
+        _failed(e, query)
+        raise
+    finally:
+        metrics.db_duration.observe(time.perf_counter() - started, "execute")
+
+def db_executemany(query, seq_params):
+    started = time.perf_counter()
+    try:
+        return get_conn().executemany(query, seq_params).rowcount
+    except sqlite3.OperationalError as e:
+        _failed(e, query)
+        raise
+    finally:
+        metrics.db_duration.observe(time.perf_counter() - started, "executemany")
 
 def db_query(query, params=()):
-    conn = sqlite3.connect("db.sqlite3", timeout=60)
-    cursor = conn.cursor()
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
-
-def add_log(order_id, event, message):
-    created_at = (datetime.utcnow() + timedelta(hours=7)).isoformat()
-    db_execute("INSERT INTO logs (order_id, event, message, created_at) VALUES (?, ?, ?, ?)",
-               (order_id, event, message, created_at))
-def init_db():
-    # ... kodingan tabel yang sudah ada ...
-    
-    # TAMBAHKAN BARIS INI:
+    started = time.perf_counter()
+    try:
+        return get_conn().execute(query, params).fetchall()
+    except sqlite3.OperationalError as e:
+        _failed(e, query)
+        raise
+    finally:
+        metrics.db_duration.observe(time.perf_counter() - started, "query")
+
+def iter_query(query, params=(), batch=500):
+    # Generator buat hasil query gede (export): baca per batch pakai koneksi sendiri,
+    # jadi gak pernah fetchall satu tabel ke memori. Koneksi ditutup pas selesai.
+    conn = connect()
     try:
-        # Perintah untuk menambah kolom 'amount' secara paksa jika belum ada
-        db_execute("ALTER TABLE topup ADD COLUMN amount INTEGER", ())
-        print("✅ Kolom 'amount' berhasil ditambahkan ke database!")
-    except Exception as e:
-        # Kalau kolom sudah ada, dia akan error tapi kita abaikan saja (pass)
-        pass
\ No newline at end of file
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        conn.close()
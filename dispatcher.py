@@ -0,0 +1,48 @@
+import asyncio
+import logging
+import time
+
+from config import ENGINE_CONCURRENCY, DIGIFLAZZ_RPS
+
+# Dispatcher bareng buat engine & callback: maksimal ENGINE_CONCURRENCY panggilan
+# upstream jalan barengan, plus batas request/detik per provider.
+
+class RateLimiter:
+    # Token bucket: isi ulang `rate` token per detik, maksimal `burst` token
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+_limiters = {
+    "digiflazz": RateLimiter(DIGIFLAZZ_RPS),
+}
+_slots = asyncio.Semaphore(ENGINE_CONCURRENCY)
+
+async def call(provider, fn, *args, **kwargs):
+    async with _slots:
+        await _limiters[provider].acquire()
+        return await fn(*args, **kwargs)
+
+async def run_all(coros):
+    # Jalanin semuanya barengan (dibatasi _slots di dalam call), error satu order gak nyeret yang lain
+    results = await asyncio.gather(*coros, return_exceptions=True)
+    for r in results:
+        if isinstance(r, Exception):
+            logging.error(f"DISPATCH ERROR {r}")
+    return results
@@ -1,79 +1,163 @@
-import time
+import asyncio
 import logging
-import os
-import shutil
-from datetime import datetime, timedelta
+import time
 
+import dispatcher
+import job_queue
+import leader
+import metrics
+import order_state
+from event_log import add_log
+from config import JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS, RECHECK_BATCH, RECHECK_BASE_SECONDS, RECHECK_MAX_SECONDS, RECHECK_DEADLINE_SECONDS
 from database import db_query, db_execute
 from services.digiflazz_service import kirim_digiflazz, cek_status_digiflazz
 
-def polling_status_engine():
-    # 1. KIRIM TRANSAKSI YANG BARU DIBAYAR (PROCESSING)
-    new_orders = db_query("""
-        SELECT id, phone, nominal 
-        FROM topup 
-        WHERE topup_status='PROCESSING'
-    """)
-
-    for o in new_orders:
-        order_id = o[0]
-        phone = o[1]
-        sku = o[2] # Ambil SKU langsung dari database
-        
-        try:
-            res = kirim_digiflazz(sku, phone, order_id)
-            status = res.get("data", {}).get("status")
-            
-            if status in ["Pending", "Success"]:
-                db_execute("UPDATE topup SET topup_status='PENDING_PROVIDER' WHERE id=?", (order_id,))
-            else:
-                db_execute("UPDATE topup SET topup_status='FAILED' WHERE id=?", (order_id,))
-        except Exception as e:
-            logging.error(f"Error kirim_digiflazz {order_id}: {e}")
-
-    # 2. CEK STATUS TRANSAKSI YANG SEDANG BERJALAN DI DIGIFLAZZ
-    pending_orders = db_query("""
-        SELECT id, phone, nominal 
-        FROM topup 
-        WHERE topup_status='PENDING_PROVIDER'
-    """)
-
-    for r in pending_orders:
-        order_id = r[0]
-        phone = r[1]
-        sku = r[2]
-        
-        try:
-            status_df = cek_status_digiflazz(sku, phone, order_id)
-            data = status_df.get("data", {})
-            status = data.get("status")
-            sn = data.get("sn", "000000")
-
-            if status == "Success":
-                db_execute("UPDATE topup SET topup_status='SUCCESS', sn=? WHERE id=?", (sn, order_id))
-            elif status == "Gagal":
-                db_execute("UPDATE topup SET topup_status='FAILED' WHERE id=?", (order_id,))
-        except Exception as e:
-            logging.error(f"Error cek_status {order_id}: {e}")
-
-def backup_database():
-    try:
-        if not os.path.exists("backups"):
-            os.makedirs("backups")
-        # Waktu WIB (+7 Jam)
-        timestamp = (datetime.utcnow() + timedelta(hours=7)).strftime("%Y%m%d_%H%M%S")
-        backup_path = f"backups/db_{timestamp}.sqlite3"
-        shutil.copy("db.sqlite3", backup_path)
-    except Exception as e:
-        logging.error(f"Backup error {e}")
-
-def auto_engine_loop():
+# Digiflazz kadang balikin "Sukses", kadang "Success"
+STATUS_SUKSES = ("Sukses", "Success")
+
+def wait_provider(order_id, delay=RECHECK_BASE_SECONDS):
+    # Pindah ke PENDING_PROVIDER + jadwalin cek status pertama.
+    # Kalau webhook Digiflazz duluan masuk, transisi ini kalah dan jadwalnya gak kepakai.
+    now = time.time()
+    return order_state.transition(order_id, "wait_provider", next_check_at=now + delay,
+                                  check_attempts=0, check_deadline=now + RECHECK_DEADLINE_SECONDS)
+
+# Coroutine di sini jalan di event loop app: akses SQLite (bisa nunggu lock sampai busy_timeout)
+# selalu lewat asyncio.to_thread, biar request / SSE di worker yang sama gak ikut macet.
+
+async def dispatch_order(order_id, sku, target_id):
+    # KLAIM DULU: cuma satu pemanggil (engine / callback) yang bisa mindahin
+    # PROCESSING -> SENDING, jadi tiap order dikirim tepat sekali
+    if not await asyncio.to_thread(order_state.transition, order_id, "send"):
+        return False
+
+    res = await dispatcher.call("digiflazz", kirim_digiflazz, sku, target_id, order_id)
+    data = res.get("data", {})
+    status = data.get("status")
+    add_log(order_id, "provider", f"{status} rc={data.get('rc')} {data.get('message', '')}")
+
+    if status in STATUS_SUKSES:
+        await asyncio.to_thread(order_state.transition, order_id, "success", sn=data.get("sn", "000000"))
+    elif status == "Pending" or status is None:
+        # status None = koneksi putus, belum tentu gagal di Digiflazz.
+        # Biar dicek ulang pakai ref_id yang sama, jangan langsung FAILED.
+        await asyncio.to_thread(wait_provider, order_id)
+    else:
+        await asyncio.to_thread(order_state.transition, order_id, "fail", note=data.get("message"))
+    return True
+
+async def check_order(order_id, sku, target_id, attempts, deadline):
+    status_df = await dispatcher.call("digiflazz", cek_status_digiflazz, sku, target_id, order_id)
+    data = status_df.get("data", {})
+    status = data.get("status")
+    sn = data.get("sn", "000000")
+    add_log(order_id, "provider_check", f"{status} rc={data.get('rc')} {data.get('message', '')}")
+
+    # Semua lewat order_state (CAS): kalau webhook sudah duluan set SUCCESS/FAILED,
+    # hasil cek ini diabaikan
+    if status in STATUS_SUKSES:
+        await asyncio.to_thread(order_state.transition, order_id, "success", sn=sn, next_check_at=None)
+    elif status == "Gagal":
+        await asyncio.to_thread(order_state.transition, order_id, "fail", note=data.get("message"), next_check_at=None)
+    elif deadline and time.time() > deadline:
+        # Kelamaan pending: berhenti nanya, serahin ke admin
+        if await asyncio.to_thread(order_state.transition, order_id, "review", next_check_at=None):
+            logging.error(f"ENGINE: order {order_id} masih pending setelah {attempts + 1}x cek, butuh dicek admin")
+    else:
+        # Masih pending: backoff eksponensial 30s, 60s, 120s, ... maksimal RECHECK_MAX_SECONDS
+        delay = min(RECHECK_BASE_SECONDS * 2 ** (attempts + 1), RECHECK_MAX_SECONDS)
+        await asyncio.to_thread(db_execute, """
+            UPDATE topup SET check_attempts=check_attempts+1, next_check_at=?
+            WHERE id=? AND topup_status='PENDING_PROVIDER'
+        """, (time.time() + delay, order_id))
+
+@job_queue.handler("dispatch")
+async def handle_dispatch(order_id, attempt):
+    row = await asyncio.to_thread(db_query, "SELECT nominal, target_id, topup_status FROM topup WHERE id=?", (order_id,))
+    if not row:
+        return
+    sku, target_id, topup_status = row[0]
+    if topup_status == "SENDING" and attempt > 1:
+        # Lease job sebelumnya habis pas lagi nembak: jangan kirim ulang, cek status aja
+        await asyncio.to_thread(wait_provider, order_id, delay=0)
+        return
+    await dispatch_order(order_id, sku, target_id)
+
+def recover_inflight():
+    # Order yang ketinggalan di SENDING (app mati pas lagi nembak) gak dikirim ulang,
+    # tapi dicek statusnya pakai ref_id yang sama. Yang job dispatch-nya masih dipegang
+    # worker lain (lease belum habis) jangan diganggu, bisa jadi lagi ditembak beneran.
+    now = time.time()
+    n = order_state.transition_all(
+        "wait_provider",
+        "id NOT IN (SELECT order_id FROM jobs WHERE kind='dispatch' AND status='RUNNING' AND lease_until >= ?)", (now,),
+        next_check_at=now, check_attempts=0, check_deadline=now + RECHECK_DEADLINE_SECONDS
+    )
+    if n:
+        logging.warning(f"ENGINE: {n} order SENDING dipindah ke PENDING_PROVIDER")
+
+def enqueue_missing():
+    # JARING PENGAMAN: order PROCESSING yang belum punya job dispatch (data lama / enqueue kelewat).
+    # Pengiriman normalnya lewat job queue begitu callback Tripay masuk, bukan nunggu tick ini.
+    n = db_execute("""
+        INSERT OR IGNORE INTO jobs (kind, order_id, status, max_attempts, run_at, updated_at)
+        SELECT 'dispatch', id, 'READY', ?, ?, ? FROM topup WHERE topup_status='PROCESSING'
+    """, (JOB_MAX_ATTEMPTS, time.time(), time.time()))
+    if n:
+        job_queue.notify()
+
+def claim_due(limit=RECHECK_BATCH):
+    # Klaim order yang jadwal cek-nya sudah jatuh tempo: next_check_at didorong maju
+    # JOB_LEASE_SECONDS dalam UPDATE yang sama, jadi worker lain gak ngecek order yang sama.
+    # Kalau worker ini mati di tengah jalan, order-nya jatuh tempo lagi setelah lease habis.
+    now = time.time()
+    return db_query("""
+        UPDATE topup SET next_check_at=?
+        WHERE id IN (
+            SELECT id FROM topup
+            WHERE topup_status='PENDING_PROVIDER' AND next_check_at <= ?
+            ORDER BY next_check_at LIMIT ?
+        )
+        RETURNING id, nominal, target_id, check_attempts, check_deadline
+    """, (now + JOB_LEASE_SECONDS, now, limit))
+
+async def polling_status_engine():
+    # 1. Kerjaan singleton: cuma di worker yang pegang lease leader
+    if leader.is_leader():
+        await asyncio.to_thread(enqueue_missing)
+        await asyncio.to_thread(job_queue.purge_done)
+
+    # 2. CEK STATUS TRANSAKSI DI DIGIFLAZZ: semua worker boleh, tiap order diklaim satu worker
+    due = await asyncio.to_thread(claim_due)
+    await dispatcher.run_all(check_order(*r) for r in due)
+
+async def auto_engine_loop():
+    # Jalan sebagai task di event loop app (bareng route async), jadi bisa pakai
+    # HTTP client yang sama. Backup jalan di thread sendiri (backup.py).
+    was_leader = False
     while True:
+        started = time.perf_counter()
         try:
-            backup_database()
-            polling_status_engine()
+            # Baru jadi leader (start pertama / ambil alih leader yang mati) -> beresin SENDING nyangkut
+            if leader.is_leader() and not was_leader:
+                await asyncio.to_thread(recover_inflight)
+            was_leader = leader.is_leader()
+            await polling_status_engine()
         except Exception as e:
             logging.error(f"ENGINE ERROR {e}")
-        
+        metrics.engine_duration.observe(time.perf_counter() - started)
+
         # Cek setiap 15 detik
-        time.sleep(15)
\ No newline at end of file
+        await asyncio.sleep(15)
+
+@metrics.collector
+def backlog_metrics():
+    # Dihitung pas /metrics di-scrape: GROUP BY kena index status, gak scan tabel
+    orders = {(r[0],): r[1] for r in db_query("SELECT topup_status, COUNT(*) FROM topup GROUP BY topup_status")}
+    jobs = {(r[0],): r[1] for r in db_query("SELECT status, COUNT(*) FROM jobs GROUP BY status")}
+    due = db_query("SELECT COUNT(*) FROM topup WHERE topup_status='PENDING_PROVIDER' AND next_check_at <= ?", (time.time(),))[0][0]
+    return [
+        ("topup_orders", "Jumlah order per topup_status", "gauge", orders, ("topup_status",)),
+        ("jobs", "Jumlah job per status (DEAD = dead letter)", "gauge", jobs, ("status",)),
+        ("recheck_due", "Order PENDING_PROVIDER yang jadwal cek-nya sudah lewat", "gauge", {(): due}, ()),
+    ]
@@ -0,0 +1,91 @@
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+import metrics
+from config import LOG_FLUSH_MS, LOG_FLUSH_BATCH, LOG_BUFFER_MAX
+from database import db_executemany, db_query, transaction
+
+# Log event order (tabel logs): dibuat, invoice, bayar, kirim, hasil provider, webhook.
+# add_log cuma append ke antrian di memori (hitungan mikrodetik, aman dari thread mana aja),
+# thread writer yang nulis ke DB per batch dalam satu transaksi.
+# Antrian dibatasi LOG_BUFFER_MAX: kalau DB macet lama, event terlama yang dibuang,
+# request gak pernah ikut nunggu.
+
+_buf = deque(maxlen=LOG_BUFFER_MAX)
+_wake = threading.Event()
+_stop = threading.Event()
+_thread = None
+dropped = 0
+
+def add_log(order_id, event, message=""):
+    global dropped
+    if len(_buf) == _buf.maxlen:
+        dropped += 1
+    _buf.append((order_id, event, message, time.time()))
+    if len(_buf) >= LOG_FLUSH_BATCH:
+        _wake.set()
+
+def _created_at(ts):
+    # Waktu WIB (+7 Jam), sama kayak created_at tabel lain
+    return (datetime.utcfromtimestamp(ts) + timedelta(hours=7)).isoformat()
+
+def flush():
+    batch = []
+    while _buf:
+        try:
+            order_id, event, message, ts = _buf.popleft()
+        except IndexError:
+            break
+        batch.append((order_id, event, message, _created_at(ts)))
+    if not batch:
+        return 0
+    try:
+        with transaction():
+            db_executemany("INSERT INTO logs (order_id, event, message, created_at) VALUES (?, ?, ?, ?)", batch)
+    except Exception as e:
+        logging.error(f"LOG WRITER: {len(batch)} event gagal ditulis, dibuang: {e}")
+        return 0
+    return len(batch)
+
+def _writer():
+    while not _stop.is_set():
+        _wake.wait(LOG_FLUSH_MS / 1000)
+        _wake.clear()
+        flush()
+    flush()
+
+def start():
+    global _thread
+    if _thread is None or not _thread.is_alive():
+        _stop.clear()
+        _thread = threading.Thread(target=_writer, name="event-log", daemon=True)
+        _thread.start()
+    return _thread
+
+def stop():
+    # Pas shutdown: tulis sisa antrian dulu biar gak ada event yang hilang
+    _stop.set()
+    _wake.set()
+    if _thread is not None:
+        _thread.join(timeout=10)
+    flush()
+
+def timeline(order_id):
+    rows = db_query("SELECT event, message, created_at FROM logs WHERE order_id=? ORDER BY id", (order_id,))
+    events = [{"event": r[0], "message": r[1], "created_at": r[2]} for r in rows]
+    # Plus yang masih antre di memori (belum ke-flush)
+    events += [
+        {"event": e[1], "message": e[2], "created_at": _created_at(e[3])}
+        for e in list(_buf) if e[0] == order_id
+    ]
+    return events
+
+@metrics.collector
+def _metrics():
+    return [
+        ("event_log_buffered", "Event log yang antre belum ditulis", "gauge", {(): len(_buf)}, ()),
+        ("event_log_dropped_total", "Event log yang dibuang karena antrian penuh", "counter", {(): dropped}, ()),
+    ]
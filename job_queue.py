@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+
+from config import ENGINE_CONCURRENCY, JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS, JOB_POLL_INTERVAL
+from database import db_execute, db_query, transaction
+
+# Antrian job di SQLite (tabel jobs). Route cukup enqueue (ikut transaksi yang sama
+# dengan update status order), consumer di event loop ngambil job dalam hitungan ms.
+# Job diklaim pakai lease: kalau worker mati di tengah jalan, job diambil ulang
+# setelah lease habis. Gagal terus sampai max_attempts -> DEAD (dead letter).
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+_handlers = {}
+_inflight = set()
+_wakeup = asyncio.Event()
+_loop = None
+
+def handler(kind):
+    def deco(fn):
+        _handlers[kind] = fn
+        return fn
+    return deco
+
+def enqueue(kind, order_id, delay=0, max_attempts=JOB_MAX_ATTEMPTS):
+    # INSERT OR IGNORE: job yang sama untuk order yang sama cuma masuk sekali
+    added = db_execute(
+        """INSERT OR IGNORE INTO jobs (kind, order_id, status, max_attempts, run_at, updated_at)
+           VALUES (?, ?, 'READY', ?, ?, ?)""",
+        (kind, order_id, max_attempts, time.time() + delay, time.time())
+    )
+    notify()
+    return bool(added)
+
+def notify():
+    # Aman dipanggil dari thread mana aja. Kalau dipanggil di dalam transaction(),
+    # klaim consumer (BEGIN IMMEDIATE) tetap nunggu commit-nya dulu.
+    if _loop is not None and not _loop.is_closed():
+        _loop.call_soon_threadsafe(_wakeup.set)
+
+def claim(limit):
+    now = time.time()
+    with transaction():
+        # Lease habis + jatah percobaan habis -> langsung DEAD, jangan diambil lagi
+        db_execute("""
+            UPDATE jobs SET status='DEAD', last_error=COALESCE(last_error, 'lease habis'), updated_at=?
+            WHERE status='RUNNING' AND lease_until < ? AND attempts >= max_attempts
+        """, (now, now))
+        return db_query("""
+            UPDATE jobs SET status='RUNNING', claimed_by=?, lease_until=?, attempts=attempts+1, updated_at=?
+            WHERE id IN (
+                SELECT id FROM jobs
+                WHERE (status='READY' AND run_at <= ?) OR (status='RUNNING' AND lease_until < ?)
+                ORDER BY run_at LIMIT ?
+            )
+            RETURNING id, kind, order_id, attempts, max_attempts
+        """, (WORKER_ID, now + JOB_LEASE_SECONDS, now, now, now, limit))
+
+def _finish(job_id, error=None, attempts=0, max_attempts=0):
+    now = time.time()
+    if error is None:
+        db_execute("UPDATE jobs SET status='DONE', lease_until=NULL, updated_at=? WHERE id=? AND claimed_by=?",
+                   (now, job_id, WORKER_ID))
+    elif attempts >= max_attempts:
+        db_execute("UPDATE jobs SET status='DEAD', last_error=?, lease_until=NULL, updated_at=? WHERE id=? AND claimed_by=?",
+                   (error, now, job_id, WORKER_ID))
+        logging.error(f"JOB DEAD #{job_id}: {error}")
+    else:
+        # Backoff eksponensial: 2, 4, 8, ... maksimal 5 menit
+        backoff = min(2 ** attempts, 300)
+        db_execute("UPDATE jobs SET status='READY', last_error=?, run_at=?, lease_until=NULL, updated_at=? WHERE id=? AND claimed_by=?",
+                   (error, now + backoff, now, job_id, WORKER_ID))
+
+async def _run(job):
+    job_id, kind, order_id, attempts, max_attempts = job
+    try:
+        fn = _handlers.get(kind)
+        if fn is None:
+            raise Exception(f"Handler job '{kind}' tidak ada")
+        await fn(order_id, attempts)
+        await asyncio.to_thread(_finish, job_id)
+    except Exception as e:
+        logging.error(f"JOB ERROR #{job_id} {kind} {order_id}: {e}")
+        await asyncio.to_thread(_finish, job_id, str(e), attempts, max_attempts)
+
+def _done(task):
+    _inflight.discard(task)
+    _wakeup.set()
+
+async def consumer_loop():
+    global _loop
+    _loop = asyncio.get_running_loop()
+    while True:
+        # clear SEBELUM klaim, biar notify yang masuk pas lagi klaim gak hilang
+        _wakeup.clear()
+        try:
+            free = ENGINE_CONCURRENCY - len(_inflight)
+            # Klaim (BEGIN IMMEDIATE, bisa nunggu lock) di threadpool, event loop tetap jalan
+            for job in (await asyncio.to_thread(claim, free) if free > 0 else []):
+                task = asyncio.create_task(_run(job))
+                _inflight.add(task)
+                task.add_done_callback(_done)
+        except Exception as e:
+            logging.error(f"JOB CONSUMER ERROR {e}")
+        try:
+            await asyncio.wait_for(_wakeup.wait(), JOB_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+def purge_done(older_than=86400):
+    return db_execute("DELETE FROM jobs WHERE status='DONE' AND updated_at < ?", (time.time() - older_than,))
+
+def dead_jobs(limit=100):
+    rows = db_query("""
+        SELECT id, kind, order_id, attempts, last_error, created_at FROM jobs
+        WHERE status='DEAD' ORDER BY id DESC LIMIT ?
+    """, (limit,))
+    return [{"id": r[0], "kind": r[1], "order_id": r[2], "attempts": r[3], "last_error": r[4], "created_at": r[5]} for r in rows]
+
+def retry(job_id):
+    n = db_execute("UPDATE jobs SET status='READY', attempts=0, run_at=?, updated_at=? WHERE id=? AND status='DEAD'",
+                   (time.time(), time.time(), job_id))
+    notify()
+    return bool(n)
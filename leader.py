@@ -0,0 +1,62 @@
+import asyncio
+import logging
+import time
+
+import metrics
+from config import LEADER_LEASE_SECONDS, LEADER_HEARTBEAT_SECONDS
+from database import db_execute
+from job_queue import WORKER_ID
+
+# Leader lease di SQLite (tabel leases). Dengan uvicorn --workers N / beberapa replika
+# yang pakai DB yang sama, cuma satu proses yang megang lease dan ngejalanin kerjaan
+# singleton (jaring pengaman engine, recovery, purge, backup, dst). Lease diperpanjang
+# tiap LEADER_HEARTBEAT_SECONDS; kalau leader mati / macet, lease hangus setelah
+# LEADER_LEASE_SECONDS dan worker lain ambil alih.
+# Kerjaan per order (consumer job_queue, cek status) tetap jalan di semua worker,
+# karena klaimnya sudah atomik per baris.
+
+NAME = "engine"
+
+_held_until = 0.0    # sampai kapan lease kita pasti masih sah (pakai jam monotonic lokal)
+
+def try_acquire(name=NAME, ttl=LEADER_LEASE_SECONDS):
+    # Satu UPSERT: ambil kalau kosong / hangus, perpanjang kalau punya sendiri
+    now = time.time()
+    return bool(db_execute("""
+        INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET holder=excluded.holder, expires_at=excluded.expires_at
+        WHERE leases.holder=excluded.holder OR leases.expires_at < ?
+    """, (name, WORKER_ID, now + ttl, now)))
+
+def release(name=NAME):
+    global _held_until
+    _held_until = 0.0
+    db_execute("DELETE FROM leases WHERE name=? AND holder=?", (name, WORKER_ID))
+
+def is_leader():
+    # Aman dipanggil dari thread mana aja. Kalau heartbeat telat, anggap udah bukan leader
+    # (sebelum lease-nya beneran hangus di DB), biar gak ada dua leader barengan.
+    return time.monotonic() < _held_until
+
+async def leader_loop():
+    global _held_until
+    was_leader = False
+    while True:
+        started = time.monotonic()
+        try:
+            # UPSERT bisa nunggu lock SQLite, jangan di event loop
+            if await asyncio.to_thread(try_acquire):
+                # Sisain margin satu heartbeat dari masa lease di DB
+                _held_until = started + LEADER_LEASE_SECONDS - LEADER_HEARTBEAT_SECONDS
+            else:
+                _held_until = 0.0
+        except Exception as e:
+            logging.error(f"LEADER heartbeat error {e}")
+        if is_leader() != was_leader:
+            was_leader = is_leader()
+            logging.warning(f"LEADER: {WORKER_ID} {'jadi leader' if was_leader else 'lepas leader'}")
+        await asyncio.sleep(LEADER_HEARTBEAT_SECONDS)
+
+@metrics.collector
+def _metrics():
+    return [("is_leader", "1 kalau worker ini pegang lease leader", "gauge", {(): int(is_leader())}, ())]
@@ -0,0 +1,141 @@
+# ===== FILE: loadtest/driver.py =====
+# Load driver: N pembeli simulasi jalan barengan lewat alur lengkap
+#   /topup -> (bayar di fake Tripay -> /callback) -> engine -> Digiflazz -> webhook -> SUCCESS
+# lalu lapor orders/detik + p50/p95/p99 per tahap.
+#
+#   python loadtest/driver.py --customers 500 --concurrency 100
+#
+# App harus jalan dengan TRUST_PROXY_HEADERS=1: tiap pembeli dapat IP (X-Forwarded-For)
+# dan nomor WA sendiri, jadi rate limit per IP / per nomor gak ikut keukur.
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import httpx
+
+STAGES = ["topup", "callback", "fulfil", "total"]
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+async def ensure_product(client, args):
+    res = await client.get(f"{args.app}/api/products")
+    if any(p["sku"] == args.sku for p in res.json()):
+        return
+    res = await client.post(f"{args.app}/admin/api/products", headers={"token": args.admin_token}, json={
+        "provider": "LOADTEST", "name": f"Load test {args.sku}", "sku": args.sku, "cost": 1000, "price": args.price,
+    })
+    res.raise_for_status()
+    # Katalog di-cache, tunggu sampai produk kebaca /topup
+    await asyncio.sleep(0.5)
+
+async def wait_final(client, args, order_id, ip):
+    # Long-poll /wait sampai status final (sama kayak browser yang gak bisa SSE)
+    status = "PAID"
+    deadline = time.monotonic() + args.timeout
+    while time.monotonic() < deadline:
+        res = await client.get(f"{args.app}/topup/{order_id}/wait", params={"since": status},
+                               headers={"X-Forwarded-For": ip})
+        if res.status_code != 200:
+            await asyncio.sleep(1)
+            continue
+        status = res.json()["status"]
+        if status in ("SUCCESS", "FAILED"):
+            return status
+    return "TIMEOUT"
+
+async def customer(i, client, args, results):
+    ip = f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}"
+    phone = f"08{i:010d}"
+    t0 = time.perf_counter()
+    res = await client.post(f"{args.app}/topup", headers={"X-Forwarded-For": ip}, json={
+        "phone": phone, "target_id": f"{100000 + i}", "nominal": args.sku, "method": args.method,
+    })
+    t1 = time.perf_counter()
+    if res.status_code != 200:
+        results["errors"][f"topup {res.status_code}"] = results["errors"].get(f"topup {res.status_code}", 0) + 1
+        return
+    order_id = res.json()["id"]
+
+    res = await client.post(f"{args.fake}/tripay/_pay/{order_id}")
+    t2 = time.perf_counter()
+    if res.status_code != 200 or not res.json()["body"].get("success"):
+        results["errors"]["callback"] = results["errors"].get("callback", 0) + 1
+        return
+
+    final = await wait_final(client, args, order_id, ip)
+    t3 = time.perf_counter()
+    results["final"][final] = results["final"].get(final, 0) + 1
+    if final == "TIMEOUT":
+        return
+    results["topup"].append(t1 - t0)
+    results["callback"].append(t2 - t1)
+    results["fulfil"].append(t3 - t2)
+    results["total"].append(t3 - t0)
+
+async def run(args):
+    results = {s: [] for s in STAGES}
+    results["errors"] = {}
+    results["final"] = {}
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        await ensure_product(client, args)
+        sem = asyncio.Semaphore(args.concurrency)
+
+        async def one(i):
+            async with sem:
+                try:
+                    await customer(i, client, args, results)
+                except Exception as e:
+                    key = type(e).__name__
+                    results["errors"][key] = results["errors"].get(key, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(args.customers)))
+        elapsed = time.perf_counter() - started
+        upstream = (await client.get(f"{args.fake}/_stats")).json()
+    return results, elapsed, upstream
+
+def report(results, elapsed, upstream, args):
+    done = len(results["total"])
+    print(f"\n📊 {args.customers} pembeli, concurrency {args.concurrency}, {elapsed:.1f} detik")
+    print(f"   selesai {done} -> {done / elapsed:.1f} orders/detik | status akhir {results['final']}")
+    if results["errors"]:
+        print(f"   error {results['errors']}")
+    print(f"   {'tahap':<10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}   (ms)")
+    for s in STAGES:
+        v = results[s]
+        print(f"   {s:<10}" + "".join(f"{percentile(v, p) * 1000:>10.0f}" for p in (50, 95, 99, 100)))
+    print(f"   upstream {upstream}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "customers": args.customers, "concurrency": args.concurrency, "elapsed": elapsed,
+                "orders_per_sec": done / elapsed, "final": results["final"], "errors": results["errors"],
+                "stages": {s: {f"p{p}": percentile(results[s], p) for p in (50, 95, 99)} for s in STAGES},
+            }, f, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test alur order end-to-end")
+    parser.add_argument("--app", default=os.getenv("LOADTEST_APP_URL", "http://127.0.0.1:8000"))
+    parser.add_argument("--fake", default=os.getenv("LOADTEST_FAKE_URL", "http://127.0.0.1:9100"))
+    parser.add_argument("--customers", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--sku", default="LOADTEST5")
+    parser.add_argument("--price", type=int, default=5000)
+    parser.add_argument("--method", default="QRIS")
+    parser.add_argument("--timeout", type=float, default=120, help="batas nunggu 1 order sampai final (detik)")
+    parser.add_argument("--admin-token", default=os.getenv("ADMIN_SECRET", ""))
+    parser.add_argument("--json", help="simpan ringkasan ke file JSON (buat dibandingin antar deploy)")
+    args = parser.parse_args()
+    report(*asyncio.run(run(args)), args)
+
+if __name__ == "__main__":
+    main()
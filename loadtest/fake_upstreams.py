@@ -0,0 +1,215 @@
+# ===== FILE: loadtest/fake_upstreams.py =====
+# Tiruan Tripay + Digiflazz buat load test lokal (gak bayar, gak kena limit asli).
+# Jalanin:  uvicorn loadtest.fake_upstreams:app --port 9100
+# Terus app-nya diarahkan ke sini:
+#   TRIPAY_BASE_URL=http://127.0.0.1:9100/tripay
+#   DIGIFLAZZ_BASE_URL=http://127.0.0.1:9100/digiflazz
+# Semua kunci harus sama dengan env app (TRIPAY_PRIVATE_KEY, DIGIFLAZZ_KEY, dst),
+# karena signature dicek beneran di dua arah.
+
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import uuid
+
+import httpx
+from fastapi import FastAPI, HTTPException, Request
+
+TRIPAY_API_KEY = os.getenv("TRIPAY_API_KEY", "")
+TRIPAY_PRIVATE_KEY = os.getenv("TRIPAY_PRIVATE_KEY", "")
+TRIPAY_MERCHANT_CODE = os.getenv("TRIPAY_MERCHANT_CODE", "")
+DIGIFLAZZ_USERNAME = os.getenv("DIGIFLAZZ_USERNAME", "")
+DIGIFLAZZ_KEY = os.getenv("DIGIFLAZZ_KEY", "")
+DIGIFLAZZ_WEBHOOK_SECRET = os.getenv("DIGIFLAZZ_WEBHOOK_SECRET", "rahasiamcd 123")
+
+APP_URL = os.getenv("FAKE_APP_URL", "http://127.0.0.1:8000")        # app yang dites (tujuan callback/webhook)
+LATENCY_MS = float(os.getenv("FAKE_LATENCY_MS", "150"))              # rata-rata latency tiap API
+JITTER_MS = float(os.getenv("FAKE_JITTER_MS", "50"))
+TRIPAY_ERROR_RATE = float(os.getenv("FAKE_TRIPAY_ERROR_RATE", "0"))  # peluang HTTP 500 dari Tripay
+DF_ERROR_RATE = float(os.getenv("FAKE_DF_ERROR_RATE", "0"))          # peluang HTTP 500 / putus dari Digiflazz
+DF_FAIL_RATE = float(os.getenv("FAKE_DF_FAIL_RATE", "0.02"))         # peluang transaksi "Gagal"
+DF_PENDING_RATE = float(os.getenv("FAKE_DF_PENDING_RATE", "0.7"))    # peluang "Pending" lalu dikabari webhook
+WEBHOOK_DELAY_MS = float(os.getenv("FAKE_WEBHOOK_DELAY_MS", "2000"))
+WEBHOOK_LOSS_RATE = float(os.getenv("FAKE_WEBHOOK_LOSS_RATE", "0"))  # webhook yang "hilang" (app harus cek status sendiri)
+PRODUCTS = int(os.getenv("FAKE_PRODUCTS", "500"))                   # jumlah SKU di price-list
+
+app = FastAPI(title="Fake Tripay + Digiflazz")
+_client = None
+_invoices = {}      # merchant_ref -> payload invoice
+_trx = {}           # ref_id -> hasil akhir transaksi Digiflazz
+_stats = {"invoice": 0, "callback": 0, "transaction": 0, "check": 0, "webhook": 0, "rejected_sign": 0}
+
+def client():
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(timeout=30)
+    return _client
+
+async def _latency():
+    await asyncio.sleep(max(0.0, random.gauss(LATENCY_MS, JITTER_MS)) / 1000)
+
+def _md5(s):
+    return hashlib.md5(s.encode()).hexdigest()
+
+# ===== TRIPAY =====
+@app.post("/tripay/transaction/create")
+async def tripay_create(request: Request):
+    await _latency()
+    if request.headers.get("authorization") != f"Bearer {TRIPAY_API_KEY}":
+        raise HTTPException(401, "Invalid API key")
+    if random.random() < TRIPAY_ERROR_RATE:
+        raise HTTPException(500, "Simulated Tripay error")
+
+    data = await request.json()
+    expected = hmac.new(TRIPAY_PRIVATE_KEY.encode(),
+                        f"{TRIPAY_MERCHANT_CODE}{data['merchant_ref']}{data['amount']}".encode(),
+                        hashlib.sha256).hexdigest()
+    if data.get("signature") != expected:
+        _stats["rejected_sign"] += 1
+        return {"success": False, "message": "Invalid signature"}
+
+    reference = "T" + uuid.uuid4().hex[:12].upper()
+    _invoices[data["merchant_ref"]] = {**data, "reference": reference}
+    _stats["invoice"] += 1
+    return {"success": True, "data": {
+        "reference": reference,
+        "merchant_ref": data["merchant_ref"],
+        "amount": data["amount"],
+        "checkout_url": f"{APP_URL}/fake-checkout/{reference}",
+        "qr_url": f"{APP_URL}/fake-qr/{reference}.png" if str(data.get("method")).upper() == "QRIS" else None,
+    }}
+
+@app.get("/tripay/merchant/payment-channel")
+async def tripay_channels(request: Request):
+    await _latency()
+    if request.headers.get("authorization") != f"Bearer {TRIPAY_API_KEY}":
+        raise HTTPException(401, "Invalid API key")
+    def channel(code, name, group, flat, percent):
+        fee = {"flat": flat, "percent": str(percent)}
+        return {"group": group, "code": code, "name": name, "type": "DIRECT", "active": True,
+                "fee_merchant": fee, "fee_customer": {"flat": 0, "percent": "0"}, "total_fee": fee,
+                "minimum_fee": None, "maximum_fee": None}
+    return {"success": True, "data": [
+        channel("QRIS", "QRIS", "E-Wallet", 750, 0.7),
+        channel("OVO", "OVO", "E-Wallet", 0, 1.5),
+        channel("DANA", "DANA", "E-Wallet", 0, 1.5),
+        channel("BRIVA", "BRI Virtual Account", "Virtual Account", 4250, 0),
+    ]}
+
+@app.post("/tripay/_pay/{merchant_ref}")
+async def tripay_pay(merchant_ref: str, status: str = "PAID"):
+    # Dipanggil driver = "pembeli bayar". Stand-in lalu ngirim callback bertanda tangan ke app,
+    # persis kayak Tripay. Balik setelah app ngejawab callback-nya.
+    inv = _invoices.get(merchant_ref)
+    if not inv:
+        raise HTTPException(404, "Invoice tidak ada")
+    body = json.dumps({
+        "reference": inv["reference"],
+        "merchant_ref": merchant_ref,
+        "payment_method": inv.get("method"),
+        "total_amount": inv["amount"],
+        "status": status,
+    }).encode()
+    sig = hmac.new(TRIPAY_PRIVATE_KEY.encode(), body, hashlib.sha256).hexdigest()
+    res = await client().post(f"{APP_URL}/callback", content=body, headers={
+        "Content-Type": "application/json",
+        "X-Callback-Event": "payment_status",
+        "X-Callback-Signature": sig,
+    })
+    _stats["callback"] += 1
+    return {"status_code": res.status_code, "body": res.json()}
+
+# ===== DIGIFLAZZ =====
+def _pick_result():
+    r = random.random()
+    if r < DF_FAIL_RATE:
+        return "Gagal"
+    if r < DF_FAIL_RATE + DF_PENDING_RATE:
+        return "Pending"
+    return "Sukses"
+
+def _data(ref_id, payload, status):
+    d = {
+        "ref_id": ref_id,
+        "customer_no": payload.get("customer_no"),
+        "buyer_sku_code": payload.get("buyer_sku_code"),
+        "status": status,
+        "rc": {"Sukses": "00", "Pending": "03", "Gagal": "40"}[status],
+        "sn": "",
+        "message": {"Sukses": "Transaksi Sukses", "Pending": "Transaksi Pending", "Gagal": "Nomor tujuan salah"}[status],
+    }
+    if status == "Sukses":
+        d["sn"] = "SN" + uuid.uuid4().hex[:16].upper()
+    return d
+
+async def _send_webhook(ref_id, payload, final):
+    await asyncio.sleep(max(0.0, random.gauss(WEBHOOK_DELAY_MS, WEBHOOK_DELAY_MS / 4)) / 1000)
+    _trx[ref_id] = final
+    if random.random() < WEBHOOK_LOSS_RATE:
+        return
+    body = json.dumps({"data": _data(ref_id, payload, final)}).encode()
+    sig = "sha1=" + hmac.new(DIGIFLAZZ_WEBHOOK_SECRET.encode(), body, hashlib.sha1).hexdigest()
+    try:
+        await client().post(f"{APP_URL}/api/webhook/digiflazz", content=body, headers={
+            "Content-Type": "application/json",
+            "X-Digiflazz-Event": "update",
+            "X-Hub-Signature": sig,
+        })
+        _stats["webhook"] += 1
+    except Exception:
+        pass
+
+@app.post("/digiflazz/transaction")
+async def digiflazz_transaction(request: Request):
+    await _latency()
+    payload = await request.json()
+    ref_id = payload.get("ref_id", "")
+    if payload.get("sign") != _md5(DIGIFLAZZ_USERNAME + DIGIFLAZZ_KEY + ref_id):
+        _stats["rejected_sign"] += 1
+        return {"data": {"ref_id": ref_id, "status": "Gagal", "rc": "41", "message": "Signature Anda salah"}}
+    if random.random() < DF_ERROR_RATE:
+        raise HTTPException(500, "Simulated Digiflazz error")
+
+    # ref_id yang sama = cek status (begitu juga Digiflazz aslinya)
+    if ref_id in _trx:
+        _stats["check"] += 1
+        return {"data": _data(ref_id, payload, _trx[ref_id])}
+
+    _stats["transaction"] += 1
+    status = _pick_result()
+    if status == "Pending":
+        _trx[ref_id] = "Pending"
+        final = "Gagal" if random.random() < DF_FAIL_RATE else "Sukses"
+        asyncio.create_task(_send_webhook(ref_id, payload, final))
+    else:
+        _trx[ref_id] = status
+    return {"data": _data(ref_id, payload, status)}
+
+@app.post("/digiflazz/price-list")
+async def digiflazz_price_list(request: Request):
+    await _latency()
+    payload = await request.json()
+    if payload.get("sign") != _md5(DIGIFLAZZ_USERNAME + DIGIFLAZZ_KEY + "pricelist"):
+        return {"data": {"rc": "41", "message": "Signature Anda salah"}}
+    rng = random.Random(42)     # price-list stabil antar panggilan, biar sync-nya kebanyakan "tetap"
+    brands = ["MOBILE LEGENDS", "FREE FIRE", "PUBG MOBILE", "TELKOMSEL", "INDOSAT", "XL", "AXIS", "DANA"]
+    return {"data": [
+        {
+            "product_name": f"LT {i}",
+            "category": "Games" if i % 2 else "Pulsa",
+            "brand": brands[i % len(brands)],
+            "type": "Umum",
+            "seller_name": "FAKE",
+            "price": 1000 + rng.randint(0, 200) * 100,
+            "buyer_sku_code": f"LT{i}",
+            "buyer_product_status": True,
+            "seller_product_status": True,
+        } for i in range(PRODUCTS)
+    ]}
+
+@app.get("/_stats")
+def stats():
+    return _stats
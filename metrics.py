@@ -0,0 +1,138 @@
+import bisect
+import logging
+import threading
+import time
+
+from fastapi import Request, Response
+
+from config import METRICS_TOKEN
+
+# Metrik in-process format teks Prometheus, tanpa library tambahan.
+# observe()/inc() cuma bisect + tambah angka di bawah lock, murah buat hot path.
+# Gauge yang butuh query (jumlah order per status, dst) dihitung pas /metrics di-scrape
+# lewat collector(), bukan di tiap request.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_registry = []
+_collectors = []
+
+def _escape(v):
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *labels, value=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._values.items())
+        lines += [f"{self.name}{_labels(self.labelnames, k)} {v}" for k, v in items]
+        return lines
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}     # labels -> [counts per bucket (+Inf terakhir), sum]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            v = self._values.get(labels)
+            if v is None:
+                v = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            v[0][i] += 1
+            v[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(k, list(v[0]), v[1]) for k, v in self._values.items()]
+        names = self.labelnames + ("le",)
+        for k, counts, total in items:
+            cumulative = 0
+            for le, c in zip(self.buckets + ("+Inf",), counts):
+                cumulative += c
+                lines.append(f"{self.name}_bucket{_labels(names, k + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, k)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, k)} {cumulative}")
+        return lines
+
+def collector(fn):
+    # fn() -> list of (nama, help, tipe, {label_tuple: nilai}, label_names), dipanggil pas scrape
+    _collectors.append(fn)
+    return fn
+
+def render():
+    lines = []
+    for m in _registry:
+        lines += m.render()
+    for fn in _collectors:
+        try:
+            for name, help, kind, values, labelnames in fn():
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                lines += [f"{name}{_labels(labelnames, k)} {v}" for k, v in values.items()]
+        except Exception as e:
+            logging.error(f"METRICS collector {fn.__name__} error {e}")
+    return "\n".join(lines) + "\n"
+
+# ===== METRIK BAWAAN =====
+http_duration = Histogram("http_request_duration_seconds", "Latency request HTTP per route", ("method", "route", "status"))
+db_duration = Histogram("db_duration_seconds", "Latency query SQLite", ("op",))
+db_errors = Counter("db_errors_total", "Error SQLite (locked = nunggu lock lewat busy_timeout)", ("kind",))
+upstream_duration = Histogram("upstream_request_duration_seconds", "Latency panggilan Tripay/Digiflazz", ("provider", "endpoint"))
+upstream_results = Counter("upstream_results_total", "Hasil panggilan upstream (HTTP status / rc Digiflazz / nama exception)", ("provider", "endpoint", "code"))
+engine_duration = Histogram("engine_tick_duration_seconds", "Durasi satu putaran auto_engine_loop", buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120))
+
+def upstream(provider, endpoint, started, code):
+    upstream_duration.observe(time.perf_counter() - started, provider, endpoint)
+    upstream_results.inc(provider, endpoint, str(code))
+
+class MetricsMiddleware:
+    # ASGI murni (bukan BaseHTTPMiddleware) biar gak nambah task per request & aman buat SSE
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # Pakai template route (/topup/{identifier}), bukan path asli, biar label gak meledak
+            path = getattr(route, "path", None)
+            if path is None and "endpoint" in scope:
+                # Mount (StaticFiles): labelnya prefix mount-nya, misal /web/{path}
+                path = scope.get("root_path", "")[len(scope.get("app_root_path", "")):] + "/{path}"
+            path = path or "unmatched"
+            http_duration.observe(time.perf_counter() - started, scope["method"], path, status[0])
+
+def endpoint(request: Request):
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        return Response(status_code=403)
+    return Response(render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,325 @@
+import logging
+
+from database import db_execute, db_query, transaction
+
+# Versi skema disimpan di PRAGMA user_version. Tiap migrasi jalan sekali,
+# dalam transaksinya sendiri, urut dari versi terkecil.
+# Nambah perubahan skema = nambah fungsi baru di bawah + daftarin di MIGRATIONS.
+# JANGAN edit migrasi yang sudah pernah jalan di produksi.
+
+def _has_column(table, column):
+    return any(r[1] == column for r in db_query(f"PRAGMA table_info({table})"))
+
+def _add_column(table, column, decl):
+    # ALTER TABLE ADD COLUMN gak punya IF NOT EXISTS, jadi dicek dulu
+    if not _has_column(table, column):
+        db_execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+def m001_base_tables():
+    db_execute("""
+        CREATE TABLE IF NOT EXISTS products (
+            sku TEXT PRIMARY KEY,
+            provider TEXT,
+            name TEXT,
+            price INTEGER,
+            cost_price INTEGER,
+            active INTEGER DEFAULT 1
+        )
+    """)
+    db_execute("""
+        CREATE TABLE IF NOT EXISTS topup (
+            id TEXT PRIMARY KEY,
+            phone TEXT,             -- Nomor WA Pembeli (untuk Tripay)
+            target_id TEXT,         -- ID Game / No Tujuan (untuk Digiflazz)
+            nickname TEXT,          -- Nama Akun Game
+            nominal TEXT,           -- SKU Produk
+            amount INTEGER,         -- Harga Jual (Penting untuk Profit)
+            invoice_url TEXT,       -- Link Pembayaran Tripay
+            qr_url TEXT,            -- Link Gambar QRIS
+            payment_status TEXT DEFAULT 'UNPAID',
+            topup_status TEXT DEFAULT 'PENDING',
+            sn TEXT,                -- Serial Number dari Provider
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    db_execute("""
+        CREATE TABLE IF NOT EXISTS admin (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE,
+            password TEXT
+        )
+    """)
+
+def m002_missing_columns():
+    # Kolom-kolom yang sudah ditulis kode tapi belum tentu ada di DB lama
+    _add_column("topup", "amount", "INTEGER")
+    _add_column("topup", "note", "TEXT")            # pesan/SN dari webhook Digiflazz
+    _add_column("products", "category", "TEXT DEFAULT 'Game'")
+    # Tabel logs yang dipakai event_log.add_log
+    db_execute("""
+        CREATE TABLE IF NOT EXISTS logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id TEXT,
+            event TEXT,
+            message TEXT,
+            created_at TEXT
+        )
+    """)
+    db_execute("CREATE INDEX IF NOT EXISTS idx_logs_order ON logs(order_id)")
+
+def m003_topup_indexes():
+    # Engine: WHERE topup_status=? -> covering, gak perlu balik ke tabel
+    db_execute("CREATE INDEX IF NOT EXISTS idx_topup_status ON topup(topup_status, id, nominal, target_id, phone)")
+    # check_status: WHERE id=? OR phone=?
+    db_execute("CREATE INDEX IF NOT EXISTS idx_topup_phone ON topup(phone)")
+    # Statistik admin: range created_at
+    db_execute("CREATE INDEX IF NOT EXISTS idx_topup_created ON topup(created_at)")
+    # Produk aktif buat storefront
+    db_execute("CREATE INDEX IF NOT EXISTS idx_products_active ON products(active, provider, price)")
+
+def m004_jobs():
+    # Outbox / antrian job: status READY -> RUNNING -> DONE, atau DEAD kalau kebanyakan gagal
+    db_execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            order_id TEXT,
+            status TEXT DEFAULT 'READY',
+            attempts INTEGER DEFAULT 0,
+            max_attempts INTEGER DEFAULT 5,
+            run_at REAL,            -- epoch detik, kapan boleh diambil
+            lease_until REAL,       -- epoch detik, batas waktu worker yang lagi pegang
+            claimed_by TEXT,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at REAL
+        )
+    """)
+    # Satu job per (kind, order) -> enqueue dobel otomatis diabaikan
+    db_execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_kind_order ON jobs(kind, order_id)")
+    db_execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_run ON jobs(status, run_at)")
+
+def m005_recheck_schedule():
+    # Jadwal cek status per order (backoff), gantinya nanya Digiflazz tiap tick
+    _add_column("topup", "next_check_at", "REAL")       # epoch detik, kapan boleh dicek lagi
+    _add_column("topup", "check_attempts", "INTEGER DEFAULT 0")
+    _add_column("topup", "check_deadline", "REAL")      # lewat ini berhenti cek, eskalasi ke admin
+    db_execute("CREATE INDEX IF NOT EXISTS idx_topup_recheck ON topup(topup_status, next_check_at)")
+    # Order lama yang lagi nunggu provider: cek secepatnya
+    db_execute("UPDATE topup SET next_check_at=0 WHERE topup_status='PENDING_PROVIDER' AND next_check_at IS NULL")
+
+def m006_app_meta():
+    # Key-value kecil buat state bareng antar worker (contoh: versi katalog produk)
+    db_execute("""
+        CREATE TABLE IF NOT EXISTS app_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER
+        )
+    """)
+    db_execute("INSERT OR IGNORE INTO app_meta (key, value) VALUES ('catalog_version', 1)")
+
+def m007_daily_rollup():
+    # Harga jual & modal dibekukan di order pas SUCCESS, biar profit lama gak ikut
+    # berubah kalau admin ganti markup
+    _add_column("topup", "sale_price", "INTEGER")
+    _add_column("topup", "cost_price", "INTEGER")
+    _add_column("topup", "success_at", "TEXT")
+    db_execute("""
+        CREATE TABLE IF NOT EXISTS daily_rollup (
+            day TEXT,               -- tanggal WIB order jadi SUCCESS
+            category TEXT,
+            provider TEXT,
+            orders INTEGER DEFAULT 0,
+            revenue INTEGER DEFAULT 0,
+            cost INTEGER DEFAULT 0,
+            PRIMARY KEY (day, category, provider)
+        ) WITHOUT ROWID
+    """)
+    # Isi dari riwayat order yang sudah ada. SQL-nya ditulis di sini (bukan manggil rollup.rebuild),
+    # biar migrasi ini tetap sama persis walaupun rollup.py berubah nanti.
+    # Order SUCCESS lama belum punya snapshot harga: pakai harga produk sekarang
+    db_execute("""
+        UPDATE topup SET
+            sale_price = COALESCE(sale_price, (SELECT price FROM products WHERE sku = topup.nominal), 0),
+            cost_price = COALESCE(cost_price, (SELECT cost_price FROM products WHERE sku = topup.nominal), 0),
+            success_at = COALESCE(success_at, DATETIME(created_at, '+7 hours'))
+        WHERE topup_status='SUCCESS' AND (sale_price IS NULL OR cost_price IS NULL OR success_at IS NULL)
+    """)
+    db_execute("DELETE FROM daily_rollup")
+    db_execute("""
+        INSERT INTO daily_rollup (day, category, provider, orders, revenue, cost)
+        SELECT DATE(t.success_at), COALESCE(p.category, 'Lainnya'), COALESCE(p.provider, '-'),
+               COUNT(*), SUM(t.sale_price), SUM(t.cost_price)
+        FROM topup t LEFT JOIN products p ON p.sku = t.nominal
+        WHERE t.topup_status='SUCCESS'
+        GROUP BY 1, 2, 3
+    """)
+
+def m008_orders_keyset_indexes():
+    # Paging admin ORDER BY created_at DESC, id DESC (keyset), dengan / tanpa filter status
+    db_execute("DROP INDEX IF EXISTS idx_topup_created")
+    db_execute("CREATE INDEX IF NOT EXISTS idx_topup_created_id ON topup(created_at, id)")
+    db_execute("CREATE INDEX IF NOT EXISTS idx_topup_status_created ON topup(topup_status, created_at, id)")
+
+def m009_rate_limits():
+    # State token bucket per key, dipakai kalau RATE_LIMIT_BACKEND=sqlite
+    db_execute("""
+        CREATE TABLE IF NOT EXISTS rate_limits (
+            key TEXT PRIMARY KEY,
+            tokens REAL,
+            updated REAL
+        ) WITHOUT ROWID
+    """)
+
+def m010_leases():
+    # Lease leader: satu baris per peran singleton (engine, backup, ...), dipegang satu worker
+    db_execute("""
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            holder TEXT,
+            expires_at REAL
+        ) WITHOUT ROWID
+    """)
+
+def m011_topup_archive():
+    # Arsip order lama yang sudah final (diisi sweeper.py), struktur sama persis dengan topup
+    db_execute("CREATE TABLE IF NOT EXISTS topup_archive AS SELECT * FROM topup WHERE 0")
+    db_execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_archive_id ON topup_archive(id)")
+    db_execute("CREATE INDEX IF NOT EXISTS idx_archive_phone ON topup_archive(phone)")
+    # Sweeper nyari UNPAID yang kelamaan
+    db_execute("CREATE INDEX IF NOT EXISTS idx_topup_payment_created ON topup(payment_status, created_at)")
+
+def m012_product_price_history():
+    # Sinkron delta: fingerprint field upstream per SKU (NULL = produk manual / belum pernah kesinkron),
+    # auto_off = dimatiin sinkron (hilang dari price-list / gangguan), nyala lagi otomatis kalau balik
+    _add_column("products", "fingerprint", "TEXT")
+    _add_column("products", "auto_off", "INTEGER DEFAULT 0")
+    db_execute("""
+        CREATE TABLE IF NOT EXISTS product_price_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sku TEXT,
+            old_cost INTEGER,
+            new_cost INTEGER,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    db_execute("CREATE INDEX IF NOT EXISTS idx_price_history_sku ON product_price_history(sku, changed_at)")
+
+def m013_pricing_rules():
+    # Aturan harga jual (dipakai pricing.py), satu aturan per (scope, value)
+    db_execute("""
+        CREATE TABLE IF NOT EXISTS pricing_rules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            scope TEXT NOT NULL,            -- all / category / brand / sku
+            value TEXT NOT NULL DEFAULT '', -- kosong buat scope all
+            priority INTEGER DEFAULT 0,
+            percent REAL DEFAULT 0,
+            min_profit INTEGER DEFAULT 0,
+            round_to INTEGER DEFAULT 0,     -- dibulatkan ke atas ke kelipatan ini (0 = gak dibulatkan)
+            floor INTEGER,
+            ceiling INTEGER,
+            active INTEGER DEFAULT 1,
+            note TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (scope, value)
+        )
+    """)
+    # Sama dengan perilaku sinkron lama: modal + 2000
+    db_execute("""
+        INSERT OR IGNORE INTO pricing_rules (scope, value, priority, min_profit, note)
+        VALUES ('all', '', 0, 2000, 'default (dulu hard-code di sinkron)')
+    """)
+    # Harga yang sudah diubah admin (bulk markup / edit manual) dikunci jadi aturan SKU,
+    # biar gak ketimpa waktu aturan pertama kali dijalankan
+    db_execute("""
+        INSERT OR IGNORE INTO pricing_rules (scope, value, priority, floor, note)
+        SELECT 'sku', sku, 1000, price, 'harga manual'
+        FROM products WHERE price IS NOT NULL AND cost_price IS NOT NULL AND price != cost_price + 2000
+    """)
+
+def m014_receipt_path():
+    # Path struk (relatif ke RECEIPT_DIR), diisi receipts.py setelah order SUCCESS
+    _add_column("topup", "receipt_path", "TEXT")
+    _add_column("topup_archive", "receipt_path", "TEXT")
+
+# Bentuk kunci SKU yang ditulis m013: floor = harga waktu itu, sisanya default kolom
+_M013_PIN = """
+    scope = 'sku' AND priority = 1000 AND note = 'harga manual' AND floor IS NOT NULL
+    AND percent = 0 AND min_profit = 0 AND round_to = 0 AND ceiling IS NULL
+"""
+
+def m015_pricing_pins_margin():
+    # m013 ngunci hampir SELURUH katalog jadi aturan SKU (semua harga yang gak pas modal + 2000):
+    # aturan all/category/brand gak pernah kepakai, dan kunci floor doang = modal naik dijual pas modal.
+    # Sinkron lama selalu nimpa harga jadi modal + 2000, jadi kunci massal itu bukan harga manual admin.
+    # Baris m013 dikenali dari id: satu INSERT ... SELECT di transaksi m013 langsung setelah aturan
+    # default, jadi id-nya berurutan mulai id aturan default + 1, sampai aturan pertama yang
+    # bentuknya lain (aturan / kunci yang dibikin admin sesudahnya).
+    default_id = "(SELECT id FROM pricing_rules WHERE scope = 'all' AND value = '')"
+    db_execute(f"""
+        DELETE FROM pricing_rules
+        WHERE {_M013_PIN} AND id > {default_id}
+        AND id < COALESCE((
+            SELECT MIN(id) FROM pricing_rules
+            WHERE id > {default_id} AND NOT COALESCE(({_M013_PIN}), 0)
+        ), 9e18)
+    """)
+    # Kunci harga manual model lama yang tersisa (floor doang, untung 0) -> modal naik = dijual pas modal.
+    # Diubah jadi kunci untung: min_profit = harga manual - modal sekarang.
+    db_execute("""
+        UPDATE pricing_rules SET
+        min_profit = MAX(floor - (SELECT cost_price FROM products WHERE sku = pricing_rules.value), 0),
+        floor = NULL
+        WHERE scope = 'sku' AND priority >= 1000 AND note = 'harga manual'
+        AND floor IS NOT NULL AND percent = 0 AND min_profit = 0
+        AND EXISTS (SELECT 1 FROM products WHERE sku = pricing_rules.value AND cost_price IS NOT NULL)
+    """)
+    # Modalnya belum ada: harga manual tetap jadi floor, ditambah untung default (sama kayak pricing.pin),
+    # biar begitu sinkron ngisi modal gak langsung dijual pas modal
+    db_execute("""
+        UPDATE pricing_rules SET
+        min_profit = COALESCE((SELECT min_profit FROM pricing_rules WHERE scope = 'all' AND value = ''), 0),
+        note = 'harga manual (modal belum ada)'
+        WHERE scope = 'sku' AND priority >= 1000 AND note = 'harga manual'
+        AND floor IS NOT NULL AND percent = 0 AND min_profit = 0
+    """)
+
+MIGRATIONS = [
+    (1, m001_base_tables),
+    (2, m002_missing_columns),
+    (3, m003_topup_indexes),
+    (4, m004_jobs),
+    (5, m005_recheck_schedule),
+    (6, m006_app_meta),
+    (7, m007_daily_rollup),
+    (8, m008_orders_keyset_indexes),
+    (9, m009_rate_limits),
+    (10, m010_leases),
+    (11, m011_topup_archive),
+    (12, m012_product_price_history),
+    (13, m013_pricing_rules),
+    (14, m014_receipt_path),
+    (15, m015_pricing_pins_margin),
+]
+
+def current_version():
+    return db_query("PRAGMA user_version")[0][0]
+
+def migrate():
+    applied = []
+    for version, fn in MIGRATIONS:
+        # BEGIN IMMEDIATE -> kalau beberapa worker start barengan, cuma satu yang ngerjain,
+        # sisanya nunggu lalu lihat versinya sudah naik
+        with transaction():
+            if current_version() >= version:
+                continue
+            fn()
+            db_execute(f"PRAGMA user_version={version}")
+        applied.append(version)
+        logging.info(f"MIGRATION {version} {fn.__name__} OK")
+    if applied:
+        print(f"✅ Migrasi database selesai, versi sekarang {current_version()}")
+    return applied
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,76 @@
+import asyncio
+
+import metrics
+from config import EVENTS_MAX_SUBSCRIBERS
+
+# Hub pub/sub status order di dalam proses. Isinya cuma "order X berubah",
+# bukan statusnya: yang nunggu bangun lalu baca ulang barisnya sendiri dari DB,
+# jadi gak mungkin dapat status basi atau urutan kebalik.
+# Biaya per subscriber = satu asyncio.Event, gak ada polling per koneksi.
+# Perubahan dari worker/proses lain gak lewat sini -> subscriber tetap cek ulang
+# DB tiap EVENTS_RECHECK_SECONDS.
+
+_subs = {}      # order_id -> set(Subscription)
+_count = 0
+_loop = None
+
+class Subscription:
+    __slots__ = ("order_id", "event")
+
+    def __init__(self, order_id):
+        self.order_id = order_id
+        self.event = asyncio.Event()
+
+    async def wait(self, timeout):
+        # True kalau dibangunin publish, False kalau timeout
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.event.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        unsubscribe(self)
+
+def subscribe(order_id):
+    # Daftar DULU baru baca DB, biar publish yang masuk di antaranya gak hilang.
+    # None kalau worker ini udah kepenuhan subscriber.
+    global _count, _loop
+    if _count >= EVENTS_MAX_SUBSCRIBERS:
+        return None
+    _loop = asyncio.get_running_loop()
+    sub = Subscription(order_id)
+    _subs.setdefault(order_id, set()).add(sub)
+    _count += 1
+    return sub
+
+def unsubscribe(sub):
+    global _count
+    subs = _subs.get(sub.order_id)
+    if subs is not None and sub in subs:
+        subs.discard(sub)
+        _count -= 1
+        if not subs:
+            del _subs[sub.order_id]
+
+def _wake(order_id):
+    for sub in _subs.get(order_id, ()):
+        sub.event.set()
+
+def publish(order_id):
+    # Aman dipanggil dari thread mana aja (route sync jalan di threadpool).
+    # Panggil SETELAH commit, biar yang bangun langsung lihat status baru.
+    if order_id in _subs and _loop is not None and not _loop.is_closed():
+        _loop.call_soon_threadsafe(_wake, order_id)
+
+def subscriber_count():
+    return _count
+
+@metrics.collector
+def _metrics():
+    return [("order_event_subscribers", "Koneksi SSE / long-poll yang lagi nunggu", "gauge", {(): _count}, ())]
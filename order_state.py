@@ -0,0 +1,71 @@
+from functools import partial
+
+import order_events
+import receipts
+from event_log import add_log
+import rollup
+from database import after_commit, db_query, transaction
+
+# State machine order. SEMUA perubahan payment_status / topup_status lewat sini.
+# Tiap transisi = satu UPDATE bersyarat (compare-and-set): cuma kena kalau status
+# sekarang masih salah satu status asal yang boleh. Pemanggil yang kalah balapan
+# (callback dobel, webhook vs engine) dapat False dan gak ngapa-ngapain.
+
+# nama -> (kolom yang dijaga, status asal yang boleh, status tujuan)
+TRANSITIONS = {
+    # Callback Tripay: lunas -> siap dikirim ke Digiflazz
+    "pay": ("payment_status", ("UNPAID",), {"payment_status": "PAID", "topup_status": "PROCESSING"}),
+    # Pembeli batal: cuma selama belum bayar
+    "cancel": ("payment_status", ("UNPAID",), {"payment_status": "CANCELED", "topup_status": "FAILED"}),
+    # Invoice Tripay kadaluarsa / gagal bayar (callback Tripay atau sweeper)
+    "expire": ("payment_status", ("UNPAID",), {"payment_status": "EXPIRED", "topup_status": "FAILED"}),
+    # Order sudah disimpan tapi invoice Tripay gagal dibuat: gak pernah bisa dibayar
+    "invoice_fail": ("payment_status", ("UNPAID",), {"payment_status": "FAILED", "topup_status": "FAILED"}),
+    # Klaim kirim ke Digiflazz: cuma satu pemanggil yang bisa, order dikirim tepat sekali
+    "send": ("topup_status", ("PROCESSING",), {"topup_status": "SENDING"}),
+    # Hasil kirim belum pasti (Pending / koneksi putus) -> dicek ulang berkala
+    "wait_provider": ("topup_status", ("SENDING",), {"topup_status": "PENDING_PROVIDER"}),
+    # Hasil akhir dari Digiflazz (balasan kirim, cek status, atau webhook)
+    "success": ("topup_status", ("SENDING", "PENDING_PROVIDER", "NEEDS_REVIEW"), {"topup_status": "SUCCESS"}),
+    "fail": ("topup_status", ("SENDING", "PENDING_PROVIDER", "NEEDS_REVIEW"), {"topup_status": "FAILED"}),
+    # Kelamaan pending -> serahin ke admin
+    "review": ("topup_status", ("PENDING_PROVIDER",), {"topup_status": "NEEDS_REVIEW"}),
+}
+
+def _update(name, where, params, fields):
+    column, sources, target = TRANSITIONS[name]
+    values = {**target, **fields}
+    sets = ", ".join(f"{k}=?" for k in values)
+    marks = ", ".join("?" * len(sources))
+    return db_query(
+        f"UPDATE topup SET {sets} WHERE {where} AND {column} IN ({marks}) RETURNING id",
+        (*values.values(), *params, *sources)
+    ), values
+
+def _entered(order_id, name, values):
+    # Efek samping masuk status baru, di transaksi yang sama dengan UPDATE-nya
+    if values.get("topup_status") == "SUCCESS":
+        rollup.record_success(order_id)
+        # Struk dirender di process pool setelah commit, gak di request ini
+        after_commit(partial(receipts.schedule, order_id))
+    detail = " ".join(str(values[k]) for k in ("payment_status", "topup_status", "sn", "note") if values.get(k))
+    after_commit(partial(add_log, order_id, name, detail))
+    after_commit(partial(order_events.publish, order_id))
+
+def transition(order_id, name, **fields):
+    # fields = kolom tambahan yang ikut di-set (sn, note, next_check_at, ...).
+    # True kalau transisi ini yang menang.
+    with transaction():
+        rows, values = _update(name, "id=?", (order_id,), fields)
+        for (oid,) in rows:
+            _entered(oid, name, values)
+    return bool(rows)
+
+def transition_all(name, where="1=1", params=(), **fields):
+    # Transisi massal semua order yang lagi di status asal (+ syarat `where` tambahan),
+    # misal recovery pas start
+    with transaction():
+        rows, values = _update(name, where, params, fields)
+        for (oid,) in rows:
+            _entered(oid, name, values)
+    return len(rows)
@@ -0,0 +1,129 @@
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import time
+
+from fastapi import Response
+
+from config import PAYMENT_CHANNELS_REFRESH_SECONDS, PAYMENT_CHANNELS_TTL, PAYMENT_CHANNELS_RETRY_SECONDS
+from services.tripay_service import get_payment_channels
+
+# Registry channel pembayaran Tripay + fee-nya, di memori tiap worker.
+# Diisi refresh_loop() tiap PAYMENT_CHANNELS_REFRESH_SECONDS. /topup & storefront cuma baca dict,
+# gak pernah nunggu Tripay: data yang sudah lewat PAYMENT_CHANNELS_TTL tetap dipakai
+# (stale-while-revalidate) sambil refresh jalan di background.
+# Selama daftar dari Tripay belum pernah kebaca, pakai FALLBACK (angka lama yang dulu hard-code).
+
+# Fee yang ditanggung merchant (fee_merchant) dioper ke pembeli lewat amount invoice
+FALLBACK = {
+    "QRIS": {"code": "QRIS", "name": "QRIS", "group": "E-Wallet", "flat": 0, "percent": 0.7},
+    "OVO": {"code": "OVO", "name": "OVO", "group": "E-Wallet", "flat": 0, "percent": 1.5},
+    "DANA": {"code": "DANA", "name": "DANA", "group": "E-Wallet", "flat": 0, "percent": 1.5},
+}
+FALLBACK_DEFAULT = {"flat": 4500, "percent": 0}   # metode lain (VA), cuma dipakai pas masih FALLBACK
+
+_channels = {}          # code -> channel, kosong = belum pernah sukses ambil dari Tripay
+_fetched_at = 0.0       # jam monotonic terakhir sukses refresh
+_last_attempt = 0.0
+_refreshing = None      # task refresh yang lagi jalan (biar gak dobel)
+_body = None            # (etag, bytes) buat /api/payment-channels
+
+def _num(v, cast=float):
+    try:
+        return cast(float(v)) if v not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+def _normalize(c):
+    fee = c.get("fee_merchant") or c.get("total_fee") or {}
+    return {
+        "code": str(c.get("code", "")).upper(),
+        "name": c.get("name") or c.get("code"),
+        "group": c.get("group"),
+        "icon_url": c.get("icon_url"),
+        "flat": _num(fee.get("flat"), int) or 0,
+        "percent": _num(fee.get("percent")) or 0.0,
+        "min_fee": _num(c.get("minimum_fee"), int),
+        "max_fee": _num(c.get("maximum_fee"), int),
+        "min_amount": _num(c.get("minimum_amount"), int),
+        "max_amount": _num(c.get("maximum_amount"), int),
+    }
+
+def _dump(channels):
+    body = json.dumps(list(channels.values()), separators=(",", ":")).encode()
+    return f'"{hashlib.md5(body).hexdigest()[:16]}"', body
+
+def _maybe_revalidate():
+    # Dipanggil dari jalur baca: data basi -> picu refresh di background, yang baca gak nunggu
+    global _refreshing
+    now = time.monotonic()
+    if (_channels and now - _fetched_at < PAYMENT_CHANNELS_TTL) or now - _last_attempt < PAYMENT_CHANNELS_RETRY_SECONDS:
+        return
+    if _refreshing is not None and not _refreshing.done():
+        return
+    try:
+        _refreshing = asyncio.get_running_loop().create_task(refresh())
+    except RuntimeError:
+        pass    # dipanggil di luar event loop (script / thread), tunggu refresh_loop aja
+
+def channels():
+    _maybe_revalidate()
+    return _channels or FALLBACK
+
+def get(code):
+    # Channel buat kode metode ini, None kalau gak tersedia
+    code = str(code or "").upper()
+    current = channels()
+    if current is FALLBACK:
+        return FALLBACK.get(code) or {"code": code, "name": code, **FALLBACK_DEFAULT}
+    return current.get(code)
+
+def fee(channel, amount):
+    # Rumus fee calculator Tripay: flat + persen dari amount, dijepit minimum/maksimum fee
+    f = channel["flat"] + math.ceil(amount * channel["percent"] / 100)
+    if channel.get("min_fee") is not None:
+        f = max(f, channel["min_fee"])
+    if channel.get("max_fee") is not None:
+        f = min(f, channel["max_fee"])
+    return f
+
+async def refresh():
+    global _channels, _fetched_at, _last_attempt, _body
+    _last_attempt = time.monotonic()
+    data = await get_payment_channels()
+    if not data:
+        logging.warning("PAYMENT CHANNEL: gagal ambil dari Tripay, pakai data lama")
+        return False
+    fresh = {}
+    for c in data:
+        if isinstance(c, dict) and c.get("code") and c.get("active", True):
+            ch = _normalize(c)
+            fresh[ch["code"]] = ch
+    if not fresh:
+        logging.warning("PAYMENT CHANNEL: Tripay balikin daftar kosong, pakai data lama")
+        return False
+    # Dict baru diganti utuh (gak diubah di tempat), pembaca gak pernah lihat daftar setengah jadi
+    _channels, _body = fresh, _dump(fresh)
+    _fetched_at = time.monotonic()
+    logging.info(f"PAYMENT CHANNEL: {len(fresh)} channel aktif dari Tripay")
+    return True
+
+async def refresh_loop():
+    while True:
+        try:
+            ok = await refresh()
+        except Exception as e:
+            logging.error(f"PAYMENT CHANNEL ERROR {e}")
+            ok = False
+        await asyncio.sleep(PAYMENT_CHANNELS_REFRESH_SECONDS if ok else PAYMENT_CHANNELS_RETRY_SECONDS)
+
+_FALLBACK_BODY = _dump(FALLBACK)
+
+def response(request, cache_control):
+    etag, body = _body if channels() is not FALLBACK else _FALLBACK_BODY
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
@@ -0,0 +1,189 @@
+import logging
+
+import catalog
+from database import db_execute, db_query, transaction
+
+# Aturan harga jual, disimpan di tabel pricing_rules. Tiap produk dapat SATU aturan:
+# yang cocok dengan priority paling tinggi (seri -> id terbaru). Lingkup aturan:
+#   all      -> semua produk
+#   category -> products.category  (Games, Pulsa, ...)
+#   brand    -> products.provider  (MOBILE LEGENDS, TELKOMSEL, ...)
+#   sku      -> satu produk
+# Harga = modal + MAX(modal * percent%, min_profit), dibulatkan KE ATAS ke kelipatan round_to,
+# lalu dijepit ke floor / ceiling. Seluruh katalog dihitung dalam satu query (window function),
+# ditulis dengan satu UPDATE ... FROM, cuma baris yang harganya berubah.
+
+SCOPES = ("all", "category", "brand", "sku")
+
+# Default priority per lingkup: makin spesifik makin menang
+DEFAULT_PRIORITY = {"all": 0, "category": 10, "brand": 20, "sku": 30}
+
+# Harga yang diset manual admin (tambah / edit produk) disimpan jadi aturan SKU ini.
+# Yang dikunci untungnya (harga - modal), bukan harganya: modal naik -> harga ikut naik, margin tetap.
+# Modal belum diketahui (produk manual tanpa modal): harga admin jadi floor + untung default,
+# jadi begitu modalnya keisi sinkron, gak pernah dijual pas modal.
+PIN_PRIORITY = 1000
+
+RULE_COLUMNS = ["id", "scope", "value", "priority", "percent", "min_profit", "round_to", "floor", "ceiling", "active", "note"]
+
+_MATCH = """
+    r.scope = 'all'
+    OR (r.scope = 'category' AND UPPER(p.category) = UPPER(r.value))
+    OR (r.scope = 'brand' AND UPPER(p.provider) = UPPER(r.value))
+    OR (r.scope = 'sku' AND p.sku = r.value)
+"""
+
+def _priced_sql(rules_sql):
+    # CTE "priced": sku, harga sekarang, harga baru, id aturan yang dipakai
+    return f"""
+        WITH rules AS ({rules_sql}),
+        best AS (
+            SELECT p.sku, p.price, p.cost_price AS cost, r.*,
+                   ROW_NUMBER() OVER (PARTITION BY p.sku ORDER BY r.priority DESC, r.id DESC) AS rn
+            FROM products p JOIN rules r ON ({_MATCH})
+            WHERE p.cost_price IS NOT NULL
+        ),
+        marked AS (
+            SELECT sku, price, id AS rule_id, floor, ceiling, round_to,
+                   cost + MAX(CAST(cost * percent / 100.0 AS INT), min_profit) AS base
+            FROM best WHERE rn = 1
+        ),
+        rounded AS (
+            SELECT sku, price, rule_id, ceiling,
+                   MAX(CASE WHEN round_to > 0 THEN ((base + round_to - 1) / round_to) * round_to ELSE base END,
+                       COALESCE(floor, 0)) AS new_price
+            FROM marked
+        ),
+        priced AS (
+            SELECT sku, price, rule_id, MIN(new_price, COALESCE(ceiling, new_price)) AS new_price
+            FROM rounded
+        )
+    """
+
+ACTIVE_RULES = f"SELECT {', '.join(RULE_COLUMNS)} FROM pricing_rules WHERE active = 1"
+
+def _candidate_rules(rule):
+    # Aturan yang tersimpan + satu aturan calon (belum disimpan), buat dry-run.
+    # Aturan calon menimpa aturan tersimpan dengan scope+value yang sama (sama kayak save_rule).
+    sql = f"""
+        {ACTIVE_RULES} AND NOT (scope = ? AND value = ?)
+        UNION ALL
+        SELECT 1e18, ?, ?, ?, ?, ?, ?, ?, ?, 1, ?
+    """
+    params = (rule["scope"], rule["value"], rule["scope"], rule["value"], rule["priority"], rule["percent"],
+              rule["min_profit"], rule["round_to"], rule["floor"], rule["ceiling"], rule.get("note"))
+    return sql, params
+
+def normalize(rule):
+    scope = (rule.get("scope") or "all").lower()
+    if scope not in SCOPES:
+        raise ValueError(f"scope harus salah satu dari {', '.join(SCOPES)}")
+    value = "" if scope == "all" else (rule.get("value") or "").strip()
+    if scope != "all" and not value:
+        raise ValueError("value wajib diisi untuk scope selain all")
+    if scope == "brand":
+        value = value.upper()
+    floor, ceiling = rule.get("floor"), rule.get("ceiling")
+    if floor is not None and ceiling is not None and floor > ceiling:
+        raise ValueError("floor gak boleh lebih besar dari ceiling")
+    return {
+        "scope": scope,
+        "value": value,
+        "priority": DEFAULT_PRIORITY[scope] if rule.get("priority") is None else int(rule["priority"]),
+        "percent": float(rule.get("percent") or 0),
+        "min_profit": int(rule.get("min_profit") or 0),
+        "round_to": int(rule.get("round_to") or 0),
+        "floor": floor,
+        "ceiling": ceiling,
+        "note": rule.get("note"),
+    }
+
+def list_rules():
+    rows = db_query(f"SELECT {', '.join(RULE_COLUMNS)} FROM pricing_rules ORDER BY priority DESC, id DESC")
+    return [dict(zip(RULE_COLUMNS, r)) for r in rows]
+
+def save_rule(rule):
+    # Satu aturan per (scope, value): simpan lagi = ganti isinya
+    r = normalize(rule)
+    return db_query("""
+        INSERT INTO pricing_rules (scope, value, priority, percent, min_profit, round_to, floor, ceiling, active, note)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1, ?)
+        ON CONFLICT(scope, value) DO UPDATE SET
+        priority = excluded.priority, percent = excluded.percent, min_profit = excluded.min_profit,
+        round_to = excluded.round_to, floor = excluded.floor, ceiling = excluded.ceiling,
+        active = 1, note = excluded.note
+        RETURNING id
+    """, (r["scope"], r["value"], r["priority"], r["percent"], r["min_profit"], r["round_to"],
+          r["floor"], r["ceiling"], r["note"]))[0][0]
+
+def delete_rule(rule_id):
+    return db_execute("DELETE FROM pricing_rules WHERE id=?", (rule_id,))
+
+def default_min_profit():
+    row = db_query("SELECT min_profit FROM pricing_rules WHERE scope='all' AND value='' AND active=1")
+    return (row[0][0] or 0) if row else 0
+
+def pin(sku, price, cost):
+    if cost is None:
+        rule = {"floor": price, "min_profit": default_min_profit(), "note": "harga manual (modal belum ada)"}
+    else:
+        rule = {"min_profit": max(price - cost, 0), "note": "harga manual"}
+    save_rule({"scope": "sku", "value": sku, "priority": PIN_PRIORITY, **rule})
+
+def unpin(sku):
+    db_execute("DELETE FROM pricing_rules WHERE scope='sku' AND value=?", (sku,))
+
+def unpin_matching(scope, value=""):
+    # Lepas kunci harga manual semua produk yang kena scope ini (bulk markup = nimpa harga manual)
+    return db_execute(f"""
+        DELETE FROM pricing_rules
+        WHERE scope = 'sku' AND priority >= ? AND value IN (
+            SELECT p.sku FROM products p JOIN (SELECT ? AS scope, ? AS value) r ON ({_MATCH})
+        )
+    """, (PIN_PRIORITY, scope, value))
+
+def preview(rule=None, limit=500):
+    # Dry-run: produk yang harganya bakal berubah, gak nulis apa-apa.
+    # rule diisi = hasil kalau aturan itu disimpan dulu.
+    if rule is None:
+        rules_sql, params = ACTIVE_RULES, ()
+    else:
+        rules_sql, params = _candidate_rules(normalize(rule))
+    sql = _priced_sql(rules_sql)
+    summary = db_query(sql + """
+        SELECT COUNT(*), COALESCE(SUM(new_price > price), 0), COALESCE(SUM(new_price < price), 0)
+        FROM priced WHERE price IS NOT new_price
+    """, params)[0]
+    rows = db_query(sql + """
+        SELECT p.sku, p.provider, p.name, p.cost_price, q.price, q.new_price, q.rule_id
+        FROM priced q JOIN products p ON p.sku = q.sku
+        WHERE q.price IS NOT q.new_price
+        ORDER BY p.provider, p.sku LIMIT ?
+    """, params + (limit,))
+    return {
+        "changed": summary[0],
+        "up": summary[1],
+        "down": summary[2],
+        "items": [
+            # rule_id NULL = aturan calon yang belum disimpan
+            {"sku": r[0], "provider": r[1], "name": r[2], "cost": r[3], "price": r[4], "new_price": r[5],
+             "rule_id": None if r[6] >= 1e18 else r[6]}
+            for r in rows
+        ],
+    }
+
+def apply():
+    # Satu UPDATE buat seluruh katalog. Dipanggil dari dalam transaksi sinkron,
+    # atau sendiri (bikin transaksi sendiri) dari admin.
+    with transaction():
+        db_execute(_priced_sql(ACTIVE_RULES) + """
+            UPDATE products SET price = priced.new_price
+            FROM priced
+            WHERE products.sku = priced.sku AND products.price IS NOT priced.new_price
+        """)
+        # rowcount dari statement yang diawali WITH selalu -1
+        n = db_query("SELECT changes()")[0][0]
+    if n:
+        logging.info(f"PRICING: harga {n} produk diperbarui")
+        catalog.bump()
+    return n
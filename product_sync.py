@@ -0,0 +1,173 @@
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import time
+
+import catalog
+import leader
+import pricing
+from classifier import classify
+from config import PRICE_SYNC_INTERVAL_SECONDS, PRICE_SYNC_JITTER, PRICE_SYNC_RETRY_SECONDS, PRICE_SYNC_MAX_BACKOFF_SECONDS
+from database import db_executemany, db_query, transaction
+from services.digiflazz_service import iter_digiflazz_products, RateLimited
+
+# Sinkron price-list Digiflazz ke tabel products.
+# Price-list di-stream & tiap SKU dibandingin fingerprint-nya (hash field upstream) sama
+# yang tersimpan, yang ditulis cuma SKU baru / berubah, semuanya dalam SATU transaksi di akhir.
+# Jalan otomatis tiap PRICE_SYNC_INTERVAL_SECONDS di leader (price_sync_loop), tombol admin tetap bisa.
+# Harga jual gak dihitung di sini, tapi dari aturan di pricing.py.
+
+# Field upstream yang ikut fingerprint: berubah salah satu = SKU ditulis ulang
+FINGERPRINT_FIELDS = ("brand", "product_name", "price", "category", "type",
+                      "buyer_product_status", "seller_product_status")
+
+UPSERT_SQL = """
+    INSERT INTO products (sku, provider, name, price, cost_price, active, category, fingerprint, auto_off)
+    VALUES (?, ?, ?, ?, ?, 0, ?, ?, 0)
+    ON CONFLICT(sku) DO UPDATE SET
+    provider = excluded.provider,
+    -- Harga jual gak disentuh di sini, dihitung ulang pricing.apply() di transaksi yang sama
+    cost_price = excluded.cost_price,
+    name = excluded.name,
+    category = excluded.category, -- WAJIB ADA BIAR INDOSAT PINDAH LACI
+    fingerprint = excluded.fingerprint,
+    -- Yang tadinya dimatiin sinkron (gangguan / hilang) nyala lagi, yang dimatiin admin tetap mati
+    active = CASE WHEN products.auto_off = 1 THEN 1 ELSE products.active END,
+    auto_off = 0
+"""
+
+# Gangguan di Digiflazz / hilang dari price-list: matiin biar gak kejual pakai modal basi.
+# auto_off cuma diset kalau tadinya aktif, jadi pas balik yang nyala lagi cuma yang memang dimatiin sinkron.
+DISABLE_SQL = """
+    UPDATE products SET
+    auto_off = CASE WHEN active = 1 THEN 1 ELSE auto_off END,
+    active = 0,
+    fingerprint = ?
+    WHERE sku = ?
+"""
+
+HISTORY_SQL = "INSERT INTO product_price_history (sku, old_cost, new_cost) VALUES (?, ?, ?)"
+
+_lock = asyncio.Lock()
+
+def fingerprint(p, category):
+    raw = json.dumps([p.get(k) for k in FINGERPRINT_FIELDS] + [category], separators=(",", ":"))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+async def sync_products():
+    # Tombol admin & loop background gak boleh numpuk di worker yang sama
+    async with _lock:
+        return await _sync()
+
+async def _sync():
+    started = time.perf_counter()
+
+    # Isi tabel sekarang: fingerprint + modal per SKU (fingerprint NULL = produk manual / belum kesinkron)
+    rows = await asyncio.to_thread(db_query, "SELECT sku, fingerprint, cost_price FROM products")
+    existing = {r[0]: (r[1], r[2]) for r in rows}
+
+    changed, disabled, history = [], [], []
+    seen = set()
+    stats = {"inserted": 0, "updated": 0, "unchanged": 0, "skipped": 0, "disabled": 0, "vanished": 0,
+             "price_changes": 0, "repriced": 0}
+
+    async for p in iter_digiflazz_products():
+        # Cek lagi buat mastiin p itu dictionary, biar gak 'str object' error lagi
+        if not isinstance(p, dict) or not p.get('buyer_sku_code'):
+            stats["skipped"] += 1
+            continue
+
+        sku = p['buyer_sku_code']
+        seen.add(sku)
+        category = classify(p.get('brand'), p.get('category'))
+        fp = fingerprint(p, category)
+        old = existing.get(sku)
+        if old is not None and old[0] == fp:
+            stats["unchanged"] += 1
+            continue
+
+        if p.get('buyer_product_status') != True:
+            # SKU baru yang lagi gangguan gak usah dimasukin, yang sudah ada dimatiin
+            if old is None:
+                stats["skipped"] += 1
+            else:
+                stats["disabled"] += 1
+                disabled.append((fp, sku))
+            continue
+
+        cost = int(p['price'])
+        stats["inserted" if old is None else "updated"] += 1
+        # Harga jual sementara = modal (produk baru masih nonaktif), langsung ditimpa aturan harga
+        changed.append((sku, p['brand'], p['product_name'], cost, cost, category, fp))
+        if old is not None and old[1] is not None and old[1] != cost:
+            history.append((sku, old[1], cost))
+
+    # SKU yang pernah kesinkron tapi gak ada lagi di price-list
+    vanished = [sku for sku, (fp, _) in existing.items() if fp is not None and sku not in seen]
+    synced = sum(1 for fp, _ in existing.values() if fp is not None)
+    if vanished and len(vanished) > synced / 2:
+        # Price-list kepotong / kosong di sisi Digiflazz, jangan sampai satu katalog mati semua
+        logging.warning(f"SYNC PRODUK: {len(vanished)} dari {synced} SKU hilang, penonaktifan dilewati")
+        vanished = []
+    stats["vanished"] = len(vanished)
+    stats["price_changes"] = len(history)
+
+    fetched = time.perf_counter()
+
+    # --- INSERT/UPDATE DATABASE: sekali transaksi, cuma baris yang berubah ---
+    if changed or disabled or vanished:
+        # Di threadpool: transaksi nulis (BEGIN IMMEDIATE) gak boleh nahan event loop
+        stats["repriced"] = await asyncio.to_thread(_write, changed, disabled, vanished, history)
+
+    done = time.perf_counter()
+    stats["fetch_ms"] = round((fetched - started) * 1000)
+    stats["write_ms"] = round((done - fetched) * 1000)
+    stats["total_ms"] = round((done - started) * 1000)
+    logging.info(f"SYNC PRODUK {stats}")
+    return stats
+
+def _write(changed, disabled, vanished, history):
+    repriced = 0
+    with transaction():
+        db_executemany(UPSERT_SQL, changed)
+        db_executemany(DISABLE_SQL, disabled + [(None, sku) for sku in vanished])
+        db_executemany(HISTORY_SQL, history)
+        if changed:
+            repriced = pricing.apply()
+    catalog.bump()
+    return repriced
+
+async def price_sync_loop():
+    # Sinkron terjadwal di leader aja. Jadwalnya dikasih jitter biar gak nembak Digiflazz
+    # di detik yang sama terus; gagal / kena limit (rc 83) -> mundur eksponensial.
+    if PRICE_SYNC_INTERVAL_SECONDS <= 0:
+        return
+    failures = 0
+    delay = PRICE_SYNC_INTERVAL_SECONDS
+    while True:
+        await asyncio.sleep(delay * random.uniform(1 - PRICE_SYNC_JITTER, 1 + PRICE_SYNC_JITTER))
+        if not leader.is_leader():
+            delay = PRICE_SYNC_INTERVAL_SECONDS
+            continue
+        try:
+            await sync_products()
+            failures = 0
+        except RateLimited as e:
+            failures += 1
+            logging.warning(f"SYNC PRODUK kena limit Digiflazz ({failures}x): {e}")
+        except Exception as e:
+            failures += 1
+            logging.error(f"SYNC PRODUK ERROR ({failures}x): {e}")
+        if failures:
+            delay = min(PRICE_SYNC_RETRY_SECONDS * 2 ** (failures - 1), PRICE_SYNC_MAX_BACKOFF_SECONDS)
+        else:
+            delay = PRICE_SYNC_INTERVAL_SECONDS
+
+def price_history(sku, limit=100):
+    rows = db_query("""
+        SELECT old_cost, new_cost, changed_at FROM product_price_history
+        WHERE sku=? ORDER BY id DESC LIMIT ?
+    """, (sku, limit))
+    return [{"old_cost": r[0], "new_cost": r[1], "changed_at": r[2]} for r in rows]
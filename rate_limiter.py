@@ -0,0 +1,73 @@
+import threading
+import time
+from collections import OrderedDict
+
+from config import RATE_LIMIT_BACKEND, RATE_LIMIT_MAX_KEYS
+from database import db_execute, db_query
+
+# Rate limiter token bucket: state per key cuma (tokens, updated), O(1) tiap cek.
+# limit request per window detik = bucket isi `limit`, terisi ulang limit/window token per detik.
+# Backend "memory": per proses, LRU dibatasi RATE_LIMIT_MAX_KEYS.
+# Backend "sqlite": satu UPSERT atomik di tabel rate_limits, berlaku bareng semua worker.
+
+class MemoryBackend:
+    def __init__(self, max_keys=RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._store = OrderedDict()   # key -> (tokens, updated, idle_ttl)
+        self._lock = threading.Lock()
+
+    def hit(self, key, capacity, rate, now):
+        with self._lock:
+            state = self._store.get(key)
+            if state is None:
+                tokens = capacity
+            else:
+                tokens = min(capacity, state[0] + (now - state[1]) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._store[key] = (tokens, now, capacity / rate)
+            self._store.move_to_end(key)
+            self._evict(now)
+            return allowed
+
+    def _evict(self, now):
+        # Key paling lama gak dipakai ada di depan. Bucket yang sudah penuh lagi
+        # (idle >= capacity/rate) sama aja dengan key baru, jadi aman dibuang.
+        while self._store:
+            key, (tokens, updated, idle_ttl) = next(iter(self._store.items()))
+            if len(self._store) > self.max_keys or now - updated >= idle_ttl:
+                self._store.popitem(last=False)
+            else:
+                break
+
+class SQLiteBackend:
+    # Kalau ditolak, state lama gak diubah (updated tetap), jadi RETURNING updated=now
+    # langsung kasih tahu lolos / enggak dalam satu statement
+    HIT_SQL = """
+        INSERT INTO rate_limits (key, tokens, updated) VALUES (:key, :capacity - 1, :now)
+        ON CONFLICT(key) DO UPDATE SET
+            tokens = CASE WHEN MIN(:capacity, tokens + (:now - updated) * :rate) >= 1
+                          THEN MIN(:capacity, tokens + (:now - updated) * :rate) - 1 ELSE tokens END,
+            updated = CASE WHEN MIN(:capacity, tokens + (:now - updated) * :rate) >= 1
+                           THEN :now ELSE updated END
+        RETURNING updated = :now
+    """
+    SWEEP_EVERY = 1000
+
+    def __init__(self):
+        self._hits = 0
+
+    def hit(self, key, capacity, rate, now):
+        allowed = bool(db_query(self.HIT_SQL, {"key": key, "capacity": capacity, "rate": rate, "now": now})[0][0])
+        self._hits += 1
+        if self._hits % self.SWEEP_EVERY == 0:
+            # Buang key yang sudah idle sejam (window terpanjang yang dipakai jauh di bawah ini)
+            db_execute("DELETE FROM rate_limits WHERE updated < ?", (now - 3600,))
+        return allowed
+
+_backend = SQLiteBackend() if RATE_LIMIT_BACKEND == "sqlite" else MemoryBackend()
+
+def allow(key, limit=5, window=60):
+    # True = boleh lanjut, False = kebanyakan request
+    return _backend.hit(key, limit, limit / window, time.time())
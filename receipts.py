@@ -0,0 +1,176 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from fastapi.staticfiles import StaticFiles
+from PIL import Image, ImageDraw, ImageFont
+
+from config import RECEIPT_DIR, RECEIPT_FORMAT, RECEIPT_TEMPLATE, RECEIPT_WORKERS, RECEIPT_QUEUE, RECEIPT_CACHE_MAX_AGE
+from database import db_execute, db_query
+
+# Struk (PNG / PDF) per order SUCCESS.
+# Dipicu transisi SUCCESS (order_state, setelah commit), dirender di process pool kecil
+# (RECEIPT_WORKERS) dengan antrian terbatas (RECEIPT_QUEUE), jadi gak pernah makan CPU
+# event loop / request. Yang kelewat (antrian penuh, worker mati) disusulin sweeper lewat backfill().
+# Nama file = hash isi struk, disimpan di subfolder ab/cd/ biar satu folder gak isi jutaan file.
+# Isi file gak pernah berubah -> /receipts disajikan dengan Cache-Control setahun + immutable.
+
+# Naikin kalau layout struk berubah: hash (nama file) ikut berubah, struk lama gak ketimpa
+TEMPLATE_VERSION = "1"
+
+WIDTH, HEIGHT = 400, 360
+TITLE = "Mc'D (Mbok Dinah TopUp)"
+FOOTER = "Terima kasih telah menggunakan layanan kami!"
+SEPARATOR = "=" * 24
+
+_pool = None
+_inflight = set()       # order_id yang lagi antre / dirender di proses ini
+_lock = threading.Lock()
+
+# ===== DI PROSES RENDER =====
+
+_template = None        # (gambar dasar, font), dimuat sekali per proses render
+
+def _font(size):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        return ImageFont.load_default()  # Pillow lama / tanpa FreeType
+
+def _load_template():
+    # initializer pool: bagian struk yang sama untuk semua order digambar sekali di sini
+    global _template
+    if RECEIPT_TEMPLATE:
+        base = Image.open(RECEIPT_TEMPLATE).convert("RGB")
+    else:
+        base = Image.new("RGB", (WIDTH, HEIGHT), "white")
+        draw = ImageDraw.Draw(base)
+        font = _font(12)
+        draw.text((10, 10), TITLE, fill="black", font=font)
+        draw.text((10, 35), SEPARATOR, fill="black", font=font)
+        draw.text((10, 235), SEPARATOR, fill="black", font=font)
+        draw.text((10, 260), FOOTER, fill="black", font=font)
+    _template = (base, _font(12))
+
+def _fields(order_id):
+    row = db_query("""
+        SELECT t.id, t.nominal, COALESCE(p.name, t.nominal), t.target_id, t.sn, t.amount, COALESCE(t.success_at, t.created_at)
+        FROM topup t LEFT JOIN products p ON p.sku = t.nominal
+        WHERE t.id=? AND t.topup_status='SUCCESS'
+    """, (order_id,))
+    if not row:
+        return None
+    oid, sku, name, target, sn, amount, waktu = row[0]
+    return [
+        ("Order ID", oid),
+        ("Produk", f"{name} ({sku})"),
+        ("No. Tujuan", target or "-"),
+        ("SN", sn or "-"),
+        ("Total", f"Rp {amount or 0:,}".replace(",", ".")),
+        ("Waktu", waktu),
+        ("Status", "SUCCESS"),
+    ]
+
+def _draw(fields):
+    if _template is None:
+        _load_template()
+    base, font = _template
+    img = base.copy()
+    draw = ImageDraw.Draw(img)
+    for i, (label, value) in enumerate(fields):
+        y = 60 + i * 25
+        draw.text((10, y), label, fill="black", font=font)
+        draw.text((90, y), f": {value}", fill="black", font=font)
+    return img
+
+def render(order_id):
+    # Jalan di proses pool: baca order, gambar (kalau belum ada), catat path-nya ke topup.receipt_path
+    fields = _fields(order_id)
+    if fields is None:
+        return None
+    ext = "pdf" if RECEIPT_FORMAT == "pdf" else "png"
+    key = hashlib.sha256(json.dumps([TEMPLATE_VERSION, RECEIPT_TEMPLATE, fields]).encode()).hexdigest()[:32]
+    rel = f"{key[:2]}/{key[2:4]}/{key}.{ext}"
+    path = os.path.join(RECEIPT_DIR, rel)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Tulis ke file sementara dulu: yang lagi download gak pernah dapat file setengah jadi
+        tmp = f"{path}.{os.getpid()}.tmp"
+        _draw(fields).save(tmp, format=ext.upper())
+        os.replace(tmp, path)
+    db_execute("UPDATE topup SET receipt_path=? WHERE id=?", (rel, order_id))
+    return rel
+
+# ===== DI PROSES APP =====
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # spawn: jangan fork proses yang lagi punya thread & koneksi SQLite
+        _pool = ProcessPoolExecutor(max_workers=RECEIPT_WORKERS, initializer=_load_template,
+                                    mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+def _done(order_id, future):
+    with _lock:
+        _inflight.discard(order_id)
+    if not future.cancelled() and future.exception() is not None:
+        logging.error(f"RECEIPT {order_id} gagal dirender: {future.exception()}")
+
+def schedule(order_id):
+    # Gak nunggu apa-apa: cuma masukin antrian pool. Antrian penuh -> dilewati, nanti disusul backfill()
+    global _pool
+    with _lock:
+        if order_id in _inflight:
+            return True
+        if len(_inflight) >= RECEIPT_QUEUE:
+            return False
+        _inflight.add(order_id)
+        try:
+            future = _get_pool().submit(render, order_id)
+        except Exception as e:
+            # Pool rusak (worker mati mendadak): buang, bikin baru di panggilan berikutnya
+            _inflight.discard(order_id)
+            logging.error(f"RECEIPT pool error {e}")
+            _pool = None
+            return False
+    future.add_done_callback(partial(_done, order_id))
+    return True
+
+def backfill():
+    # Order SUCCESS yang belum punya struk, sebanyak sisa antrian
+    with _lock:
+        room = RECEIPT_QUEUE - len(_inflight)
+    if room <= 0:
+        return 0
+    rows = db_query("SELECT id FROM topup WHERE topup_status='SUCCESS' AND receipt_path IS NULL LIMIT ?", (room,))
+    return sum(1 for (oid,) in rows if schedule(oid))
+
+def start():
+    # Nyalain proses render (+ muat template) dari awal, biar order SUCCESS pertama gak nunggu spawn
+    _get_pool().submit(_load_template)
+
+def shutdown():
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+def find(order_id):
+    # Path struk (relatif ke RECEIPT_DIR) + status order, cari juga di arsip
+    row = db_query("SELECT receipt_path, topup_status FROM topup WHERE id=?", (order_id,)) or \
+          db_query("SELECT receipt_path, topup_status FROM topup_archive WHERE id=?", (order_id,))
+    return row[0] if row else None
+
+class CachedStaticFiles(StaticFiles):
+    # Nama file = hash isinya, jadi URL yang sama selalu isi yang sama -> cache selamanya
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = f"public, max-age={RECEIPT_CACHE_MAX_AGE}, immutable"
+        return response
@@ -0,0 +1,85 @@
+import sys
+
+from database import db_execute, db_query, transaction
+
+# Rekap harian (per hari / kategori / provider) jumlah order, omzet & modal.
+# Di-update sekali pas order jadi SUCCESS, jadi dashboard cukup baca O(hari), bukan O(order).
+
+def record_success(order_id):
+    # WAJIB dipanggil di dalam transaction() yang sama dengan UPDATE ke SUCCESS,
+    # dan cuma kalau UPDATE-nya beneran kena (biar gak kehitung dua kali)
+    db_execute("""
+        UPDATE topup SET
+            sale_price = COALESCE(sale_price, (SELECT price FROM products WHERE sku = topup.nominal), 0),
+            cost_price = COALESCE((SELECT cost_price FROM products WHERE sku = topup.nominal), 0),
+            success_at = DATETIME('now', '+7 hours')
+        WHERE id=?
+    """, (order_id,))
+    db_execute("""
+        INSERT INTO daily_rollup (day, category, provider, orders, revenue, cost)
+        SELECT DATE(t.success_at), COALESCE(p.category, 'Lainnya'), COALESCE(p.provider, '-'), 1, t.sale_price, t.cost_price
+        FROM topup t LEFT JOIN products p ON p.sku = t.nominal
+        WHERE t.id=?
+        ON CONFLICT(day, category, provider) DO UPDATE SET
+            orders = orders + 1,
+            revenue = revenue + excluded.revenue,
+            cost = cost + excluded.cost
+    """, (order_id,))
+
+def _success_source():
+    select = "SELECT nominal, sale_price, cost_price, success_at FROM {} WHERE topup_status='SUCCESS'"
+    # topup_archive baru ada mulai migrasi 11 (rebuild bisa dijalanin manual di DB lama)
+    if db_query("SELECT 1 FROM sqlite_master WHERE type='table' AND name='topup_archive'"):
+        return select.format("topup") + " UNION ALL " + select.format("topup_archive")
+    return select.format("topup")
+
+def rebuild():
+    # Hitung ulang semua dari tabel topup + arsipnya (misal habis edit data manual)
+    with transaction():
+        # Order SUCCESS lama yang belum punya snapshot harga: pakai harga produk sekarang
+        db_execute("""
+            UPDATE topup SET
+                sale_price = COALESCE(sale_price, (SELECT price FROM products WHERE sku = topup.nominal), 0),
+                cost_price = COALESCE(cost_price, (SELECT cost_price FROM products WHERE sku = topup.nominal), 0),
+                success_at = COALESCE(success_at, DATETIME(created_at, '+7 hours'))
+            WHERE topup_status='SUCCESS' AND (sale_price IS NULL OR cost_price IS NULL OR success_at IS NULL)
+        """)
+        db_execute("DELETE FROM daily_rollup")
+        db_execute("""
+            INSERT INTO daily_rollup (day, category, provider, orders, revenue, cost)
+            SELECT DATE(t.success_at), COALESCE(p.category, 'Lainnya'), COALESCE(p.provider, '-'),
+                   COUNT(*), SUM(t.sale_price), SUM(t.cost_price)
+            FROM ({source}) t LEFT JOIN products p ON p.sku = t.nominal
+            GROUP BY 1, 2, 3
+        """.format(source=_success_source()))
+
+def stats(days=30):
+    today = db_query("SELECT DATE('now', '+7 hours')")[0][0]
+
+    total = db_query("SELECT COALESCE(SUM(orders), 0), COALESCE(SUM(revenue), 0), COALESCE(SUM(cost), 0) FROM daily_rollup")[0]
+    daily = db_query("""
+        SELECT day, SUM(orders), SUM(revenue), SUM(cost) FROM daily_rollup
+        WHERE day > DATE(?, ?) GROUP BY day ORDER BY day
+    """, (today, f"-{days} days"))
+    by_category = db_query("""
+        SELECT category, SUM(orders), SUM(revenue), SUM(cost) FROM daily_rollup
+        GROUP BY category ORDER BY 3 DESC
+    """)
+
+    t = next((d for d in daily if d[0] == today), (today, 0, 0, 0))
+    return {
+        "revenue_today": t[2],
+        "profit_today": t[2] - t[3],
+        "count_today": t[1],
+        "revenue_total": total[1],
+        "profit_total": total[1] - total[2],
+        "count_total": total[0],
+        "daily": [{"day": d[0], "count": d[1], "revenue": d[2], "profit": d[2] - d[3]} for d in daily],
+        "by_category": [{"category": c[0], "count": c[1], "revenue": c[2], "profit": c[2] - c[3]} for c in by_category],
+    }
+
+if __name__ == "__main__":
+    # python rollup.py rebuild
+    if len(sys.argv) > 1 and sys.argv[1] == "rebuild":
+        rebuild()
+        print("✅ Rekap harian berhasil dihitung ulang")
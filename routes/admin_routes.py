@@ -1,18 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
-from fastapi.responses import FileResponse
+import asyncio
+import base64
+import csv
+import io
+import json
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, Query
+from fastapi.responses import FileResponse, StreamingResponse
 
-from config import ADMIN_SECRET
-from database import db_execute, db_query
-from utils import verify_password
+from database import db_execute, db_query, iter_query, transaction
+from utils import check_rate_limit, client_ip
 from models import AdminLogin
 
-from services.digiflazz_service import get_digiflazz_products
+import admin_auth
+import pricing
+import product_sync
+import job_queue
+import catalog
+import event_log
+import rollup
 from pydantic import BaseModel
 
 router = APIRouter()
 
 def verify_admin(token: str = Header(None)):
-    if token != ADMIN_SECRET:
+    # Cek HMAC token sesi, gak nyentuh DB
+    if not admin_auth.is_admin(token):
         raise HTTPException(403, "Unauthorized")
 
 @router.get("/admin")
@@ -20,96 +32,219 @@ def admin_page():
     return FileResponse("web/admin.html")
 
 @router.post("/admin/login")
-def admin_login(data: AdminLogin):
-    row = db_query("SELECT id, password FROM admin WHERE username=?", (data.username,))
+async def admin_login(data: AdminLogin, request: Request):
+    # Nahan brute force: per IP dan per username (rate limit & query SQLite di threadpool)
+    if not await asyncio.to_thread(_allow_login, client_ip(request), data.username):
+        raise HTTPException(status_code=429, detail="Terlalu banyak percobaan login, coba lagi nanti")
+
+    row = await asyncio.to_thread(db_query, "SELECT id, password FROM admin WHERE username=?", (data.username,))
     if not row:
         raise HTTPException(status_code=401, detail="Login gagal")
     
     admin_id, hashed_password = row[0]
-    if not verify_password(data.password, hashed_password):
+    try:
+        # bcrypt di process pool, event loop & threadpool tetap longgar
+        ok = await admin_auth.check_password(data.password, hashed_password)
+    except admin_auth.Busy:
+        raise HTTPException(status_code=503, detail="Server sibuk, coba login lagi", headers={"Retry-After": "2"})
+    if not ok:
         raise HTTPException(status_code=401, detail="Password salah")
     
-    return {"message": "Login berhasil", "token": ADMIN_SECRET}
+    return {"message": "Login berhasil", "token": admin_auth.issue(admin_id)}
+
+def _allow_login(ip, username):
+    return check_rate_limit(f"login:ip:{ip}", limit=5, window=60) and \
+           check_rate_limit(f"login:user:{username}", limit=10, window=300)
+
+@router.post("/admin/logout")
+def admin_logout(token: str = Header(None)):
+    admin_auth.revoke(token)
+    return {"message": "Logout berhasil"}
 
 @router.get("/admin-dashboard")
 def admin_dashboard():
     return FileResponse("web/admin-dashboard.html")
 
+ORDER_COLUMNS = ["id", "phone", "target_id", "nominal", "amount", "payment_status", "topup_status", "sn", "created_at"]
+ORDER_COUNT_CAP = 10000  # di atas ini total cuma ditampilkan "10000+"
+
+def _order_filters(status, payment_status, date_from, date_to, phone, sku):
+    where, params = [], []
+    if status:
+        where.append("topup_status=?")
+        params.append(status)
+    if payment_status:
+        where.append("payment_status=?")
+        params.append(payment_status)
+    # created_at disimpan UTC (CURRENT_TIMESTAMP), tanggal filter itu tanggal WIB:
+    # batasnya yang digeser ke UTC (bukan kolomnya), biar index created_at tetap kepakai
+    if date_from:
+        where.append("created_at >= DATETIME(?, '-7 hours')")
+        params.append(date_from)
+    if date_to:
+        where.append("created_at < DATETIME(?, '+1 day', '-7 hours')")
+        params.append(date_to)
+    if phone:
+        where.append("phone=?")
+        params.append(phone)
+    if sku:
+        where.append("nominal=?")
+        params.append(sku)
+    return where, params
+
+def _encode_cursor(created_at, order_id):
+    return base64.urlsafe_b64encode(json.dumps([created_at, order_id]).encode()).decode()
+
+def _decode_cursor(cursor):
+    try:
+        created_at, order_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return created_at, order_id
+    except Exception:
+        raise HTTPException(400, "Cursor tidak valid")
+
 @router.get("/admin/api/orders")
-def admin_orders(admin=Depends(verify_admin)):
-    rows = db_query("""
-        SELECT id, phone, nominal, payment_status, topup_status, created_at 
-        FROM topup ORDER BY created_at DESC
-    """)
-    return [{"id": r[0], "phone": r[1], "nominal": r[2], "payment_status": r[3], "topup_status": r[4], "created_at": r[5]} for r in rows]
+def admin_orders(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: str = None,
+    status: str = None,
+    payment_status: str = None,
+    date_from: str = None,
+    date_to: str = None,
+    phone: str = None,
+    sku: str = None,
+    admin=Depends(verify_admin)
+):
+    # Keyset pagination (created_at, id) turun: halaman ke-1000 sama cepatnya dengan halaman pertama
+    where, params = _order_filters(status, payment_status, date_from, date_to, phone, sku)
+    filter_sql = (" WHERE " + " AND ".join(where)) if where else ""
+
+    page_where = list(where)
+    page_params = list(params)
+    if cursor:
+        page_where.append("(created_at, id) < (?, ?)")
+        page_params.extend(_decode_cursor(cursor))
+    page_sql = (" WHERE " + " AND ".join(page_where)) if page_where else ""
+
+    rows = db_query(
+        f"SELECT {', '.join(ORDER_COLUMNS)} FROM topup{page_sql} ORDER BY created_at DESC, id DESC LIMIT ?",
+        (*page_params, limit + 1)
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = _encode_cursor(last[ORDER_COLUMNS.index("created_at")], last[0])
+
+    # Total dihitung sampai batas aja, biar filter longgar gak nge-scan semua riwayat
+    total = db_query(
+        f"SELECT COUNT(*) FROM (SELECT 1 FROM topup{filter_sql} LIMIT ?)",
+        (*params, ORDER_COUNT_CAP + 1)
+    )[0][0]
+
+    return {
+        "items": [dict(zip(ORDER_COLUMNS, r)) for r in rows],
+        "next_cursor": next_cursor,
+        "total": min(total, ORDER_COUNT_CAP),
+        "total_capped": total > ORDER_COUNT_CAP,
+    }
+
+@router.get("/admin/api/orders/export")
+def export_orders(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    status: str = None,
+    payment_status: str = None,
+    date_from: str = None,
+    date_to: str = None,
+    phone: str = None,
+    sku: str = None,
+    admin=Depends(verify_admin)
+):
+    # Stream baris per baris dari cursor SQLite, gak pernah load satu tabel ke memori
+    where, params = _order_filters(status, payment_status, date_from, date_to, phone, sku)
+    filter_sql = (" WHERE " + " AND ".join(where)) if where else ""
+    rows = iter_query(
+        f"SELECT {', '.join(ORDER_COLUMNS)} FROM topup{filter_sql} ORDER BY created_at DESC, id DESC",
+        tuple(params)
+    )
+
+    def csv_lines():
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(ORDER_COLUMNS)
+        for r in rows:
+            writer.writerow(r)
+            if buf.tell() > 64 * 1024:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue()
+
+    def ndjson_lines():
+        for r in rows:
+            yield json.dumps(dict(zip(ORDER_COLUMNS, r))) + "\n"
+
+    filename = f"orders.{format}"
+    return StreamingResponse(
+        csv_lines() if format == "csv" else ndjson_lines(),
+        media_type="text/csv" if format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+@router.get("/admin/api/orders/{order_id}/timeline")
+def order_timeline(order_id: str, admin=Depends(verify_admin)):
+    row = db_query(f"SELECT {', '.join(ORDER_COLUMNS)} FROM topup WHERE id=?", (order_id,)) or \
+          db_query(f"SELECT {', '.join(ORDER_COLUMNS)} FROM topup_archive WHERE id=?", (order_id,))
+    if not row:
+        raise HTTPException(404, "Order tidak ditemukan")
+    return {"order": dict(zip(ORDER_COLUMNS, row[0])), "events": event_log.timeline(order_id)}
+
+# ===== JOB QUEUE (DEAD LETTER) =====
 
-# ===== BAGIAN STATISTIK (Sudah menggunakan p.sku = t.nominal dan Waktu WIB) =====
+@router.get("/admin/api/jobs/dead")
+def dead_jobs(admin=Depends(verify_admin)):
+    return job_queue.dead_jobs()
+
+@router.post("/admin/api/jobs/{job_id}/retry")
+def retry_job(job_id: int, admin=Depends(verify_admin)):
+    if not job_queue.retry(job_id):
+        return {"error": "Job tidak ditemukan atau bukan DEAD"}
+    return {"message": "Job dimasukkan ulang ke antrian"}
+
+# ===== BAGIAN STATISTIK (dari rekap harian daily_rollup, harga dibekukan pas order SUCCESS) =====
+
+@router.get("/admin/api/stats")
+def stats(admin=Depends(verify_admin)):
+    # Semua angka dashboard sekali panggil
+    return rollup.stats()
+
+@router.post("/admin/api/stats/rebuild")
+def stats_rebuild(admin=Depends(verify_admin)):
+    rollup.rebuild()
+    return {"message": "Rekap statistik berhasil dihitung ulang"}
 
 @router.get("/admin/api/revenue-today")
 def revenue_today(admin=Depends(verify_admin)):
-    rows = db_query("""
-        SELECT p.price FROM topup t
-        JOIN products p ON p.sku = t.nominal
-        WHERE t.topup_status='SUCCESS' AND DATE(t.created_at) = DATE('now', '+7 hours')
-    """)
-    return {"revenue": sum(r[0] for r in rows), "count": len(rows)}
+    s = rollup.stats(days=1)
+    return {"revenue": s["revenue_today"], "count": s["count_today"]}
 
 @router.get("/admin/api/revenue-total")
 def revenue_total(admin=Depends(verify_admin)):
-    rows = db_query("""
-        SELECT p.price FROM topup t
-        JOIN products p ON p.sku = t.nominal
-        WHERE t.topup_status='SUCCESS'
-    """)
-    return {"revenue": sum(r[0] for r in rows)}
+    return {"revenue": rollup.stats(days=1)["revenue_total"]}
 
 @router.get("/admin/api/profit-today")
 def profit_today(admin=Depends(verify_admin)):
-    rows = db_query("""
-        SELECT p.price, p.cost_price FROM topup t
-        JOIN products p ON p.sku = t.nominal
-        WHERE t.topup_status='SUCCESS' AND DATE(t.created_at) = DATE('now', '+7 hours')
-    """)
-    # r[0] adalah price, r[1] adalah cost
-    return {"profit": sum((r[0] - r[1]) for r in rows)}
+    return {"profit": rollup.stats(days=1)["profit_today"]}
 
 @router.get("/admin/api/profit-total")
 def profit_total(admin=Depends(verify_admin)):
-    rows = db_query("""
-        SELECT p.price, p.cost_price FROM topup t
-        JOIN products p ON p.sku = t.nominal
-        WHERE t.topup_status='SUCCESS'
-    """)
-    return {"profit": sum((r[0] - r[1]) for r in rows)}
+    return {"profit": rollup.stats(days=1)["profit_total"]}
 
 # ===== MANAJEMEN PRODUK =====
 
 @router.get("/admin/api/products")
-def get_products(admin=Depends(verify_admin)):
-    # Ambil semua data, termasuk kolom category
-    rows = db_query("SELECT sku, provider, name, cost_price, price, active, category FROM products ORDER BY provider, price")
-    
-    grouped = {}
-    for r in rows:
-        sku, provider, name, cost, price, active, category = r
-        # Kategorikan otomatis kalau kosong
-        cat_name = category if category else "Game"
-        
-        if cat_name not in grouped:
-            grouped[cat_name] = {}
-        if provider not in grouped[cat_name]:
-            grouped[cat_name][provider] = []
-            
-        grouped[cat_name][provider].append({
-            "sku": sku,
-            "provider": provider,
-            "name": name,
-            "cost": cost,
-            "price": price,
-            "active": active,
-            "profit": price - cost
-        })
-    return grouped
+def get_products(request: Request, admin=Depends(verify_admin)):
+    # Sudah dikelompokkan per kategori -> provider, diambil dari cache katalog
+    return catalog.response(request, "admin", "private, no-cache")
 
 @router.post("/admin/api/products")
 def create_product(data: dict, admin=Depends(verify_admin)):
@@ -122,10 +257,15 @@ def create_product(data: dict, admin=Depends(verify_admin)):
     if not provider or not name or not sku:
         return {"error": "Semua field wajib diisi"}
         
-    db_execute(
-        "INSERT INTO products (provider, name, sku, cost, price, active) VALUES (?, ?, ?, ?, ?, 1)",
-        (provider, name, sku, cost, price)
-    )
+    with transaction():
+        db_execute(
+            "INSERT INTO products (provider, name, sku, cost_price, price, active) VALUES (?, ?, ?, ?, ?, 1)",
+            (provider, name, sku, cost, price)
+        )
+        # Harga yang diketik admin dikunci jadi aturan SKU, biar gak ketimpa aturan harga lain
+        if price is not None:
+            pricing.pin(sku, price, cost)
+    catalog.bump()
     return {"message": "Produk ditambahkan"}
 
 @router.put("/admin/api/products/{sku}/toggle")
@@ -135,7 +275,9 @@ def toggle_product(sku: str, admin=Depends(verify_admin)):
         return {"error": "Produk tidak ditemukan"}
     
     new_status = 0 if row[0][0] == 1 else 1
-    db_execute("UPDATE products SET active=? WHERE sku=?", (new_status, sku))
+    # Admin yang mutusin sekarang: sinkron harga gak boleh nyalain lagi otomatis
+    db_execute("UPDATE products SET active=?, auto_off=0 WHERE sku=?", (new_status, sku))
+    catalog.bump()
     return {"message": "Status produk diperbarui", "active": new_status}
 
 @router.put("/admin/api/products/{sku}")
@@ -146,80 +288,96 @@ def update_product(sku: str, data: dict, admin=Depends(verify_admin)):
     if price is None or cost is None:
         return {"error": "Harga jual dan modal wajib diisi"}
         
-    db_execute(
-        "UPDATE products SET price=?, cost=? WHERE sku=?",
-        (price, cost, sku)
-    )
+    with transaction():
+        db_execute(
+            "UPDATE products SET price=?, cost_price=? WHERE sku=?",
+            (price, cost, sku)
+        )
+        pricing.pin(sku, price, cost)
+    catalog.bump()
     return {"message": "Produk berhasil diperbarui"}
 
 @router.delete("/admin/api/products/{sku}")
 def delete_product(sku: str, admin=Depends(verify_admin)):
     # PERINGATAN: Menghapus produk bisa merusak riwayat laporan keuangan
-    db_execute("DELETE FROM products WHERE sku=?", (sku,))
+    with transaction():
+        db_execute("DELETE FROM products WHERE sku=?", (sku,))
+        pricing.unpin(sku)
+    catalog.bump()
     return {"message": "Produk berhasil dihapus"}
 
+@router.get("/admin/api/products/{sku}/price-history")
+def product_price_history(sku: str, admin=Depends(verify_admin)):
+    # Riwayat perubahan modal dari sinkron Digiflazz, terbaru duluan
+    return product_sync.price_history(sku)
+
 @router.post("/admin/sync-products")
-def sync_products(admin=Depends(verify_admin)):
-    from services.digiflazz_service import get_digiflazz_products
-    
-    products = get_digiflazz_products()
+async def sync_products(admin=Depends(verify_admin)):
+    try:
+        stats = await product_sync.sync_products()
+    except Exception as e:
+        # Teks error dari Digiflazz / koneksi, ditampilin ke admin
+        print(f"🚨 GAGAL SINKRON: {e}")
+        return {"message": f"Gagal: {e}"}
 
-    # 🛡️ PAGAR PENGAMAN: Cek apakah products itu LIST atau cuma TEKS ERROR
-    if isinstance(products, str):
-        # Kalau dapetnya teks error dari Digiflazz
-        print(f"🚨 GAGAL SINKRON: {products}")
-        return {"message": f"Gagal: {products}"}
-    
-    if not products or not isinstance(products, list):
-        return {"message": "Gagal: Data Digiflazz kosong atau salah format."}
-
-    count = 0
-    for p in products:
-        # Cek lagi buat mastiin p itu dictionary, biar gak 'str object' error lagi
-        if not isinstance(p, dict): continue
-
-        if p.get('buyer_product_status') == True:
-            # --- DETEKSI KATEGORI OTOMATIS (Sangat Teliti) ---
-            d_cat = p.get('category', '').lower()
-            d_brand = p.get('brand', '').lower()
-            
-            target_category = "Lainnya" # Default
-
-            # A. Cek Pulsa & Data (Termasuk Masa Aktif)
-            if any(x in d_brand for x in ['telkomsel', 'xl', 'axis', 'indosat', 'tri', 'smartfren']) or \
-               any(x in d_cat for x in ['pulsa', 'data', 'paket', 'internet', 'masa aktif']):
-                target_category = "Pulsa"
-            
-            # B. Cek E-Wallet
-            elif any(x in d_brand for x in ['dana', 'ovo', 'gopay', 'go-pay', 'shopeepay', 'linkaja', 'maxim', 'grab']) or \
-                 any(x in d_cat for x in ['e-money', 'wallet']):
-                target_category = "E-Wallet"
-            
-            # C. Cek Game
-            elif any(x in d_cat for x in ['game', 'vouchers', 'vaucher']) or \
-                 any(x in d_brand for x in ['mobile legends', 'free fire', 'ff', 'pubg', 'genshin', 'valorant', 'steam']):
-                target_category = "Game"
-
-            # --- INSERT/UPDATE DATABASE ---
-            db_execute("""
-                INSERT INTO products (sku, provider, name, price, cost_price, active, category)
-                VALUES (?, ?, ?, ?, ?, 0, ?)
-                ON CONFLICT(sku) DO UPDATE SET
-                cost_price = excluded.cost_price,
-                price = excluded.price,
-                name = excluded.name,
-                category = excluded.category -- WAJIB ADA BIAR INDOSAT PINDAH LACI
-            """, (
-                p['buyer_sku_code'],
-                p['brand'],
-                p['product_name'],
-                int(p['price']) + 2000, 
-                int(p['price']),
-                target_category
-            ))
-            count += 1
-            
-    return {"message": f"Berhasil sinkron {count} produk!"}
+    total = stats["inserted"] + stats["updated"] + stats["unchanged"]
+    return {
+        "message": (
+            f"Berhasil sinkron {total} produk! "
+            f"({stats['inserted']} baru, {stats['updated']} berubah, {stats['unchanged']} tetap, "
+            f"{stats['disabled'] + stats['vanished']} dinonaktifkan, {stats['price_changes']} ganti modal, {stats['total_ms']} ms)"
+        ),
+        **stats
+    }
+
+# ===== ATURAN HARGA (pricing.py) =====
+
+class PricingRuleRequest(BaseModel):
+    scope: str = "all"              # all / category / brand / sku
+    value: str = ""
+    priority: Optional[int] = None  # kosong = default per scope (sku > brand > category > all)
+    percent: float = 0
+    min_profit: int = 0
+    round_to: int = 0               # misal 500 -> dibulatkan ke atas ke kelipatan 500
+    floor: Optional[int] = None
+    ceiling: Optional[int] = None
+    note: Optional[str] = None
+
+@router.get("/admin/api/pricing-rules")
+def pricing_rules(admin=Depends(verify_admin)):
+    return pricing.list_rules()
+
+@router.post("/admin/api/pricing-rules")
+def save_pricing_rule(req: PricingRuleRequest, apply: bool = True, admin=Depends(verify_admin)):
+    # Simpan + langsung terapkan ke seluruh katalog (satu transaksi)
+    try:
+        with transaction():
+            rule_id = pricing.save_rule(req.model_dump())
+            n = pricing.apply() if apply else 0
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return {"message": f"Aturan disimpan, harga {n} produk diperbarui", "id": rule_id, "repriced": n}
+
+@router.delete("/admin/api/pricing-rules/{rule_id}")
+def delete_pricing_rule(rule_id: int, apply: bool = True, admin=Depends(verify_admin)):
+    with transaction():
+        if not pricing.delete_rule(rule_id):
+            raise HTTPException(404, "Aturan tidak ditemukan")
+        n = pricing.apply() if apply else 0
+    return {"message": f"Aturan dihapus, harga {n} produk diperbarui", "repriced": n}
+
+@router.post("/admin/api/pricing-rules/preview")
+def preview_pricing(req: Optional[PricingRuleRequest] = None, limit: int = Query(500, le=5000), admin=Depends(verify_admin)):
+    # Dry-run: daftar harga yang bakal berubah (dengan aturan calon di body kalau ada), gak nulis apa-apa
+    try:
+        return pricing.preview(req.model_dump() if req else None, limit)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+@router.post("/admin/api/pricing-rules/apply")
+def apply_pricing(admin=Depends(verify_admin)):
+    n = pricing.apply()
+    return {"message": f"Harga {n} produk diperbarui", "repriced": n}
 
 class BulkMarkupRequest(BaseModel):
     brand: str
@@ -228,28 +386,23 @@ class BulkMarkupRequest(BaseModel):
 
 @router.post("/admin/bulk-markup")
 def bulk_markup(req: BulkMarkupRequest, admin=Depends(verify_admin)):
+    # Tombol lama di dashboard, sekarang cuma jalan pintas bikin aturan harga:
+    # brand ALL -> aturan scope all, selain itu aturan scope brand.
+    # Harga manual di brand itu ikut ditimpa (sama kayak dulu).
     brand = req.brand.upper()
-    # Mengubah persen jadi desimal perkalian (misal 5% jadi 0.05)
-    multiplier = req.percent / 100.0 
-    min_profit = req.min_profit
+    scope, value = ("all", "") if brand == "ALL" else ("brand", brand)
 
     try:
-        # Rumus pintar SQLite: harga baru = cost_price + Nilai Terbesar antara (cost_price * desimal) ATAU min_profit
+        with transaction():
+            pricing.unpin_matching(scope, value)
+            pricing.save_rule({"scope": scope, "value": value, "percent": req.percent,
+                               "min_profit": req.min_profit, "note": "bulk markup"})
+            n = pricing.apply()
         if brand == "ALL":
-            db_execute("""
-                UPDATE products 
-                SET price = cost_price + MAX(CAST(cost_price * ? AS INT), ?)
-            """, (multiplier, min_profit))
-            pesan = f"Sukses! Semua produk berhasil di-markup {req.percent}% (Minimal profit Rp {min_profit})"
+            pesan = f"Sukses! Semua produk berhasil di-markup {req.percent}% (Minimal profit Rp {req.min_profit})"
         else:
-            db_execute("""
-                UPDATE products 
-                SET price = cost_price + MAX(CAST(cost_price * ? AS INT), ?) 
-                WHERE UPPER(provider) LIKE ?
-            """, (multiplier, min_profit, f"%{brand}%"))
-            pesan = f"Sukses! Kategori {brand} berhasil di-markup {req.percent}% (Minimal profit Rp {min_profit})"
-
-        return {"message": pesan}
+            pesan = f"Sukses! Kategori {brand} berhasil di-markup {req.percent}% (Minimal profit Rp {req.min_profit})"
+        return {"message": f"{pesan}, {n} harga berubah"}
     except Exception as e:
         print(f"🚨 ERROR BULK MARKUP: {e}")
-        return {"error": str(e)}
\ No newline at end of file
+        return {"error": str(e)}
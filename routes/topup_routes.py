@@ -1,136 +1,273 @@
+import asyncio
 import hashlib
 import uuid
 import json
 import hmac
+import time
+from contextlib import aclosing
 from fastapi import APIRouter, HTTPException, Request, Header
-from fastapi.responses import RedirectResponse
-from database import db_query, db_execute
+from fastapi.responses import RedirectResponse, StreamingResponse
+from database import db_query, db_execute, transaction
 from services.tripay_service import create_invoice
-from config import TRIPAY_PRIVATE_KEY
-from services.digiflazz_service import kirim_digiflazz
-import os
+from config import TRIPAY_PRIVATE_KEY, DIGIFLAZZ_WEBHOOK_SECRET, CATALOG_MAX_AGE, PAYMENT_CHANNELS_MAX_AGE, EVENTS_RECHECK_SECONDS, EVENTS_LONGPOLL_SECONDS, EVENTS_STREAM_SECONDS, EVENTS_MAX_SUBSCRIBERS
+from job_queue import enqueue
+import catalog
+import order_events
+import payment_channels
+import receipts
+from utils import check_rate_limit, client_ip
+import order_state
+from event_log import add_log
 
 router = APIRouter()
 
 @router.post("/topup")
-def topup(data: dict):
-    wa_pembeli = data.get("phone")
+async def topup(data: dict, request: Request):
+    wa_pembeli = str(data.get("phone") or "").strip() or None  # opsional, cuma buat notifikasi
     target_id = data.get("target_id")
     sku = data.get("nominal")
     method = data.get("method")
     nickname = data.get("nickname", "-") # Default "-" kalau kosong
 
+    # Cek data dulu, baru rate limit
+    if not target_id or not sku or not method:
+        raise HTTPException(400, "Tujuan, nominal, dan metode pembayaran wajib diisi")
+
+    # Semua akses SQLite di route async lewat threadpool: nunggu lock (busy_timeout)
+    # gak boleh nahan event loop, yang lagi SSE / engine ikut macet
+
+    # Anti spam bikin invoice: per IP dan per nomor WA
+    if not await asyncio.to_thread(_allow_topup, client_ip(request), wa_pembeli):
+        raise HTTPException(429, "Terlalu banyak transaksi, coba lagi sebentar lagi")
+
     # 1. Ambil harga dari database
-    res = db_query("SELECT price FROM products WHERE sku=?", (sku,))
+    res = await asyncio.to_thread(db_query, "SELECT price FROM products WHERE sku=?", (sku,))
     if not res:
         raise HTTPException(400, "Produk tidak ditemukan")
     price = res[0][0]
 
     # ==========================================
-    # ⚡ PERBAIKAN: HITUNG BIAYA ADMIN TRIPAY
+    # ⚡ HITUNG BIAYA ADMIN TRIPAY: dari registry channel (di memori), gak nembak Tripay
     # ==========================================
-    admin_fee = 0
-    metode_pembayaran = str(method).upper()
-
-    if metode_pembayaran == "QRIS":
-        admin_fee = int(price * 0.007)
-    elif metode_pembayaran in ["OVO", "DANA"]:
-        admin_fee = int(price * 0.015)
-    else:
-        admin_fee = 4500 # Default untuk VA
+    channel = payment_channels.get(method)
+    if not channel:
+        raise HTTPException(400, "Metode pembayaran tidak tersedia")
 
+    admin_fee = payment_channels.fee(channel, int(price))
     total_bayar = int(price) + admin_fee
+    # Batas minimum / maksimum Tripay berlaku ke amount invoice (harga + fee), bukan harga doang
+    if (channel.get("min_amount") and total_bayar < channel["min_amount"]) or \
+       (channel.get("max_amount") and total_bayar > channel["max_amount"]):
+        raise HTTPException(400, f"Nominal ini tidak bisa dibayar pakai {channel['name']}")
     # ==========================================
 
     # 2. Buat ID Transaksi (Order ID)
     order_id = str(uuid.uuid4())
 
-    # 3. Simpan ke Database (PENTING: Gunakan total_bayar, bukan price)
+    # 3. Simpan order (UNPAID) DULU, baru minta invoice ke Tripay: kalau simpan gagal,
+    # pembeli gak pernah pegang invoice yang callback-nya gak nemu order
     try:
-        db_execute(
-        """INSERT INTO topup (id, phone, target_id, nickname, nominal, amount, payment_status) 
-           VALUES (?, ?, ?, ?, ?, ?, 'UNPAID')""",
-        (order_id, wa_pembeli, target_id, nickname, sku, total_bayar)
-    )
+        await asyncio.to_thread(
+            db_execute,
+            """INSERT INTO topup (id, phone, target_id, nickname, nominal, amount, sale_price, payment_status)
+               VALUES (?, ?, ?, ?, ?, ?, ?, 'UNPAID')""",
+            (order_id, wa_pembeli, target_id, nickname, sku, total_bayar, price)
+        )
     except Exception as e:
         print(f"DATABASE ERROR: {e}")
         raise HTTPException(500, f"Gagal simpan database: {str(e)}")
+    add_log(order_id, "created", f"{sku} -> {target_id}")
 
     # 4. Kirim ke Tripay (PENTING: amount diisi total_bayar)
     try:
-        tripay_res = create_invoice(
+        tripay_res = await create_invoice(
             order_id=order_id,
             amount=total_bayar,
             method=method,
             customer_name="Customer MCD",
             customer_email="customer@mcd.com",
-            customer_phone=wa_pembeli
+            customer_phone=wa_pembeli or "080000000000"  # nomor dummy lama kalau pembeli gak isi WA
         )
-        
+
         if not tripay_res or not tripay_res.get("checkout_url"):
             raise Exception("Gagal mendapatkan link pembayaran dari Tripay")
-
-        invoice_url = tripay_res.get("checkout_url")
-        qr_url = tripay_res.get("qr_url")
-
-        # Update URL Invoice di database
-        db_execute("UPDATE topup SET invoice_url=? WHERE id=?", (invoice_url, order_id))
-        
-        return {
-            "id": order_id, 
-            "invoice_url": invoice_url, 
-            "qr_url": qr_url or "" 
-        }
-
     except Exception as e:
         print(f"TRIPAY ERROR: {e}")
+        add_log(order_id, "invoice_error", str(e))
+        # Invoice gak jadi: order langsung ditutup, gak nyangkut UNPAID
+        await asyncio.to_thread(order_state.transition, order_id, "invoice_fail", note=str(e))
         raise HTTPException(500, f"Error Tripay: {str(e)}")
 
+    invoice_url = tripay_res.get("checkout_url")
+    qr_url = tripay_res.get("qr_url")
+    add_log(order_id, "invoice", f"{method} {total_bayar} {tripay_res.get('reference') or '-'}")
+
+    # 5. Simpan link invoice-nya. Gagal di sini gak apa-apa: order sudah ada,
+    # callback Tripay tetap jalan, link-nya tetap dibalikin ke pembeli
+    try:
+        await asyncio.to_thread(db_execute, "UPDATE topup SET invoice_url=?, qr_url=? WHERE id=?",
+                                (invoice_url, qr_url, order_id))
+    except Exception as e:
+        print(f"DATABASE ERROR: {e}")
+        add_log(order_id, "invoice_error", f"link invoice gagal disimpan: {e}")
+
+    return {
+        "id": order_id,
+        "invoice_url": invoice_url,
+        "qr_url": qr_url or ""
+    }
+
+def _allow_topup(ip, phone):
+    # Tanpa nomor WA cuma kena limit per IP: semua yang gak isi WA jangan dijadiin satu bucket
+    return check_rate_limit(f"topup:ip:{ip}", limit=10, window=60) and \
+           (not phone or check_rate_limit(f"topup:phone:{phone}", limit=5, window=60))
+
+def _display_status(payment_status, topup_status):
+    # Logika tampilan status
+    display_status = payment_status
+    if payment_status == "PAID" and topup_status == "SUCCESS":
+        display_status = "SUCCESS"
+    elif topup_status == "FAILED":
+        display_status = "FAILED"
+    elif payment_status == "PAID" and topup_status == "PROCESSING":
+        display_status = "PROCESSING"
+    return display_status
+
+def _order_status(where, params, archive=False):
+    row = db_query(f"""
+        SELECT payment_status, topup_status, invoice_url, nominal
+        FROM topup
+        WHERE {where}
+        ORDER BY rowid DESC LIMIT 1
+    """, params)
+    if not row and archive:
+        # Order lama udah dipindah sweeper ke arsip
+        row = db_query(f"""
+            SELECT payment_status, topup_status, invoice_url, nominal
+            FROM topup_archive
+            WHERE {where}
+            ORDER BY created_at DESC LIMIT 1
+        """, params)
+    if not row:
+        return None
+    payment_status, topup_status, invoice_url, nominal = row[0]
+    return {
+        "status": _display_status(payment_status, topup_status),
+        "invoice_url": invoice_url or "",
+        "qr_url": "" # PERBAIKAN: Kosongkan fallback biar gambar ngga pecah
+    }
+
+# Status tampilan yang udah gak bakal berubah lagi -> stream ditutup
+FINAL_STATUS = ("SUCCESS", "FAILED")
+
 @router.get("/topup/{identifier}")
-def check_status(identifier: str):
+def check_status(identifier: str, request: Request):
+    if not check_rate_limit(f"status:ip:{client_ip(request)}", limit=60, window=60):
+        raise HTTPException(429, "Terlalu banyak request, coba lagi sebentar lagi")
     try:
         # PERBAIKAN: Pakai rowid! Karena created_at sering bikin error 500 kalau kolomnya gak ada
-        row = db_query("""
-            SELECT payment_status, topup_status, invoice_url, nominal 
-            FROM topup 
-            WHERE id=? OR phone=? 
-            ORDER BY rowid DESC LIMIT 1
-        """, (identifier, identifier))
-        
-        if not row:
+        status = _order_status("id=? OR phone=?", (identifier, identifier), archive=True)
+        if not status:
             raise HTTPException(404, "Transaksi tidak ditemukan")
-            
-        payment_status, topup_status, invoice_url, nominal = row[0]
-        
-        # Logika tampilan status
-        display_status = payment_status
-        if payment_status == "PAID" and topup_status == "SUCCESS":
-            display_status = "SUCCESS"
-        elif topup_status == "FAILED":
-            display_status = "FAILED"
-        elif payment_status == "PAID" and topup_status == "PROCESSING":
-            display_status = "PROCESSING"
-            
-        return {
-            "status": display_status,
-            "invoice_url": invoice_url or "",
-            "qr_url": "" # PERBAIKAN: Kosongkan fallback biar gambar ngga pecah
-        }
+        return status
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"🚨 ERROR CHECK STATUS: {e}")
         raise HTTPException(500, f"Error Server: {str(e)}")
 
+@router.get("/topup/{order_id}/receipt")
+def receipt(order_id: str, request: Request):
+    # Struk dirender di background setelah SUCCESS: kalau belum jadi, suruh coba lagi sebentar.
+    # Bucket sendiri, biar download struk gak makan jatah polling status
+    if not check_rate_limit(f"receipt:ip:{client_ip(request)}", limit=60, window=60):
+        raise HTTPException(429, "Terlalu banyak request, coba lagi sebentar lagi")
+    found = receipts.find(order_id)
+    if not found or found[1] != "SUCCESS":
+        raise HTTPException(404, "Struk tidak ditemukan")
+    if not found[0]:
+        raise HTTPException(404, "Struk lagi dibuat, coba lagi sebentar", headers={"Retry-After": "3"})
+    return RedirectResponse(f"/receipts/{found[0]}", status_code=302)
+
+def _current_status(order_id, request):
+    if not check_rate_limit(f"events:ip:{client_ip(request)}", limit=30, window=60):
+        raise HTTPException(429, "Terlalu banyak request, coba lagi sebentar lagi")
+    if order_events.subscriber_count() >= EVENTS_MAX_SUBSCRIBERS:
+        raise HTTPException(503, "Server lagi penuh, cek status manual", headers={"Retry-After": "5"})
+    status = _order_status("id=?", (order_id,), archive=True)
+    if not status:
+        raise HTTPException(404, "Transaksi tidak ditemukan")
+    return status
+
+async def _watch(order_id, status, timeout):
+    # Yield status tiap berubah sampai final / timeout. Daftar ke hub dulu baru baca
+    # ulang dari DB, biar perubahan yang masuk di antaranya gak kelewat.
+    sub = order_events.subscribe(order_id)
+    if sub is None:
+        yield status
+        return
+    with sub:
+        deadline = time.monotonic() + timeout
+        status = await asyncio.to_thread(_order_status, "id=?", (order_id,)) or status
+        while True:
+            yield status
+            if status["status"] in FINAL_STATUS:
+                return
+            left = deadline - time.monotonic()
+            if left <= 0:
+                return
+            if not await sub.wait(min(left, EVENTS_RECHECK_SECONDS)):
+                yield None  # gak ada kabar: kesempatan kirim keepalive
+            status = await asyncio.to_thread(_order_status, "id=?", (order_id,)) or status
+
+async def _event_stream(order_id, status):
+    yield "retry: 5000\n\n"
+    last = None
+    async with aclosing(_watch(order_id, status, EVENTS_STREAM_SECONDS)) as updates:
+        async for status in updates:
+            if status is None:
+                # Keepalive biar proxy gak motong koneksi idle
+                yield ": ping\n\n"
+            elif status != last:
+                yield f"data: {json.dumps(status)}\n\n"
+                last = status
+
+@router.get("/topup/{order_id}/events")
+async def order_status_events(order_id: str, request: Request):
+    # SSE: browser nunggu di sini, server yang ngabarin tiap status berubah.
+    # Stream ditutup begitu status final (atau setelah EVENTS_STREAM_SECONDS, browser nyambung ulang sendiri).
+    status = await asyncio.to_thread(_current_status, order_id, request)
+    return StreamingResponse(
+        _event_stream(order_id, status),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/topup/{order_id}/wait")
+async def order_status_longpoll(order_id: str, request: Request, since: str = ""):
+    # Long-poll buat browser/proxy yang gak bisa SSE: balik langsung kalau status
+    # udah beda dari `since`, kalau sama ditahan sampai berubah / timeout
+    status = await asyncio.to_thread(_current_status, order_id, request)
+    if status["status"] != since:
+        return status
+    async with aclosing(_watch(order_id, status, EVENTS_LONGPOLL_SECONDS)) as updates:
+        async for s in updates:
+            if s is not None:
+                status = s
+                if s["status"] != since:
+                    break
+    return status
+
 @router.get("/api/products")
-def get_public_products():
-    rows = db_query("SELECT sku, provider, name, price FROM products WHERE active=1 ORDER BY provider, price")
-    return [
-        {
-            "sku": r[0],
-            "provider": r[1], 
-            "name": r[2], 
-            "price": r[3]
-        } for r in rows
-    ]
+def get_public_products(request: Request):
+    # Dilayani dari cache katalog (JSON udah jadi), gak query SQLite tiap page load.
+    # Sengaja def (threadpool): kalau cache lagi kosong, bangunnya gak nahan event loop
+    return catalog.response(request, "public", f"public, max-age={CATALOG_MAX_AGE}")
+
+@router.get("/api/payment-channels")
+async def get_payment_channels(request: Request):
+    # Channel aktif + fee-nya, biar rincian biaya di storefront sama persis dengan /topup
+    return payment_channels.response(request, f"public, max-age={PAYMENT_CHANNELS_MAX_AGE}")
 
 @router.post("/callback")
 async def tripay_callback(request: Request):
@@ -149,33 +286,31 @@ async def tripay_callback(request: Request):
     data = json.loads(raw_body)
     merchant_ref = data.get("merchant_ref")
     status = data.get("status")
+    add_log(merchant_ref, "callback", status)
 
     if status == "PAID":
-        # 1. Cari data transaksinya dulu (biar tau SKU dan Nomor HP/ID targetnya)
-        order = db_query("SELECT nominal, target_id, payment_status FROM topup WHERE id=?", (merchant_ref,))
-        
-        if order:
-            sku, target_id, current_status = order[0]
-            
-            # Cegah double hit kalau Tripay ngirim callback 2 kali
-            if current_status != "PAID":
-                # 2. Update status jadi PAID di database
-                db_execute(
-                    "UPDATE topup SET payment_status='PAID', topup_status='PROCESSING' WHERE id=?",
-                    (merchant_ref,)
-                )
-                
-                # 3. OTOMATIS TEMBAK DIGIFLAZZ BEJIR!
-                print(f"🚀 Tripay LUNAS! Nembak Digiflazz untuk Ref: {merchant_ref}")
-                kirim_digiflazz(sku=sku, tujuan=target_id, ref_id=merchant_ref)
+        if await asyncio.to_thread(_mark_paid, merchant_ref):
+            print(f"🚀 Tripay LUNAS! Antre kirim Digiflazz untuk Ref: {merchant_ref}")
+    elif status in ("EXPIRED", "FAILED"):
+        # Invoice kadaluarsa / gagal bayar di Tripay: tutup ordernya (kalau masih UNPAID)
+        await asyncio.to_thread(order_state.transition, merchant_ref, "expire")
 
     return {"success": True}
 
+def _mark_paid(order_id):
+    # Transisi UNPAID -> PAID (CAS) + antre job kirim dalam satu transaksi:
+    # callback dobel cuma satu yang menang, yang lain gak ngapa-ngapain
+    with transaction():
+        if not order_state.transition(order_id, "pay"):
+            return False
+        # Antre kirim ke Digiflazz. Yang nembak consumer job_queue (hitungan ms),
+        # jadi balasan ke Tripay gak nunggu Digiflazz
+        enqueue("dispatch", order_id)
+        return True
+
 # ==========================================
 # ⚡ TAMBAHAN BARU: WEBHOOK DIGIFLAZZ
 # ==========================================
-DIGIFLAZZ_SECRET = "rahasiamcd 123" # Nanti ganti sesuai isi di panel Digiflazz lu
-
 @router.post("/api/webhook/digiflazz")
 async def digiflazz_webhook(
     request: Request,
@@ -183,7 +318,7 @@ async def digiflazz_webhook(
 ):
     body = await request.body()
     my_signature = "sha1=" + hmac.new(
-        DIGIFLAZZ_SECRET.encode(),
+        DIGIFLAZZ_WEBHOOK_SECRET.encode(),
         body,
         hashlib.sha1
     ).hexdigest()
@@ -197,14 +332,16 @@ async def digiflazz_webhook(
     ref_id = payload.get("ref_id")
     status = payload.get("status")
     sn = payload.get("sn", "")
-    
+    add_log(ref_id, "webhook", f"{status} {sn or payload.get('message', '')}")
+
+    # Webhook bisa datang dua kali / telat: yang kalah CAS (order udah final) diabaikan
     if status == "Sukses":
-        db_execute("UPDATE topup SET topup_status='SUCCESS', note=? WHERE id=?", (sn, ref_id))
-        print(f"✅ TOPUP SUKSES! Ref: {ref_id} | SN: {sn}")
+        if await asyncio.to_thread(order_state.transition, ref_id, "success", sn=sn, note=sn, next_check_at=None):
+            print(f"✅ TOPUP SUKSES! Ref: {ref_id} | SN: {sn}")
     elif status == "Gagal":
         pesan_error = payload.get("message", "Gagal dari provider")
-        db_execute("UPDATE topup SET topup_status='FAILED', note=? WHERE id=?", (pesan_error, ref_id))
-        print(f"❌ TOPUP GAGAL! Ref: {ref_id} | Error: {pesan_error}")
+        if await asyncio.to_thread(order_state.transition, ref_id, "fail", note=pesan_error, next_check_at=None):
+            print(f"❌ TOPUP GAGAL! Ref: {ref_id} | Error: {pesan_error}")
 
     return {"message": "Webhook Digiflazz diterima"}
 
@@ -215,12 +352,12 @@ def tripay_return():
 @router.post("/topup/{identifier}/cancel")
 def cancel_transaction(identifier: str):
     try:
-        # Ubah status di database jadi CANCELED
-        db_execute(
-            "UPDATE topup SET payment_status='CANCELED', topup_status='FAILED' WHERE id=?", 
-            (identifier,)
-        )
+        # Ubah status jadi CANCELED, cuma kalau belum dibayar
+        if not order_state.transition(identifier, "cancel"):
+            raise HTTPException(409, "Transaksi sudah dibayar / tidak bisa dibatalkan")
         return {"success": True, "message": "Transaksi berhasil dibatalkan"}
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"🚨 ERROR CANCEL: {e}")
         raise HTTPException(500, f"Gagal membatalkan transaksi: {str(e)}")
\ No newline at end of file
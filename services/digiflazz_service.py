@@ -1,12 +1,21 @@
 import hashlib
+import json
 import os
+import re
+import time
 from dotenv import load_dotenv
-import requests
-from config import DIGIFLAZZ_USERNAME, DIGIFLAZZ_KEY
+from config import DIGIFLAZZ_USERNAME, DIGIFLAZZ_KEY, DIGIFLAZZ_BASE_URL
+from services.http_client import get_client
+import metrics
 
 load_dotenv()
 
-def kirim_digiflazz(sku, tujuan, ref_id):
+def _code(response, res):
+    # rc Digiflazz (00 sukses, 03 pending, sisanya gagal) kalau ada, selain itu HTTP status
+    rc = res.get("data", {}).get("rc") if isinstance(res, dict) and isinstance(res.get("data"), dict) else None
+    return f"rc{rc}" if rc else response.status_code
+
+async def kirim_digiflazz(sku, tujuan, ref_id):
     sign = hashlib.md5(
         (DIGIFLAZZ_USERNAME + DIGIFLAZZ_KEY + ref_id).encode()
     ).hexdigest()
@@ -19,13 +28,17 @@ def kirim_digiflazz(sku, tujuan, ref_id):
         "sign": sign
     }
 
+    started = time.perf_counter()
     try:
-        response = requests.post("https://api.digiflazz.com/v1/transaction", json=payload)
-        return response.json()
+        response = await get_client().post(f"{DIGIFLAZZ_BASE_URL}/transaction", json=payload)
+        res = response.json()
+        metrics.upstream("digiflazz", "transaction", started, _code(response, res))
+        return res
     except Exception as e:
+        metrics.upstream("digiflazz", "transaction", started, type(e).__name__)
         return {"data": {"message": f"Koneksi Gagal: {str(e)}", "rc": "99"}}
 
-def cek_status_digiflazz(sku, tujuan, ref_id):
+async def cek_status_digiflazz(sku, tujuan, ref_id):
     sign = hashlib.md5(
         (DIGIFLAZZ_USERNAME + DIGIFLAZZ_KEY + ref_id).encode()
     ).hexdigest()
@@ -38,38 +51,105 @@ def cek_status_digiflazz(sku, tujuan, ref_id):
         "sign": sign
     }
 
+    started = time.perf_counter()
     try:
-        response = requests.post("https://api.digiflazz.com/v1/transaction", json=payload)
-        return response.json()
+        response = await get_client().post(f"{DIGIFLAZZ_BASE_URL}/transaction", json=payload)
+        res = response.json()
+        metrics.upstream("digiflazz", "status", started, _code(response, res))
+        return res
     except Exception as e:
+        metrics.upstream("digiflazz", "status", started, type(e).__name__)
         return {"data": {"message": f"Koneksi Gagal: {str(e)}"}}
 
-def get_digiflazz_products():
-    url = "https://api.digiflazz.com/v1/price-list"
+class RateLimited(Exception):
+    # Digiflazz nolak cek price-list karena kelewat sering (rc 83 / HTTP 429)
+    pass
+
+class _DataArrayParser:
+    # Parse isi "data":[ ... ] dari price-list satu elemen per satu elemen,
+    # langsung dari potongan teks response. List penuhnya gak pernah ada di memori.
+    START = re.compile(r'"data"\s*:\s*([\[{])')
+
+    def __init__(self):
+        self.buf = ""
+        self.started = False
+        self.done = False
+        self.error_body = None      # kalau "data" ternyata dict (pesan error)
+        self.decoder = json.JSONDecoder()
+
+    def feed(self, chunk):
+        if self.error_body is not None:
+            self.error_body += chunk
+            return []
+        self.buf += chunk
+        if not self.started:
+            m = self.START.search(self.buf)
+            if not m:
+                return []
+            if m.group(1) == "{":
+                self.error_body = self.buf
+                return []
+            self.started = True
+            self.buf = self.buf[m.end():]
+
+        items = []
+        pos = 0
+        while not self.done:
+            while pos < len(self.buf) and self.buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(self.buf):
+                break
+            if self.buf[pos] == "]":
+                self.done = True
+                break
+            try:
+                obj, pos = self.decoder.raw_decode(self.buf, pos)
+            except json.JSONDecodeError:
+                break  # elemen belum lengkap, tunggu potongan berikutnya
+            items.append(obj)
+        self.buf = self.buf[pos:]
+        return items
+
+async def iter_digiflazz_products():
+    # Async generator: yield produk price-list satu-satu sambil download.
+    # Kalau Digiflazz ngirim error, lempar Exception berisi pesannya.
+    url = f"{DIGIFLAZZ_BASE_URL}/price-list"
     # Sign untuk pricelist biasanya pakai kata 'pricelist'
     sign = hashlib.md5((DIGIFLAZZ_USERNAME + DIGIFLAZZ_KEY + "pricelist").encode()).hexdigest()
-    
+
     payload = {
         "cmd": "prepaid",
         "username": DIGIFLAZZ_USERNAME,
         "sign": sign
     }
-    
+
+    parser = _DataArrayParser()
+    started = time.perf_counter()
     try:
-        response = requests.post(url, json=payload)
-        data = response.json()
-        
-        # --- PAGAR PENGAMAN: Cek apakah 'data' beneran LIST ---
-        products = data.get("data")
-        
-        if isinstance(products, list):
-            return products
-        else:
-            # Kalau bukan list, berarti Digiflazz ngirim pesan error (dict)
-            error_msg = products.get("message") if isinstance(products, dict) else "Format data salah"
-            print(f"🚨 DIGIFLAZZ ERROR: {error_msg}")
-            return error_msg # Balikin string error biar ditangkep admin_routes
-            
+        async with get_client().stream("POST", url, json=payload) as response:
+            if response.status_code == 429:
+                metrics.upstream("digiflazz", "price-list", started, 429)
+                raise RateLimited("HTTP 429 dari Digiflazz")
+            async for chunk in response.aiter_text():
+                for item in parser.feed(chunk):
+                    yield item
+    except RateLimited:
+        raise
     except Exception as e:
-        print(f"🚨 KONEKSI ERROR: {e}")
-        return f"Koneksi ke Digiflazz gagal: {str(e)}"
\ No newline at end of file
+        metrics.upstream("digiflazz", "price-list", started, type(e).__name__)
+        raise
+    metrics.upstream("digiflazz", "price-list", started, "error" if parser.error_body is not None else response.status_code)
+
+    if parser.error_body is not None:
+        # --- PAGAR PENGAMAN: Digiflazz ngirim pesan error (dict), bukan LIST ---
+        try:
+            error_data = json.loads(parser.error_body).get("data", {})
+        except Exception:
+            error_data = {}
+        error_msg = error_data.get("message") or "Format data salah"
+        print(f"🚨 DIGIFLAZZ ERROR: {error_msg}")
+        if error_data.get("rc") == "83":
+            raise RateLimited(error_msg)
+        raise Exception(error_msg)
+    if not parser.done:
+        raise Exception("Format data salah")
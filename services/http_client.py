@@ -0,0 +1,37 @@
+import httpx
+
+from config import (
+    HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE
+)
+
+# Satu AsyncClient bareng buat Tripay & Digiflazz: koneksi keep-alive dipakai ulang,
+# jadi gak bayar TCP+TLS handshake tiap invoice / cek status.
+# Client ini nempel ke event loop app (route async + engine jalan di loop yang sama).
+
+try:
+    import h2  # noqa: F401  (HTTP/2 cuma aktif kalau paket h2 terpasang)
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+_client = None
+
+def get_client():
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=HTTP2,
+            timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=30,
+            ),
+        )
+    return _client
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -1,8 +1,10 @@
-import requests
 import hashlib
 import hmac
 import os
+import time
 from dotenv import load_dotenv
+from services.http_client import get_client
+import metrics
 
 # Load data dari file .env
 load_dotenv()
@@ -24,7 +26,7 @@ def create_signature(merchant_ref, amount):
     ).hexdigest()
     return signature
 
-def create_invoice(order_id, amount, method, customer_name, customer_email, customer_phone):
+async def create_invoice(order_id, amount, method, customer_name, customer_email, customer_phone):
     # Pastikan URL bersih dari double slash atau kurang slash
     base_url = TRIPAY_URL.rstrip('/')
     url = f"{base_url}/transaction/create"
@@ -48,8 +50,10 @@ def create_invoice(order_id, amount, method, customer_name, customer_email, cust
 
     headers = {'Authorization': f'Bearer {TRIPAY_API_KEY}'}
     
+    started = time.perf_counter()
     try:
-        response = requests.post(url, json=payload, headers=headers)
+        response = await get_client().post(url, json=payload, headers=headers)
+        metrics.upstream("tripay", "transaction/create", started, response.status_code)
         # Jika Tripay kasih error 404/500 dalam bentuk HTML, ini akan ketahuan
         if response.status_code != 200:
             print(f"TRIPAY HTTP ERROR: {response.status_code}")
@@ -61,11 +65,36 @@ def create_invoice(order_id, amount, method, customer_name, customer_email, cust
             return {
                         "checkout_url": data['data']['checkout_url'],
                         "qr_url": data['data'].get('qr_url'), # Khusus metode QRIS
+                        "reference": data['data'].get('reference'), # Kode transaksi di sisi Tripay, buat log
                     }
         else:
             print(f"===== TRIPAY API ERROR =====")
             print(data)
             return None
     except Exception as e:
+        metrics.upstream("tripay", "transaction/create", started, type(e).__name__)
         print(f"SISTEM ERROR: {e}")
-        return None
\ No newline at end of file
+        return None
+
+async def get_payment_channels():
+    # Daftar channel pembayaran + fee dari Tripay. Balikin list, None kalau gagal
+    base_url = TRIPAY_URL.rstrip('/')
+    url = f"{base_url}/merchant/payment-channel"
+    headers = {'Authorization': f'Bearer {TRIPAY_API_KEY}'}
+
+    started = time.perf_counter()
+    try:
+        response = await get_client().get(url, headers=headers)
+        metrics.upstream("tripay", "merchant/payment-channel", started, response.status_code)
+        if response.status_code != 200:
+            print(f"TRIPAY HTTP ERROR (payment-channel): {response.status_code}")
+            return None
+        data = response.json()
+        if not data.get('success') or not isinstance(data.get('data'), list):
+            print(f"TRIPAY API ERROR (payment-channel): {data.get('message')}")
+            return None
+        return data['data']
+    except Exception as e:
+        metrics.upstream("tripay", "merchant/payment-channel", started, type(e).__name__)
+        print(f"SISTEM ERROR (payment-channel): {e}")
+        return None
@@ -0,0 +1,77 @@
+import asyncio
+import logging
+
+import leader
+import order_state
+import receipts
+from config import ORDER_EXPIRE_SECONDS, ARCHIVE_AFTER_DAYS, SWEEP_INTERVAL_SECONDS, SWEEP_BATCH
+from database import db_execute, db_query, transaction
+
+# Jaga tabel topup tetap kecil (muat di page cache) buat engine, cek status & dashboard:
+# 1. UNPAID yang lewat umur invoice Tripay -> EXPIRED (lewat order_state, per batch)
+# 2. Order final (SUCCESS / FAILED) yang lebih tua dari ARCHIVE_AFTER_DAYS dipindah
+#    ke topup_archive. Cek status & timeline admin tetap bisa nemu ID lama di sana.
+# Tiap batch transaksi sendiri, jadi write lock cuma dipegang sebentar.
+# Multi worker: cuma leader yang nyapu.
+
+FINAL = ("SUCCESS", "FAILED")
+
+def expire_unpaid(batch=SWEEP_BATCH):
+    total = 0
+    while True:
+        n = order_state.transition_all(
+            "expire",
+            "id IN (SELECT id FROM topup WHERE payment_status='UNPAID' AND created_at < DATETIME('now', ?) LIMIT ?)",
+            (f"-{ORDER_EXPIRE_SECONDS} seconds", batch)
+        )
+        total += n
+        if n < batch:
+            return total
+
+def _columns():
+    # Kolom yang ada di dua tabel (topup bisa nambah kolom belakangan)
+    archive = {r[1] for r in db_query("PRAGMA table_info(topup_archive)")}
+    return [r[1] for r in db_query("PRAGMA table_info(topup)") if r[1] in archive]
+
+def archive_finished(days=ARCHIVE_AFTER_DAYS, batch=SWEEP_BATCH):
+    cols = ", ".join(_columns())
+    total = 0
+    while True:
+        with transaction():
+            ids = [r[0] for r in db_query(f"""
+                SELECT id FROM topup
+                WHERE topup_status IN ({", ".join("?" * len(FINAL))}) AND created_at < DATETIME('now', ?)
+                LIMIT ?
+            """, (*FINAL, f"-{days} days", batch))]
+            if ids:
+                marks = ", ".join("?" * len(ids))
+                db_execute(f"INSERT OR REPLACE INTO topup_archive ({cols}) SELECT {cols} FROM topup WHERE id IN ({marks})", ids)
+                db_execute(f"DELETE FROM topup WHERE id IN ({marks})", ids)
+                db_execute(f"DELETE FROM jobs WHERE order_id IN ({marks})", ids)
+        total += len(ids)
+        if len(ids) < batch:
+            return total
+
+def sweep():
+    expired = expire_unpaid()
+    archived = archive_finished()
+    # Struk yang kelewat (antrian render penuh / worker mati) disusulin
+    queued = receipts.backfill()
+    if expired or archived or queued:
+        logging.info(f"SWEEPER: {expired} order UNPAID kadaluarsa, {archived} order dipindah ke arsip, {queued} struk disusulin")
+    return expired, archived
+
+async def sweep_loop():
+    while True:
+        if leader.is_leader():
+            try:
+                # Di thread sendiri: arsip awal (ribuan batch) gak boleh nahan event loop
+                await asyncio.to_thread(sweep)
+            except Exception as e:
+                logging.error(f"SWEEPER ERROR {e}")
+        await asyncio.sleep(SWEEP_INTERVAL_SECONDS)
+
+if __name__ == "__main__":
+    # python sweeper.py -> sapu sekali sekarang (misal habis import data lama)
+    expired, archived = sweep()
+    print(f"✅ {expired} order kadaluarsa, {archived} order diarsip")
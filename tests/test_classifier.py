@@ -0,0 +1,103 @@
+import os
+import time
+
+import pytest
+
+from classifier import Classifier, DEFAULT_CATEGORY
+
+
+@pytest.fixture
+def clf():
+    return Classifier().classify
+
+
+# ===== WORD BOUNDARY =====
+
+def test_tri_cuma_kata_utuh(clf):
+    assert clf("TRI", "Pulsa") == "Pulsa"
+    assert clf("Tri", "") == "Pulsa"
+    # 'tri' di dalam kata lain gak boleh nyangkut jadi Pulsa
+    assert clf("PLN", "Electric") == DEFAULT_CATEGORY
+    assert clf("Electricity Token", "Token") == DEFAULT_CATEGORY
+    assert clf("Tricky Games Store", "Merchandise") == DEFAULT_CATEGORY
+
+def test_ff_cuma_kata_utuh(clf):
+    assert clf("FF", "") == "Game"
+    assert clf("FF Max", "") == "Game"
+    assert clf("Coffee Shop", "Voucher") == DEFAULT_CATEGORY
+    assert clf("Buff Store", "Offer") == DEFAULT_CATEGORY
+
+def test_keyword_kategori_juga_pakai_word_boundary(clf):
+    assert clf("", "Data") == "Pulsa"
+    assert clf("", "Database Hosting") == DEFAULT_CATEGORY
+    assert clf("", "Gamepad") == DEFAULT_CATEGORY
+
+def test_brand_multi_kata_dan_spasi_berantakan(clf):
+    assert clf("  MOBILE   LEGENDS ", "") == "Game"
+    assert clf("PUBG Mobile", "") == "Game"
+    assert clf("Shopee Pay", "") == "E-Wallet"
+    assert clf("by.U", "") == "Pulsa"
+
+# ===== PRIORITY =====
+
+def test_priority_paling_kecil_menang(clf):
+    # Brand Pulsa (10) ketemu kategori Game (30) -> Pulsa
+    assert clf("Telkomsel", "Voucher Game") == "Pulsa"
+    # Brand E-Wallet (20) ketemu kategori Game (30) -> E-Wallet
+    assert clf("DANA", "Games") == "E-Wallet"
+
+def test_priority_ikut_aturan_custom():
+    rules = [
+        {"category": "Pulsa", "priority": 50, "brand": ["telkomsel"], "keywords": []},
+        {"category": "Game", "priority": 5, "brand": [], "keywords": ["voucher game"]},
+    ]
+    assert Classifier(rules).classify("Telkomsel", "Voucher Game") == "Game"
+    assert Classifier(rules).classify("Telkomsel", "Pulsa") == "Pulsa"
+
+def test_keyword_dobel_dipegang_aturan_priority_terkecil():
+    rules = [
+        {"category": "B", "priority": 20, "brand": ["sama"]},
+        {"category": "A", "priority": 10, "brand": ["sama"]},
+    ]
+    assert Classifier(rules).classify("Sama", "") == "A"
+
+# ===== FALLBACK =====
+
+def test_brand_gak_dikenal_jatuh_ke_default(clf):
+    assert clf("Brand Antah Berantah", "Lain-lain") == DEFAULT_CATEGORY
+    assert clf("", "") == DEFAULT_CATEGORY
+
+def test_default_bisa_diganti():
+    assert Classifier(default="Other").classify("Unknown", "Misc") == "Other"
+
+def test_aturan_kosong_semua_default():
+    assert Classifier([{"category": "X", "priority": 1}]).classify("Telkomsel", "Pulsa") == DEFAULT_CATEGORY
+
+# ===== PERFORMA =====
+
+def test_10rb_nama_dikompilasi_sekali_dan_dimemo():
+    # Bagian yang bikin cepat, dicek tanpa jam: regex dibangun sekali per Classifier,
+    # kombinasi (brand, category) yang sama gak dihitung ulang
+    clf = Classifier()
+    brand_re, keyword_re = clf.brand_re, clf.keyword_re
+    for i in range(10_000):
+        clf.classify("TELKOMSEL", "Pulsa" if i % 2 else "Data")
+    assert clf.brand_re is brand_re and clf.keyword_re is keyword_re
+    info = clf.classify.cache_info()
+    assert info.misses == 2 and info.hits == 9_998
+
+# Benchmark jam dinding: gak jalan default (CI sibuk bikin hasilnya acak),
+# nyalain pakai RUN_BENCHMARKS=1 python -m pytest -q
+@pytest.mark.skipif(os.getenv("RUN_BENCHMARKS") != "1", reason="benchmark, set RUN_BENCHMARKS=1")
+def test_benchmark_10rb_nama_unik():
+    brands = ["TELKOMSEL", "XL", "MOBILE LEGENDS", "FREE FIRE", "DANA", "PLN", "GO PAY", "Electric Co", "Coffee"]
+    categories = ["Pulsa", "Data", "Games", "E-Money", "PLN", "Voucher", "Masa Aktif"]
+    # Semua kombinasi unik (cache lru gak bantu), cuma satu kali lewat
+    items = [(f"{brands[i % len(brands)]} {i}", f"{categories[i % len(categories)]} {i // 7}") for i in range(10_000)]
+    clf = Classifier().classify
+    started = time.perf_counter()
+    for brand, category in items:
+        clf(brand, category)
+    elapsed = time.perf_counter() - started
+    print(f"10rb nama unik: {elapsed * 1000:.0f} ms")
+    assert elapsed < 0.5, f"10rb nama butuh {elapsed * 1000:.0f} ms"
@@ -1,7 +1,7 @@
 # ===== FILE: tripay.py =====
 import hashlib
 import hmac
-import requests
+from services.http_client import get_client
 from config import TRIPAY_API_KEY, TRIPAY_MERCHANT_CODE, TRIPAY_CALLBACK_URL, TRIPAY_BASE_URL, TRIPAY_PRIVATE_KEY
 
 def create_signature(order_id, amount):
@@ -12,7 +12,7 @@ def create_signature(order_id, amount):
         hashlib.sha256
     ).hexdigest()
 
-def create_invoice(order_id, phone, provider, nominal, method, amount):
+async def create_invoice(order_id, phone, provider, nominal, method, amount):
     signature = create_signature(order_id, amount)
 
     payload = {
@@ -40,7 +40,7 @@ def create_invoice(order_id, phone, provider, nominal, method, amount):
         "Content-Type": "application/json"
     }
 
-    response = requests.post(TRIPAY_BASE_URL, json=payload, headers=headers)
+    response = await get_client().post(TRIPAY_BASE_URL, json=payload, headers=headers)
 
     print("===== TRIPAY RESPONSE =====")
     print("Status code:", response.status_code)
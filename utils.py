@@ -1,11 +1,9 @@
 from passlib.context import CryptContext
-from collections import defaultdict
-import time
+import rate_limiter
+from config import TRUST_PROXY_HEADERS
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-rate_limit_store = defaultdict(list)
-
 def hash_password(password):
     return pwd_context.hash(password)
 
@@ -13,16 +11,11 @@ def verify_password(password, hashed):
     return pwd_context.verify(password, hashed)
 
 def check_rate_limit(identifier, limit=5, window=60):
-
-    now = time.time()
-
-    rate_limit_store[identifier] = [
-        t for t in rate_limit_store[identifier]
-        if now - t < window
-    ]
-
-    if len(rate_limit_store[identifier]) >= limit:
-        return False
-
-    rate_limit_store[identifier].append(now)
-    return True
\ No newline at end of file
+    return rate_limiter.allow(identifier, limit, window)
+
+def client_ip(request):
+    if TRUST_PROXY_HEADERS:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "-"
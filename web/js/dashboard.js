@@ -7,6 +7,11 @@ let allGroupedProducts = {}; // Simpan data produk di sini
 async function api(url, options = {}) {
     options.headers = { ...options.headers, "token": token };
     const res = await fetch(url, options);
+    if (res.status === 403) {
+        // Token sesi habis / sudah logout -> login ulang
+        localStorage.removeItem("admin_token");
+        window.location.href = "/admin";
+    }
     return await res.json();
 }
 
@@ -18,19 +23,38 @@ function setActiveMenu(menuId) {
 // --- FUNGSI LOAD DATA STATISTIK ---
 window.loadStats = async function() {
     try {
-        let r1 = await api("/admin/api/revenue-today");
-        let r2 = await api("/admin/api/revenue-total");
-        let r3 = await api("/admin/api/profit-today");
-        let r4 = await api("/admin/api/profit-total");
-
-        document.getElementById("revenue_today").innerText = "Rp " + r1.revenue.toLocaleString('id-ID');
-        document.getElementById("revenue_total").innerText = "Rp " + r2.revenue.toLocaleString('id-ID');
-        document.getElementById("profit_today").innerText = "Rp " + r3.profit.toLocaleString('id-ID');
-        document.getElementById("profit_total").innerText = "Rp " + r4.profit.toLocaleString('id-ID');
+        let s = await api("/admin/api/stats");
+
+        document.getElementById("revenue_today").innerText = "Rp " + s.revenue_today.toLocaleString('id-ID');
+        document.getElementById("revenue_total").innerText = "Rp " + s.revenue_total.toLocaleString('id-ID');
+        document.getElementById("profit_today").innerText = "Rp " + s.profit_today.toLocaleString('id-ID');
+        document.getElementById("profit_total").innerText = "Rp " + s.profit_total.toLocaleString('id-ID');
     } catch (error) { console.error("Gagal load statistik:", error); }
 }
 
 // --- MENU TRANSAKSI ---
+let orderCursor = null;   // cursor halaman berikutnya dari server
+let orderFilter = {};     // filter aktif (phone / sku)
+
+function orderQuery(extra = {}) {
+    const params = new URLSearchParams({ ...orderFilter, ...extra });
+    return params.toString();
+}
+
+function orderRow(o) {
+    let badgePay = o.payment_status === "PAID" ? "bg-success" : "bg-warning text-dark";
+    let badgeTop = o.topup_status === "SUCCESS" ? "bg-success" : (o.topup_status === "FAILED" ? "bg-danger" : "bg-info text-dark");
+    return `
+    <tr>
+        <td class="text-muted"><small>${o.id.substring(0,8)}</small></td>
+        <td class="fw-bold">${o.phone || "-"}</td>
+        <td><span class="badge bg-secondary">${o.nominal}</span></td>
+        <td><span class="badge ${badgePay}">${o.payment_status}</span></td>
+        <td><span class="badge ${badgeTop}">${o.topup_status}</span></td>
+        <td><small class="text-muted">${new Date(o.created_at).toLocaleString()}</small></td>
+    </tr>`;
+}
+
 window.loadOrders = async function() {
     setActiveMenu('nav-orders');
     document.getElementById("page-title").innerText = "Data Transaksi Terakhir";
@@ -43,29 +67,56 @@ window.loadOrders = async function() {
     document.getElementById("main_table").innerHTML = "<tr><td class='text-center'>Loading...</td></tr>";
 
     try {
-        let data = await api("/admin/api/orders");
+        let data = await api("/admin/api/orders?" + orderQuery());
         let html = `
         <thead class="table-light">
             <tr><th>ID Order</th><th>No. HP</th><th>SKU</th><th>Pembayaran</th><th>Status</th><th>Waktu</th></tr>
-        </thead><tbody>`;
+        </thead><tbody id="order_rows">`;
 
-        data.forEach(o => {
-            let badgePay = o.payment_status === "PAID" ? "bg-success" : "bg-warning text-dark";
-            let badgeTop = o.topup_status === "SUCCESS" ? "bg-success" : (o.topup_status === "FAILED" ? "bg-danger" : "bg-info text-dark");
-            html += `
-            <tr>
-                <td class="text-muted"><small>${o.id.substring(0,8)}</small></td>
-                <td class="fw-bold">${o.phone}</td>
-                <td><span class="badge bg-secondary">${o.nominal}</span></td>
-                <td><span class="badge ${badgePay}">${o.payment_status}</span></td>
-                <td><span class="badge ${badgeTop}">${o.topup_status}</span></td>
-                <td><small class="text-muted">${new Date(o.created_at).toLocaleString()}</small></td>
-            </tr>`;
-        });
+        data.items.forEach(o => { html += orderRow(o); });
         document.getElementById("main_table").innerHTML = html + "</tbody>";
+        updateOrderPager(data);
     } catch (e) { console.error(e); }
 }
 
+window.loadMoreOrders = async function() {
+    if (!orderCursor) return;
+    try {
+        let data = await api("/admin/api/orders?" + orderQuery({ cursor: orderCursor }));
+        document.getElementById("order_rows").insertAdjacentHTML("beforeend", data.items.map(orderRow).join(""));
+        updateOrderPager(data);
+    } catch (e) { console.error(e); }
+}
+
+function updateOrderPager(data) {
+    orderCursor = data.next_cursor;
+    document.getElementById("order_total").innerText = `Total: ${data.total.toLocaleString('id-ID')}${data.total_capped ? "+" : ""} transaksi`;
+    document.getElementById("btnLoadMore").style.display = orderCursor ? "inline-block" : "none";
+}
+
+// Kotak cari: angka -> filter No. HP, selain itu -> filter SKU (difilter di server)
+let searchTimer;
+window.filterTable = function() {
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(() => {
+        const q = document.getElementById("searchInput").value.trim();
+        orderFilter = !q ? {} : (/^[0-9+]+$/.test(q) ? { phone: q } : { sku: q });
+        loadOrders();
+    }, 400);
+}
+
+window.exportOrders = async function(format) {
+    // Server nge-stream file-nya, browser tinggal simpan
+    const res = await fetch("/admin/api/orders/export?" + orderQuery({ format }), { headers: { "token": token } });
+    if (!res.ok) { alert("Gagal export transaksi"); return; }
+    const url = URL.createObjectURL(await res.blob());
+    const a = document.createElement("a");
+    a.href = url;
+    a.download = `transaksi.${format === "csv" ? "csv" : "ndjson"}`;
+    a.click();
+    URL.revokeObjectURL(url);
+}
+
 // --- FITUR PROFIT MASSAL ---
 // --- FITUR PROFIT MASSAL (VERSI DROPDOWN AUTOMATIC + ANTI UNAUTHORIZED) ---
 window.showBulkMarkupModal = async function() {
@@ -311,7 +362,10 @@ window.deleteProduct = async function(sku) {
 
 
 
-window.logout = function() {
+window.logout = async function() {
+    try {
+        await fetch("/admin/logout", { method: "POST", headers: { "token": token } });
+    } catch(e) {}
     localStorage.removeItem("admin_token");
     window.location.href="/admin";
 }
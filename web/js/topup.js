@@ -3,6 +3,7 @@ let selectedProvider = null;
 let selectedSku = null;
 let selectedItemName = null;
 let selectedPrice = null;
+let paymentChannels = null; // kode -> channel dari /api/payment-channels (null = belum kebaca)
 let currentOrderId = null;
 let confirmModal;
 
@@ -20,6 +21,7 @@ const imageDb = {
 document.addEventListener("DOMContentLoaded", () => {
     confirmModal = new bootstrap.Modal(document.getElementById('confirmModal'));
     loadProducts();
+    loadPaymentChannels();
 
     const lastOrderId = localStorage.getItem("last_order_id");
     console.log("🔥 CEK RADAR TAGIHAN: ", lastOrderId);
@@ -51,6 +53,42 @@ async function loadProducts() {
     }
 }
 
+async function loadPaymentChannels() {
+    try {
+        const res = await fetch("/api/payment-channels");
+        if (!res.ok) throw new Error("Gagal mengambil channel pembayaran");
+        paymentChannels = {};
+        (await res.json()).forEach(c => { paymentChannels[c.code] = c; });
+        // Sembunyiin pilihan yang lagi gak aktif di Tripay
+        document.querySelectorAll(".payment-card[data-method]").forEach(el => {
+            el.parentElement.style.display = paymentChannels[el.dataset.method] ? "" : "none";
+        });
+        // Metode yang kepilih (default QRIS) ikut hilang -> pindah ke pilihan pertama yang ada
+        if (!paymentChannels[document.getElementById("method").value]) {
+            const first = [...document.querySelectorAll(".payment-card[data-method]")]
+                .find(el => paymentChannels[el.dataset.method]);
+            if (first) selectPayment(first.dataset.method, first);
+        }
+    } catch (e) {
+        console.error("Error load payment channels:", e);
+    }
+}
+
+// Rumusnya sama dengan payment_channels.fee() di server
+function hitungAdminFee(method, price) {
+    const c = paymentChannels && paymentChannels[method];
+    if (!c) {
+        // Daftar channel belum kebaca: angka lama
+        if (method === "QRIS") return Math.ceil(price * 0.007);
+        if (method === "OVO" || method === "DANA") return Math.ceil(price * 0.015);
+        return 4500;
+    }
+    let fee = c.flat + Math.ceil(price * c.percent / 100);
+    if (c.min_fee != null) fee = Math.max(fee, c.min_fee);
+    if (c.max_fee != null) fee = Math.min(fee, c.max_fee);
+    return fee;
+}
+
 function getImageUrl(provider) {
     const key = provider.toLowerCase();
     for (let k in imageDb) { if (key.includes(k)) return imageDb[k]; }
@@ -171,17 +209,9 @@ function validasiSebelumBeli() {
     const accountId = zid ? `${uid} (${zid})` : uid;
 
     // 3. Hitung Biaya Admin Tripay (Pakai variabel selectedPrice yang bener)
-    let adminFee = 0;
     const basePrice = selectedPrice; 
     const method = document.getElementById("method").value;
-
-    if (method === "QRIS") {
-        adminFee = Math.ceil(basePrice * 0.007); // QRIS 0.7%
-    } else if (method === "OVO" || method === "DANA") {
-        adminFee = Math.ceil(basePrice * 0.015); // E-Wallet 1.5%
-    } else {
-        adminFee = 4500; // VA atau Bank flat Rp 4.500
-    }
+    const adminFee = hitungAdminFee(method, basePrice);
 
     const totalPrice = basePrice + adminFee;
 
@@ -214,7 +244,8 @@ async function eksekusiBeli() {
 
     const uid = document.getElementById("user_id")?.value;
     const zid = document.getElementById("zone_id")?.value;
-    const wa_pembeli = document.getElementById("wa_pembeli")?.value || "080000000000";
+    // WA opsional: kosong dikirim kosong, jangan nomor dummy (semua pembeli tanpa WA jadi satu limit)
+    const wa_pembeli = document.getElementById("wa_pembeli")?.value || "";
     
     const target_id = zid ? `${uid}${zid}` : uid; 
     const method = document.getElementById("method").value;
@@ -261,60 +292,105 @@ async function eksekusiBeli() {
     }
 }
 
-async function updateStatusRealtime() {
+// Status dikirim server lewat SSE (EventSource), gak polling tiap 5 detik lagi.
+// Kalau SSE gak jalan (browser lama / proxy), turun ke long-poll /wait.
+let statusStream = null;
+let lastStatus = "";
+
+function updateStatusRealtime() {
     if (!currentOrderId) return;
+    stopStatusStream();
+    lastStatus = "";
+
+    if (!window.EventSource) {
+        waitStatus(currentOrderId);
+        return;
+    }
+    const es = new EventSource(`/topup/${currentOrderId}/events`);
+    statusStream = es;
+    es.onmessage = (ev) => {
+        if (!applyStatus(JSON.parse(ev.data))) stopStatusStream();
+    };
+    es.onerror = () => {
+        // CLOSED = server nolak (404 / 429 / 503), bukan putus sementara -> ganti long-poll
+        if (es.readyState === EventSource.CLOSED && statusStream === es) {
+            statusStream = null;
+            waitStatus(currentOrderId);
+        }
+    };
+}
+
+function stopStatusStream() {
+    if (statusStream) {
+        statusStream.close();
+        statusStream = null;
+    }
+}
+
+async function waitStatus(orderId) {
+    if (!orderId || orderId !== currentOrderId || statusStream) return;
     try {
-        const res = await fetch("/topup/" + currentOrderId);
-        
-        if (!res.ok) {
+        const res = await fetch(`/topup/${orderId}/wait?since=${encodeURIComponent(lastStatus)}`);
+
+        if (res.status === 404) {
             if (currentPopupStatus !== "error") {
                 Swal.fire('Error', 'Data transaksi hilang dari server!', 'error');
                 currentPopupStatus = "error";
             }
             localStorage.removeItem('last_order_id');
-            return; 
+            return;
         }
+        if (!res.ok) throw new Error(res.status);
 
-        const data = await res.json();
-        const s = (data.status || "").toLowerCase();
-        
-        if (s.includes("success")) { 
-            if (currentPopupStatus !== "success") {
-                Swal.fire({
-                    title: 'Berhasil!',
-                    text: 'Pesanan Anda telah masuk ke akun!',
-                    icon: 'success',
-                    confirmButtonText: 'Tutup'
-                }).then(() => { location.reload(); }); // Langsung refresh kalau di-close
-                currentPopupStatus = "success";
-            }
-            localStorage.removeItem("last_order_id");
-            currentOrderId = null; 
-        } else if (s.includes("failed")) {
-            if (currentPopupStatus !== "failed") {
-                Swal.fire({
-                    title: 'Dibatalkan',
-                    text: 'Pembayaran gagal atau telah kadaluarsa.',
-                    icon: 'error',
-                    confirmButtonText: 'Tutup'
-                }).then(() => { location.reload(); });
-                currentPopupStatus = "failed";
-            }
-            localStorage.removeItem("last_order_id");
-            currentOrderId = null; 
-        } 
-        // 🛡️ PERBAIKAN BUG UNPAID DI SINI: Pake tanda === biar ngeceknya harus persis kata "paid"
-        else if (s === "processing" || s === "paid") {
-            showStatusResult("processing", data.qr_url, data.invoice_url); 
-            setTimeout(updateStatusRealtime, 5000); 
-        } else { 
-            // Kalau UNPAID jatuhnya ke sini
-            showStatusResult("pending", data.qr_url, data.invoice_url); 
-            setTimeout(updateStatusRealtime, 5000); 
+        if (applyStatus(await res.json())) waitStatus(orderId);
+    } catch(e) {
+        setTimeout(() => waitStatus(orderId), 5000);
+    }
+}
+
+// Balikin true kalau status belum final (masih perlu ditunggu)
+function applyStatus(data) {
+    const s = (data.status || "").toLowerCase();
+    lastStatus = data.status || "";
+
+    if (s.includes("success")) { 
+        if (currentPopupStatus !== "success") {
+            Swal.fire({
+                title: 'Berhasil!',
+                html: `Pesanan Anda telah masuk ke akun!<br>
+                    <a href="/topup/${currentOrderId}/receipt" target="_blank" class="btn btn-outline-success rounded-pill px-4 mt-3">
+                        <i class="bi bi-receipt"></i> Lihat Struk
+                    </a>`,
+                icon: 'success',
+                confirmButtonText: 'Tutup'
+            }).then(() => { location.reload(); }); // Langsung refresh kalau di-close
+            currentPopupStatus = "success";
+        }
+        localStorage.removeItem("last_order_id");
+        currentOrderId = null; 
+        return false;
+    } else if (s.includes("failed")) {
+        if (currentPopupStatus !== "failed") {
+            Swal.fire({
+                title: 'Dibatalkan',
+                text: 'Pembayaran gagal atau telah kadaluarsa.',
+                icon: 'error',
+                confirmButtonText: 'Tutup'
+            }).then(() => { location.reload(); });
+            currentPopupStatus = "failed";
         }
-    } catch(e) { 
-        setTimeout(updateStatusRealtime, 5000); 
+        localStorage.removeItem("last_order_id");
+        currentOrderId = null; 
+        return false;
+    } 
+    // 🛡️ PERBAIKAN BUG UNPAID DI SINI: Pake tanda === biar ngeceknya harus persis kata "paid"
+    else if (s === "processing" || s === "paid") {
+        showStatusResult("processing", data.qr_url, data.invoice_url); 
+    } else { 
+        // Kalau UNPAID jatuhnya ke sini
+        showStatusResult("pending", data.qr_url, data.invoice_url); 
     }
+    return true;
 }
 
 function showStatusResult(status, qrUrl, invoiceUrl) {
@@ -370,6 +446,7 @@ window.batalkanTransaksi = function() {
         if (result.isConfirmed) {
             
             // 1. LAPOR KE SERVER BUAT GANTI STATUS DATABASE JADI CANCELED
+            stopStatusStream(); // biar popup "gagal" dari stream gak nimpa popup batal
             if (currentOrderId) {
                 try {
                     await fetch(`/topup/${currentOrderId}/cancel`, { method: 'POST' });